@@ -0,0 +1,249 @@
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.frame_split_method import frame_split_method, implement_cluster_matching
+from clustering.label_store import LabelStore
+from clustering.spatial_tiling import tiledDBSCAN
+from benchmarks.synthetic import get_synthetic_observations
+
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+log = logging.getLogger("benchmark")
+
+d_eps = 25
+t_eps = 300
+min_samples = 10
+
+# Largest size each benchmark is run at, as some scale quadratically.
+max_sizes = {
+    'fit_iterative': 10**4,
+    'fit_graph': 10**6,
+    'frame_split_iterative': 10**4,
+    'frame_split_graph': 10**6,
+    'frame_split_tiled': 10**6,
+    'cluster_matching': 10**6,
+    'st_dbscan': 10**4,
+}
+
+def fit(gdf, engine):
+    return lambda: euclideanDBSCAN(d_eps, t_eps, min_samples, engine=engine).fit(gdf)
+
+
+def frame_split(gdf, engine):
+    return lambda: frame_split_method(gdf, euclideanDBSCAN(d_eps, t_eps, min_samples, engine=engine))
+
+
+def frame_split_tiled(gdf, tile_size=1000):
+    # Tiles are fitted in parallel, on up to four cores, by worker processes
+    # started once per run and kept across its frames.
+    def run():
+        with tiledDBSCAN(euclideanDBSCAN(d_eps, t_eps, min_samples, engine='graph'), 
+                         tile_size=tile_size, n_workers=min(4, os.cpu_count())) as cluster_algo:
+            frame_split_method(gdf, cluster_algo)
+    return run
+
+
+def cluster_matching(gdf):
+    # Matches two fitted frames, each covering 60% of the time period, so
+    # that they overlap as consecutive frames do. Only the matching is timed.
+    times = gdf['unix_time'].values
+    split = np.quantile(times, [0.4, 0.6])
+    frames = []
+    for frame_mask in [times <= split[1], times >= split[0]]:
+        gdf_frame = gdf[frame_mask].reset_index(names='original_index')
+        cluster_algo = euclideanDBSCAN(d_eps, t_eps, min_samples, engine='graph')
+        cluster_algo.fit(gdf_frame)
+        gdf_frame['cluster'] = cluster_algo.labels
+        gdf_frame['core'] = cluster_algo.core
+        frames.append(gdf_frame[['original_index', 'cluster', 'core']])
+    prev, curr = frames
+
+    def run():
+        labels = LabelStore(gdf.index)
+        labels.set(prev['original_index'].values, prev['cluster'].values)
+        prev_cluster_map = {k: k for k in np.unique(prev['cluster'].values) if k > 0}
+        implement_cluster_matching(prev, curr, labels, prev_cluster_map)
+    return run
+
+
+def st_dbscan(gdf):
+    # The st_clustering package is optional, so this is skipped without it.
+    try:
+        from st_clustering import ST_DBSCAN
+    except ImportError:
+        return None
+    gdf = gdf.to_crs(27700)
+    cluster_vals = np.stack((gdf['unix_time'].values, gdf.geometry.x.values, gdf.geometry.y.values), axis=1)
+    return lambda: ST_DBSCAN(eps1=d_eps, eps2=t_eps, min_samples=min_samples).st_fit(cluster_vals)
+
+
+benchmarks = {
+    'fit_iterative': lambda gdf: fit(gdf, 'iterative'),
+    'fit_graph': lambda gdf: fit(gdf, 'graph'),
+    'frame_split_iterative': lambda gdf: frame_split(gdf, 'iterative'),
+    'frame_split_graph': lambda gdf: frame_split(gdf, 'graph'),
+    'frame_split_tiled': frame_split_tiled,
+    'cluster_matching': cluster_matching,
+    'st_dbscan': st_dbscan,
+}
+
+def get_worker_peaks() -> dict:
+    # Peak resident memory (VmHWM) in bytes of each live child process of
+    # this one, by pid, e.g. the workers of a process pool. Linux only; {}
+    # where /proc does not list children.
+    pid = os.getpid()
+    try:
+        with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+            children = f.read().split()
+    except OSError:
+        return {}
+    peaks = {}
+    for child in children:
+        try:
+            with open('/proc/%s/status' % child) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks[child] = int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return peaks
+
+
+def measure(run, repeat=1, poll_seconds=0.01) -> dict:
+    # The best time of repeat runs, then the peak memory allocated during
+    # one more run under tracemalloc, which would slow the timed runs.
+    # tracemalloc only sees this process, so worker processes are polled
+    # during the timed runs for their own peak memory, summed over workers.
+    worker_peaks = {}
+    stop = threading.Event()
+    def poll_workers():
+        while not stop.wait(poll_seconds):
+            worker_peaks.update(get_worker_peaks())
+    poller = threading.Thread(target=poll_workers, daemon=True)
+    poller.start()
+
+    seconds = []
+    try:
+        for _ in range(repeat):
+            t1 = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - t1)
+    finally:
+        stop.set()
+        poller.join()
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_mb': peak / 2**20,
+            'worker_peak_mb': sum(worker_peaks.values()) / 2**20}
+
+
+def run_benchmarks(sizes: list, names: list = None, seed=0, repeat=1) -> list:
+    # Returns a result per benchmark and size, skipping sizes above the
+    # benchmark's maximum and benchmarks whose dependencies are missing.
+    names = names or list(benchmarks)
+    results = []
+    for n in sizes:
+        gdf = get_synthetic_observations(n, seed=seed)
+        for name in names:
+            if n > max_sizes[name]:
+                continue
+            run = benchmarks[name](gdf)
+            if run is None:
+                log.info('Skipping %s, as its dependencies are not installed' % name)
+                continue
+            result = {'benchmark': name, 'n': n, **measure(run, repeat=repeat)}
+            log.info('%(benchmark)s n=%(n)s: %(seconds).3fs, %(peak_mb).1fMB, %(worker_peak_mb).1fMB in workers' % result)
+            results.append(result)
+    return results
+
+
+def scaling_exponent(results: list, name: str) -> float:
+    # Slope of log(seconds) against log(n), e.g. 1 for linear scaling.
+    points = [(r['n'], r['seconds']) for r in results if r['benchmark'] == name and r['seconds'] > 0]
+    if len(points) < 2:
+        return None
+    n, seconds = np.log(np.array(points)).T
+    return float(np.polyfit(n, seconds, 1)[0])
+
+
+def compare_to_baseline(results: list, baseline: list, tolerance=0.25) -> list:
+    # Returns the results that are slower, or use more memory, than the
+    # baseline for the same benchmark and size by more than tolerance.
+    baseline = {(r['benchmark'], r['n']): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get((result['benchmark'], result['n']))
+        if base is None:
+            continue
+        for measurement in ['seconds', 'peak_mb', 'worker_peak_mb']:
+            # Baselines from before worker memory was measured lack it.
+            if measurement not in base:
+                continue
+            if result[measurement] > base[measurement] * (1 + tolerance):
+                regressions.append({**result, 'measurement': measurement, 'baseline': base[measurement]})
+    return regressions
+
+
+def print_report(results: list) -> None:
+    print('%-24s %10s %12s %12s %12s' % ('benchmark', 'n', 'seconds', 'peak MB', 'worker MB'))
+    for result in results:
+        print('%(benchmark)-24s %(n)10d %(seconds)12.4f %(peak_mb)12.1f %(worker_peak_mb)12.1f' % result)
+    print()
+    for name in dict.fromkeys(r['benchmark'] for r in results):
+        exponent = scaling_exponent(results, name)
+        if exponent is not None:
+            print('%s scales as n^%.2f' % (name, exponent))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Times the clustering pipeline on synthetic observations.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**3, 10**4, 10**5, 10**6])
+    parser.add_argument('--benchmarks', nargs='+', choices=list(benchmarks), default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', default=None,
+                        help='JSON file for the results, by default in benchmarks/results')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON file of earlier results to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    results = run_benchmarks(args.sizes, args.benchmarks, seed=args.seed, repeat=args.repeat)
+    print_report(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(dirname(realpath(__file__)), 'results'), exist_ok=True)
+        output = os.path.join(dirname(realpath(__file__)), 'results',
+                              'benchmark_%s.json' % dt.datetime.now().strftime("%Y%m%d_%H%M%S"))
+    with open(output, 'w') as f:
+        json.dump({'seed': args.seed, 'd_eps': d_eps, 't_eps': t_eps, 'min_samples': min_samples,
+                   'results': results}, f, indent=2)
+    print('Results written to %s' % output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f)['results'], tolerance=args.tolerance)
+        for regression in regressions:
+            print('Regression in %(benchmark)s n=%(n)s %(measurement)s: %(baseline).4f -> ' % regression + \
+                  '%.4f' % regression[regression['measurement']])
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+# Synthetic bus observations for benchmarking without Neo4j. Positions are
+# generated in British National Grid (EPSG:27700) over roughly the extent
+# used by the experiment scripts, and returned in lon/lat as loaded data is.
+EXTENT_27700 = [527000, 533500, 178500, 182000]
+START_TIME = 1698796800 # 2023-11-01
+
+def get_queue_observations(rng, n: int, start_time: int, duration: int, n_sites=200) -> pd.DataFrame:
+    # Buses queueing at a fixed set of sites: each queue lasts a few minutes,
+    # with several vehicles reporting every 30s from positions along it.
+    x0, x1, y0, y1 = EXTENT_27700
+    sites = np.column_stack([rng.uniform(x0, x1, n_sites), rng.uniform(y0, y1, n_sites)])
+    headings = rng.uniform(0, 2 * np.pi, n_sites)
+
+    # Each queue has at least 12 reports, so there are enough for n.
+    n_queues = n // 12 + 1
+    site = rng.integers(0, n_sites, n_queues)
+    queue_start = start_time + rng.integers(0, duration, n_queues)
+    queue_length = rng.integers(6, 30, n_queues)
+    vehicles = rng.integers(2, 8, n_queues)
+
+    # Each queue is a run of reports from its vehicles, 30s apart.
+    queue = np.repeat(np.arange(n_queues), queue_length * vehicles)[:n]
+    step = np.arange(n) - np.searchsorted(queue, queue)
+    vehicle = step % vehicles[queue]
+    report = step // vehicles[queue]
+
+    # Vehicles further back in the queue are further from the site.
+    offset = 12 * vehicle + rng.normal(0, 3, n)
+    x = sites[site[queue], 0] - offset * np.cos(headings[site[queue]])
+    y = sites[site[queue], 1] - offset * np.sin(headings[site[queue]])
+    unix_time = queue_start[queue] + 30 * report + rng.integers(0, 30, n)
+    return pd.DataFrame({'unix_time': unix_time, 'x': x, 'y': y,
+                         'vehicleRef': 1000 * queue + vehicle,
+                         'source': 'queue'})
+
+
+def get_moving_observations(rng, n: int, start_time: int, duration: int) -> pd.DataFrame:
+    # Vehicles moving freely in straight lines, reporting every 30s.
+    x0, x1, y0, y1 = EXTENT_27700
+    reports = 20
+    n_trips = max(1, n // reports + 1)
+    trip = np.repeat(np.arange(n_trips), reports)[:n]
+    report = np.tile(np.arange(reports), n_trips)[:n]
+
+    origin = np.column_stack([rng.uniform(x0, x1, n_trips), rng.uniform(y0, y1, n_trips)])
+    heading = rng.uniform(0, 2 * np.pi, n_trips)
+    speed = rng.uniform(5, 12, n_trips)
+    trip_start = start_time + rng.integers(0, duration, n_trips)
+
+    distance = speed[trip] * 30 * report
+    x = np.clip(origin[trip, 0] + distance * np.cos(heading[trip]), x0, x1)
+    y = np.clip(origin[trip, 1] + distance * np.sin(heading[trip]), y0, y1)
+    unix_time = trip_start[trip] + 30 * report
+    return pd.DataFrame({'unix_time': unix_time, 'x': x, 'y': y,
+                         'vehicleRef': -1 - trip,
+                         'source': 'moving'})
+
+
+def get_synthetic_observations(n: int, seed=0, rate=2.0, queue_share=0.5,
+                               duplicate_share=0.1) -> gpd.GeoDataFrame:
+    # Returns n observations, sorted by unix_time and indexed from 0, in the
+    # form of prepare_slow_observations. Observations arrive at about rate
+    # per second, so the density of each frame does not depend on n. A
+    # share of them repeat the exact position of an earlier report, as
+    # stationary buses do.
+    rng = np.random.default_rng(seed)
+    duration = max(1, int(n / rate))
+    n_duplicate = int(n * duplicate_share)
+    n_queue = int((n - n_duplicate) * queue_share)
+    n_moving = n - n_duplicate - n_queue
+
+    df = pd.concat([get_queue_observations(rng, n_queue, START_TIME, duration),
+                    get_moving_observations(rng, n_moving, START_TIME, duration)],
+                   ignore_index=True)
+    if n_duplicate > 0:
+        duplicates = df.iloc[rng.integers(0, len(df), n_duplicate)].copy()
+        duplicates['unix_time'] += rng.integers(30, 120, n_duplicate)
+        duplicates['source'] = 'duplicate'
+        df = pd.concat([df, duplicates], ignore_index=True)
+
+    df = df.sort_values(by='unix_time', kind='stable').reset_index(drop=True)
+    df['unix_time'] = df['unix_time'].astype(np.int64)
+    geometry = gpd.points_from_xy(df['x'], df['y'], crs=27700).to_crs(4326)
+    return gpd.GeoDataFrame({'unix_time': df['unix_time'].values,
+                             'longitude': geometry.x,
+                             'latitude': geometry.y,
+                             'vehicleRef': df['vehicleRef'].values,
+                             'source': df['source'].values},
+                            geometry=geometry,
+                            crs=4326)
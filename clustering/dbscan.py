@@ -1,53 +1,194 @@
 from abc import abstractmethod
+from collections import deque
+from clustering.neighbourhood_graph import csr_from_pairs, label_from_graph
+from clustering import metrics
 import geopandas as gpd
+import numpy as np
 import logging
+import time
 
 log = logging.getLogger("DBSCAN")
 
 class DBSCAN:
 
-    def __init__(self, d_eps, t_eps, min_samples):
+    engines = ['iterative', 'frontier', 'graph']
+
+    # Whether copies of this algorithm can fit frames in separate processes.
+    parallel_safe = True
+
+    # Whether this algorithm can fit the frames of an ObservationStore, rather
+    # than GeoDataFrames.
+    supports_store = False
+
+    # Whether observations exactly t_eps apart are neighbours.
+    t_eps_inclusive = True
+
+    # Whether the distance between two observations is the same whichever 
+    # other observations are in the data, so that their neighbour pairs can
+    # be carried from one fit to the next.
+    fixed_pair_distances = True
+
+    def __init__(self, d_eps, t_eps, min_samples, engine='iterative'):
         self.d_eps = d_eps
         self.t_eps = t_eps
         self.min_samples = min_samples
+        if engine not in self.engines:
+            raise ValueError('Unknown engine %s, expected one of %s' % (engine, self.engines))
+        self.engine = engine
     
-    def fit(self, data: gpd.GeoDataFrame) -> None:
+    def fit(self, data: gpd.GeoDataFrame, new: np.ndarray = None, carried_pairs: tuple = None) -> None:
+        # Neighbour retrievals are counted by the iterative engines; the graph
+        # engines retrieve the neighbours of every observation at once.
+        self.n_retrievals = 0
+        self.n_neighbours = 0
+        t = time.perf_counter()
+        with metrics.timer('fit'):
+            self._fit(data, new, carried_pairs)
+        if self.engine == 'graph' or new is not None:
+            self.n_retrievals = len(data)
+            self.n_neighbours = len(self.indices)
+
+        self.fit_stats = {'observations': len(data), 
+                          'fit_seconds': time.perf_counter() - t, 
+                          'neighbour_retrievals': self.n_retrievals, 
+                          'neighbours': self.n_neighbours}
+        metrics.count('neighbour_retrievals', self.n_retrievals)
+        metrics.count('neighbours', self.n_neighbours)
+
+    def _fit(self, data: gpd.GeoDataFrame, new: np.ndarray = None, carried_pairs: tuple = None) -> None:
+        if new is not None:
+            self._fit_incremental(data, new, carried_pairs)
+            return
+
         self.set_data(data)
-        self.labels = [0] * len(data)
-        self.core = [0] * len(data)
+        if self.engine == 'graph':
+            # Compute the whole neighbourhood graph up front and label it 
+            # with array operations.
+            with metrics.timer('neighbourhood_graph'):
+                self.indptr, self.indices = self._neighbourhood_graph()
+            self.labels, self.core = label_from_graph(self.indptr, self.indices, self.min_samples)
+            return
+
+        if self.engine == 'frontier':
+            # Compact arrays, plus a bitmap of observations that have 
+            # already been queued for expansion.
+            self.labels = np.zeros(len(data), dtype=np.int32)
+            self.core = np.zeros(len(data), dtype=np.int8)
+            self.queued = np.zeros(len(data), dtype=bool)
+        else:
+            self.labels = [0] * len(data)
+            self.core = [0] * len(data)
         cluster_label = 0
 
         for i in range(len(data)):
             if i % 100 == 0:
-                log.debug('Progress complete: %s' % (i / len(data)))
+                log.debug('Progress complete: %s', i / len(data))
             if self.labels[i] != 0:
                 continue
             neighbours = self._retrieve_neighbours(i)
+            self.n_retrievals += 1
+            self.n_neighbours += len(neighbours)
             if len(neighbours) + 1 < self.min_samples: # we add one since we don't return the current observation.
                 self.labels[i] = -1
             else:
                 cluster_label += 1
-                log.debug('Setting %s as first obs in cluster %s' % (i, cluster_label))
+                log.debug('Setting %s as first obs in cluster %s', i, cluster_label)
                 self.labels[i] = cluster_label
                 self.core[i] = 1
-                log.debug('Expanding cluster %s' % cluster_label)
-                self._expand_cluster(i, neighbours, cluster_label)
+                log.debug('Expanding cluster %s', cluster_label)
+                if self.engine == 'frontier':
+                    self._expand_cluster_frontier(i, neighbours, cluster_label)
+                else:
+                    self._expand_cluster(i, neighbours, cluster_label)
 
     def _expand_cluster(self, i:int, neighbours:list, cluster_label: int) -> None:
         for neighbour in neighbours:
             if self.labels[neighbour] == -1:
-                log.debug('Adding %s to cluster %s' % (neighbour, cluster_label))
+                log.debug('Adding %s to cluster %s', neighbour, cluster_label)
                 self.labels[neighbour] = cluster_label
             elif self.labels[neighbour] == 0:
-                log.debug('Adding %s to cluster %s' % (neighbour, cluster_label))
+                log.debug('Adding %s to cluster %s', neighbour, cluster_label)
                 self.labels[neighbour] = cluster_label
                 new_neighbours = self._retrieve_neighbours(neighbour)
+                self.n_retrievals += 1
+                self.n_neighbours += len(new_neighbours)
                 if len(new_neighbours) + 1 >= self.min_samples:
                     self.core[neighbour] = 1
                     neighbours += new_neighbours
 
+    def _fit_incremental(self, data: gpd.GeoDataFrame, new: np.ndarray, carried_pairs: tuple) -> None:
+        # Fits using neighbour pairs carried over from a previous fit, e.g. 
+        # for the overlap between frames, so only the pairs involving new 
+        # observations are computed. The full set of pairs is kept in 
+        # self.pairs, to be carried forward in turn.
+        if not self.fixed_pair_distances:
+            raise ValueError('%s cannot carry neighbour pairs between fits' % type(self).__name__)
+        self.set_data(data, new=new)
+        with metrics.timer('neighbourhood_graph'):
+            rows, cols = self._new_neighbour_pairs(new)
+        if carried_pairs is not None:
+            rows = np.concatenate([carried_pairs[0], rows])
+            cols = np.concatenate([carried_pairs[1], cols])
+        self.pairs = (rows, cols)
+        self.indptr, self.indices = csr_from_pairs(rows, cols, len(data))
+        self.labels, self.core = label_from_graph(self.indptr, self.indices, self.min_samples)
+
+    def _new_neighbour_pairs(self, new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Returns the neighbour pairs (by position) involving at least one 
+        # new observation.
+        indptr, indices = self._neighbourhood_graph()
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        keep = new[rows] | new[indices]
+        return rows[keep], indices[keep]
+
+    def _enqueue(self, frontier: deque, neighbours: list) -> None:
+        neighbours = np.asarray(neighbours, dtype=np.int64)
+        neighbours = neighbours[~self.queued[neighbours]]
+        self.queued[neighbours] = True
+        frontier.extend(neighbours.tolist())
+
+    def _expand_cluster_frontier(self, i:int, neighbours:list, cluster_label: int) -> None:
+        # Same expansion as _expand_cluster, but each observation is queued 
+        # at most once per fit, so the frontier never exceeds the frame size.
+        # Later duplicates are no-ops in _expand_cluster, so labels match.
+        frontier = deque()
+        self.queued[i] = True
+        self._enqueue(frontier, neighbours)
+        while frontier:
+            neighbour = frontier.popleft()
+            if self.labels[neighbour] == -1:
+                log.debug('Adding %s to cluster %s', neighbour, cluster_label)
+                self.labels[neighbour] = cluster_label
+            elif self.labels[neighbour] == 0:
+                log.debug('Adding %s to cluster %s', neighbour, cluster_label)
+                self.labels[neighbour] = cluster_label
+                new_neighbours = self._retrieve_neighbours(neighbour)
+                self.n_retrievals += 1
+                self.n_neighbours += len(new_neighbours)
+                if len(new_neighbours) + 1 >= self.min_samples:
+                    self.core[neighbour] = 1
+                    self._enqueue(frontier, new_neighbours)
+
+    def _neighbourhood_graph(self) -> tuple[np.ndarray, np.ndarray]:
+        # Returns the neighbourhood graph of the data as CSR arrays. 
+        # Subclasses should override this with a batched computation.
+        rows, cols = [], []
+        for i in range(len(self.data)):
+            neighbours = self._retrieve_neighbours(i)
+            rows += [i] * len(neighbours)
+            cols += neighbours
+        return csr_from_pairs(rows, cols, len(self.data))
+
+    def get_pair_distances(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Returns every neighbour pair (by position) of the data given to
+        # set_data, with the smallest d_eps for which they would still be
+        # neighbours, i.e. they are neighbours for any d_eps above it.
+        raise NotImplementedError('%s does not report pair distances' % type(self).__name__)
+
     @abstractmethod
-    def set_data(self, data: gpd.GeoDataFrame) -> None:
+    def set_data(self, data: gpd.GeoDataFrame, new: np.ndarray = None) -> None:
+        # new, if given, flags the observations whose neighbour pairs need 
+        # computing; pairs between other observations are already known.
         pass
 
     @abstractmethod
@@ -1,4 +1,7 @@
 from clustering.dbscan import DBSCAN
+from clustering.st_index import SpatioTemporalIndex
+from clustering.observation_store import ObservationFrame
+from clustering import metrics
 import geopandas as gpd
 import numpy as np
 import logging
@@ -7,16 +10,69 @@ log = logging.getLogger()
 
 class euclideanDBSCAN(DBSCAN):
 
-    def __init__(self, d_eps, t_eps, min_samples):
-        DBSCAN.__init__(self, d_eps, t_eps, min_samples)
+    supports_store = True
 
-    def set_data(self, data: gpd.GeoDataFrame) -> None:
-        # Convert to projected coordinate system 
-        data = data.to_crs(27700)
-        self.data = data
+    def __init__(self, d_eps, t_eps, min_samples, indexed=False, engine='iterative'):
+        DBSCAN.__init__(self, d_eps, t_eps, min_samples, engine=engine)
+        # If indexed, neighbours are retrieved from a spatio-temporal index 
+        # built once in set_data rather than by scanning the whole frame.
+        self.indexed = indexed
+
+    def set_data(self, data: gpd.GeoDataFrame, new: np.ndarray = None) -> None:
+        if isinstance(data, ObservationFrame):
+            # Frames of an ObservationStore are already projected.
+            self.data = data
+        else:
+            # Convert to projected coordinate system 
+            with metrics.timer('projection'):
+                data = data.to_crs(27700)
+            self.data = data
+        self.index = None
+        if self.indexed or self.engine == 'graph' or new is not None:
+            self.index = self.build_index()
+
+    def build_index(self) -> SpatioTemporalIndex:
+        if isinstance(self.data, ObservationFrame):
+            x, y, t = self.data.x, self.data.y, self.data.t
+        else:
+            x, y, t = self.data.geometry.x.values, self.data.geometry.y.values, self.data.unix_time.values
+        with metrics.timer('neighbour_index'):
+            return SpatioTemporalIndex(x, y, t, self.d_eps, self.t_eps)
     
+    def _neighbourhood_graph(self):
+        return self.index.neighbourhood_graph()
+
+    def _new_neighbour_pairs(self, new):
+        # The neighbour relation is symmetric, so we only query the new 
+        # observations and add the reverse of pairs with old observations.
+        rows, cols = self.index.neighbour_pairs(np.flatnonzero(new))
+        old = ~new[cols]
+        return np.concatenate([rows, cols[old]]), np.concatenate([cols, rows[old]])
+
+    def get_pair_distances(self):
+        # Uses the index of set_data, if it built one for this data.
+        index = self.index if self.index is not None else self.build_index()
+        rows, cols = index.neighbour_pairs(np.arange(len(index)))
+        dx = index.x[cols] - index.x[rows]
+        dy = index.y[cols] - index.y[rows]
+        return rows, cols, np.sqrt(dx * dx + dy * dy)
+
     def _retrieve_neighbours(self, i):
-        log.debug('Retrieving neighbours for index %s' % i)
+        log.debug('Retrieving neighbours for index %s', i)
+
+        if isinstance(self.data, ObservationFrame):
+            if self.indexed:
+                return self.index.query(i).tolist()
+            # The same tests as below, over the frame's arrays.
+            dx = self.data.x - self.data.x[i]
+            dy = self.data.y - self.data.y[i]
+            neighbours = (np.sqrt(dx * dx + dy * dy) < self.d_eps) & \
+                         (np.abs(self.data.t - self.data.t[i]) <= self.t_eps)
+            neighbours[i] = False
+            return np.flatnonzero(neighbours).tolist()
+
+        if self.indexed:
+            return self.data.index.values[self.index.query(i)].tolist()
         
         neighbours = self.data[
             (self.data.geometry.distance(self.data.iloc[i].geometry) < self.d_eps) & 
@@ -26,4 +82,4 @@ class euclideanDBSCAN(DBSCAN):
         if neighbours.shape[0] > 0:
             return neighbours.drop(self.data.iloc[i].name).index.values.tolist()
         else:
-            return []
\ No newline at end of file
+            return []
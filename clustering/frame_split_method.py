@@ -1,140 +1,169 @@
 from lib2to3.pgen2.literals import test
 from clustering.dbscan import DBSCAN
+from clustering.label_store import LabelStore
+from clustering.observation_store import ObservationFrame, ObservationStore
+from clustering import metrics
+from concurrent.futures import ProcessPoolExecutor
 import geopandas as gpd
 import logging 
 import pandas as pd
 import numpy as np
+import time
 
 log = logging.getLogger()
 
-def common_core_point(merged: pd.DataFrame) -> bool:
-    sum_cores = merged[['core_x', 'core_y']].sum(axis=1, keepdims=False)
-    sum_cores_is_two = (sum_cores == 2)
-    return bool(np.any(sum_cores_is_two, keepdims=False))
+def common_core_point(joined: pd.DataFrame) -> np.ndarray:
+    # Observations that are core points in both frames.
+    return joined['core_prev'].values + joined['core_curr'].values == 2
 
 
-def core_plus_marginal_point(merged: pd.DataFrame) -> bool:
-    marginal_or_sum_cores = merged[(merged['cluster_y']>-1) & \
-                                   (merged[['core_x', 'core_y']]\
-                                    .sum(axis=1, keepdims=False) >= 1)]
-    return bool(np.any(marginal_or_sum_cores, keepdims=False))
+def core_plus_marginal_point(joined: pd.DataFrame) -> np.ndarray:
+    # Observations in a cluster of curr that are core points in either frame.
+    return (joined['cluster_curr'].values > -1) & \
+           (joined['core_prev'].values + joined['core_curr'].values >= 1)
 
 
-def test_for_merging_previous_clusters(merged: pd.DataFrame) -> list:
-    df = (merged.groupby('cluster_y').apply(core_plus_marginal_point) & \
-            merged.groupby('cluster_y').apply(common_core_point))
-    if (df.shape[0] > 0 and df.sum() > 1):
-        return df.loc[df].index.values.tolist()
-    else:
+def join_frames(prev: pd.DataFrame, curr: pd.DataFrame) -> pd.DataFrame:
+    # Joins the observations in both frames on original_index, once per frame.
+    joined = curr[['original_index', 'cluster', 'core']].merge(
+                prev[['original_index', 'cluster', 'core']],
+                on='original_index',
+                how='inner',
+                suffixes=('_curr', '_prev'))
+    joined['core_curr'] = joined['core_curr'].astype(np.int64)
+    joined['core_prev'] = joined['core_prev'].astype(np.int64)
+    return joined
+
+
+def test_for_merging_previous_clusters(joined: pd.DataFrame, curr: pd.DataFrame) -> list:
+    # Returns, for each cluster in curr (in order of appearance), the list of
+    # clusters in prev which share core points with it, if there are two or more.
+    shared = joined[common_core_point(joined) & \
+                    (joined['cluster_curr'].values != -1) & \
+                    (joined['cluster_prev'].values > -1)]
+    shared = shared[['cluster_curr', 'cluster_prev']].drop_duplicates()
+    shared = shared[shared.groupby('cluster_curr')['cluster_prev'].transform('size') > 1]
+    if shared.shape[0] == 0:
         return []
 
+    curr_order = pd.Index(pd.unique(curr['cluster'].values)).get_indexer(shared['cluster_curr'].values)
+    order = np.lexsort((shared['cluster_prev'].values, curr_order))
+    _, starts = np.unique(curr_order[order], return_index=True)
+    return [cluster_list.tolist() for cluster_list in np.split(shared['cluster_prev'].values[order], starts[1:])]
+
+
+def get_clusters_to_merge(joined: pd.DataFrame, prev_cluster_map: dict) -> dict:
+    # Maps clusters in curr onto the overall cluster of a cluster in prev, 
+    # where that cluster shares core points, or at least one core point and
+    # a marginal point, with curr. Every cluster in curr sharing observations 
+    # with it is mapped; ties go to the last cluster in prev_cluster_map.
+    if len(prev_cluster_map) == 0:
+        return {}
+    map_rank = pd.Series(np.arange(len(prev_cluster_map)), index=list(prev_cluster_map.keys()))
+    rank = map_rank.reindex(joined['cluster_prev'].values).values
+    in_map = ~np.isnan(rank)
+
+    matched = in_map & (common_core_point(joined) | core_plus_marginal_point(joined))
+    matched_prev = np.unique(joined['cluster_prev'].values[matched])
+    carried = in_map & \
+              np.isin(joined['cluster_prev'].values, matched_prev) & \
+              (joined['cluster_curr'].values > -1)
+    winners = pd.Series(rank[carried]).groupby(joined['cluster_curr'].values[carried]).max()
+
+    overall_clusters = np.array(list(prev_cluster_map.values()))
+    return dict(zip(winners.index, overall_clusters[winners.values.astype(np.int64)]))
+
 
 def implement_cluster_matching(prev: pd.DataFrame, curr: pd.DataFrame, 
-                               labels: dict, prev_cluster_map: dict) \
-                                -> tuple[dict, dict]:
+                               labels: LabelStore, prev_cluster_map: dict) \
+                                -> tuple[LabelStore, dict]:
 
-    clusters_to_merge = {}
-    current_frame_cluster_lookup = {}
+    # The observations in both frames, joined once and then tested with 
+    # grouped array operations rather than a merge per cluster.
+    joined = join_frames(prev, curr)
 
     # We need a check here to see if two distinct clusters from the previous
     # dataframe need merging as a result of the clustering from curr.
 
-    # We iterate through the clusters in curr, join on the observations in 
-    # previous (for each cluster in curr) and determine whether there are 
-    # at least two distinct clusters in prev which share core points or at 
-    # least one core point and a marginal point, as per Peca (2012).
-    prev_clusters_to_merge = []
-    for cluster in curr['cluster'].unique():
-        if cluster == -1:
-            continue
-
-        cluster_list = []
-        merged = curr[curr['cluster']==cluster].merge(
-                    prev[['cluster', 'core', 'original_index']],
-                    on='original_index', 
-                    how='inner')[['core_x', 'core_y', 'cluster_x', 'cluster_y', 'original_index']]
-
-        # Remove noise
-        merged = merged[merged['cluster_y'] > -1]
-
-        # Implement merging test and store any clusters that need merging.
-        prev_clusters_to_merge.append(test_for_merging_previous_clusters(merged))
-
-    for cluster_list in prev_clusters_to_merge:
-        if len(cluster_list) > 1:
-            global_cluster_labels_to_merge = [prev_cluster_map[i] for i in cluster_list]
-            new_cluster_label = min(global_cluster_labels_to_merge)
-            indexes_to_update = [i for i,v in labels.items() if v in global_cluster_labels_to_merge]
-            for index in indexes_to_update:
-                labels[index] = new_cluster_label
-            for index in cluster_list:
-                prev_cluster_map[index] = new_cluster_label
-
-    # This loop is to match clusters in prev and curr
-    # which need merging - the actual re-labelling process is performed in the 
-    # subsequent loop.
-    for prev_cluster_frame, prev_cluster_overall in prev_cluster_map.items():
-
-        merged = prev[prev['cluster'] == prev_cluster_frame].merge(
-                    curr[['cluster', 'core', 'original_index']], 
-                    on='original_index', 
-                    how='inner')
-
-        if common_core_point(merged) or core_plus_marginal_point(merged):  
-            # Then these clusters will need merging
-            for cluster in merged['cluster_y'].unique():
-                if cluster > -1:
-                    clusters_to_merge[cluster] = prev_cluster_overall
-    
-    # Now we loop through and re-label if necessary.
-    for i, row in curr.iterrows():
-        if row['original_index'] in labels.keys() and labels[row['original_index']] > -1:
-            log.debug('Not doing anything for obs %s. Current frame cluster: %s, overall cluster: %s' % \
-                      (row['original_index'], row['cluster'], labels[row['original_index']]))
-            continue
-        elif row['cluster'] in clusters_to_merge.keys():
-            # This obs has been linked to a cluster that needs merging. 
-            # So this cluster must already exist in labels - we need to get this cluster id. 
-            labels[row['original_index']] = clusters_to_merge[row['cluster']]
-            current_frame_cluster_lookup[row['cluster']] = clusters_to_merge[row['cluster']]
-            log.debug('Relabelling obs %s to overall cluster %s from frame cluster %s'  % \
-                      (row['original_index'], labels[row['original_index']], row['cluster']))
-        elif row['cluster'] in current_frame_cluster_lookup.keys():
-            labels[row['original_index']] = current_frame_cluster_lookup[row['cluster']]
-            log.debug('Relabelling obs %s to overall cluster %s from frame cluster %s' % \
-                      (row['original_index'], labels[row['original_index']], row['cluster']))
-        elif row['cluster'] > -1:
-            # Then it's a new cluster we haven't seen before. Record the label and map it to a new value.
-            current_frame_cluster_lookup[row['cluster']] = max(1, max(labels.values()) + 1)
-            labels[row['original_index']] = current_frame_cluster_lookup[row['cluster']]
-            log.debug('Adding new overall cluster %s for observation %s and frame cluster %s' % \
-                      (labels[row['original_index']], row['original_index'], row['cluster']))
-        else:
-            labels[row['original_index']] = -1
-            log.debug('Setting obs %s to noise.' % (row['original_index']))
+    # For each cluster in curr, we determine whether there are at least two
+    # distinct clusters in prev which share core points with it, as per 
+    # Peca (2012). Merged clusters take the smallest of their labels.
+    for cluster_list in test_for_merging_previous_clusters(joined, curr):
+        new_cluster_label = labels.merge([prev_cluster_map[i] for i in cluster_list])
+        for index in cluster_list:
+            prev_cluster_map[index] = new_cluster_label
+
+    # Match clusters in prev and curr which need merging - the actual 
+    # re-labelling process is performed below.
+    clusters_to_merge = get_clusters_to_merge(joined, prev_cluster_map)
+
+    # Observations already in an overall cluster keep it. The rest take the
+    # overall cluster they are merged into, a new overall cluster, or noise.
+    original_index = curr['original_index'].values
+    cluster = curr['cluster'].values
+    unlabelled = labels.get(original_index) <= -1
+    original_index = original_index[unlabelled]
+    cluster = cluster[unlabelled]
+
+    new_labels = np.full(len(cluster), -1, dtype=np.int64)
+    merge_label = pd.Series(clusters_to_merge, dtype=np.float64).reindex(cluster).values
+    is_merged = ~np.isnan(merge_label)
+    new_labels[is_merged] = merge_label[is_merged]
+
+    # New overall clusters are numbered in order of first appearance, each
+    # one above any label assigned before it.
+    is_new = ~is_merged & (cluster > -1)
+    new_clusters, first = np.unique(cluster[is_new], return_index=True)
+    first_position = np.flatnonzero(is_new)[first]
+    max_label = labels.max_assigned()
+    running_max = np.maximum.accumulate(np.where(is_merged, new_labels, max_label))
+    new_cluster_labels = {}
+    last_label = max_label
+    order = np.argsort(first_position)
+    for new_cluster, position in zip(new_clusters[order], first_position[order]):
+        last_label = max(1, max(running_max[position], last_label) + 1)
+        new_cluster_labels[new_cluster] = last_label
+    new_labels[is_new] = pd.Series(new_cluster_labels, dtype=np.int64).reindex(cluster[is_new]).values
+
+    labels.set(original_index, new_labels)
+    log.debug('Relabelled %s observations, with %s merged and %s new overall clusters', 
+              len(original_index), len(set(cluster[is_merged])), len(new_cluster_labels))
+
+    current_frame_cluster_lookup = {}
+    for frame_cluster in pd.unique(cluster[cluster > -1]):
+        current_frame_cluster_lookup[frame_cluster] = clusters_to_merge[frame_cluster] \
+            if frame_cluster in clusters_to_merge else new_cluster_labels[frame_cluster]
 
     return labels, current_frame_cluster_lookup
 
 
-def frame_split_method(gdf: gpd.GeoDataFrame,  
-                       cluster_algo: DBSCAN, 
-                       frame_size=None) -> dict:
-    
-    # Set parameter defaults
-    if frame_size is None:
-        frame_size = 4 * cluster_algo.t_eps
-    frame_overlap = 2 * cluster_algo.t_eps
+def get_original_index(gdf_frame) -> np.ndarray:
+    # Frames are GeoDataFrames from get_frames, or ObservationFrames.
+    if isinstance(gdf_frame, ObservationFrame):
+        return gdf_frame.original_index
+    return gdf_frame['original_index'].values
+
+
+def carry_forward_pairs(gdf_frame: pd.DataFrame, prev_gdf_frame: pd.DataFrame, 
+                        prev_pairs: tuple) -> tuple[np.ndarray, tuple]:
+    # Returns a mask of the observations that are new in this frame, and the
+    # neighbour pairs from the previous frame (by original index) where both 
+    # observations are still in this frame, as positions in this frame.
+    if prev_pairs is None:
+        return np.ones(len(gdf_frame), dtype=bool), None
+
+    new = ~np.isin(get_original_index(gdf_frame), get_original_index(prev_gdf_frame))
+    positions = pd.Index(get_original_index(gdf_frame))
+    rows = positions.get_indexer(prev_pairs[0])
+    cols = positions.get_indexer(prev_pairs[1])
+    in_frame = (rows > -1) & (cols > -1)
+    return new, (rows[in_frame], cols[in_frame])
 
-    # Initialise previous frame variable
-    prev_gdf_frame = None
 
-    # Loop through frames, using 'unix_time' column to define time.
+def get_frames(gdf: gpd.GeoDataFrame, frame_size, frame_overlap):
+    # Yields overlapping frames, using 'unix_time' column to define time.
     for i in range(gdf['unix_time'].min(), gdf['unix_time'].max(), (frame_size - frame_overlap + 1)):
         
-        if i > gdf['unix_time'].min():
-            # Update prev_gdf_frame
-            prev_gdf_frame = gdf_frame[['original_index', 'cluster', 'core']].copy()
-        
         # Current frame definition
         gdf_frame = gdf[(gdf['unix_time'] >= i) & \
                         (gdf['unix_time'] <= frame_size + i)]\
@@ -144,22 +173,119 @@ def frame_split_method(gdf: gpd.GeoDataFrame,
         log.info(f"Frame size: {gdf_frame.shape[0]}")
         log.info(f"Min index: {gdf_frame['original_index'].min()}")
         log.info(f"Max index: {gdf_frame['original_index'].max()}")
+        yield gdf_frame
+
+
+def fit_frames(frames, cluster_algo: DBSCAN, incremental=False):
+    # Fits each frame in turn, yielding the frame with its labels, core 
+    # points and fit statistics.
+    prev_gdf_frame = None
+    prev_pairs = None
+    for gdf_frame in frames:
+        if incremental:
+            # Only compute neighbour pairs involving observations that have
+            # entered since the previous frame.
+            new, carried_pairs = carry_forward_pairs(gdf_frame, prev_gdf_frame, prev_pairs)
+            log.info(f"New observations in frame: {new.sum()}")
+            cluster_algo.fit(gdf_frame, new=new, carried_pairs=carried_pairs)
+            prev_pairs = tuple(get_original_index(gdf_frame)[p] for p in cluster_algo.pairs)
+            prev_gdf_frame = gdf_frame
+        else:
+            cluster_algo.fit(gdf_frame)
+        yield gdf_frame, cluster_algo.labels, cluster_algo.core, cluster_algo.fit_stats
+
+
+# The clustering algorithm of each worker process, sent once per worker 
+# rather than once per frame.
+_worker_cluster_algo = None
+
+def _init_worker(cluster_algo: DBSCAN) -> None:
+    global _worker_cluster_algo
+    _worker_cluster_algo = cluster_algo
 
-        # Fit to frame
-        cluster_algo.fit(gdf_frame)
-        gdf_frame['cluster'] = cluster_algo.labels
-        gdf_frame['core'] = cluster_algo.core
 
+def _fit_frame(gdf_frame: gpd.GeoDataFrame) -> tuple:
+    _worker_cluster_algo.fit(gdf_frame)
+    return _worker_cluster_algo.labels, _worker_cluster_algo.core, _worker_cluster_algo.fit_stats
+
+
+def fit_frames_in_parallel(frames, cluster_algo: DBSCAN, n_workers: int):
+    # Frames are independent until they are matched, so they are fitted in 
+    # a process pool and yielded back in frame order.
+    frames = list(frames)
+    with ProcessPoolExecutor(max_workers=n_workers, 
+                             initializer=_init_worker, 
+                             initargs=(cluster_algo,)) as executor:
+        for gdf_frame, (labels, core, fit_stats) in zip(frames, executor.map(_fit_frame, frames)):
+            # Metrics are not collected in the workers, so their counts are
+            # added from the fit statistics.
+            metrics.add_time('fit', fit_stats['fit_seconds'])
+            metrics.count('neighbour_retrievals', fit_stats['neighbour_retrievals'])
+            metrics.count('neighbours', fit_stats['neighbours'])
+            yield gdf_frame, labels, core, fit_stats
+
+
+def frame_split_method(gdf: gpd.GeoDataFrame,  
+                       cluster_algo: DBSCAN, 
+                       frame_size=None, 
+                       incremental=False, 
+                       n_workers=1) -> dict:
+    
+    # Set parameter defaults
+    if frame_size is None:
+        frame_size = 4 * cluster_algo.t_eps
+    frame_overlap = 2 * cluster_algo.t_eps
+
+    if cluster_algo.supports_store:
+        # Observations are projected once, and each frame is a range of them.
+        frames = ObservationStore(gdf).frames(frame_size, frame_overlap)
+    else:
+        frames = get_frames(gdf, frame_size, frame_overlap)
+    if incremental and not cluster_algo.fixed_pair_distances:
+        raise ValueError('%s cannot fit frames incrementally' % type(cluster_algo).__name__)
+    if n_workers > 1:
+        if incremental:
+            raise ValueError('Incremental frames must be fitted in order, with n_workers=1')
+        if not cluster_algo.parallel_safe:
+            raise ValueError('%s cannot fit frames in parallel' % type(cluster_algo).__name__)
+        fitted_frames = fit_frames_in_parallel(frames, cluster_algo, n_workers)
+    else:
+        fitted_frames = fit_frames(frames, cluster_algo, incremental)
+
+    # Initialise previous frame variable
+    prev_gdf_frame = None
+
+    # Match the clusters of each frame with the previous frame, in frame order.
+    for frame, (gdf_frame, labels, core, fit_stats) in enumerate(fitted_frames):
+        gdf_frame = pd.DataFrame({'original_index': get_original_index(gdf_frame), 
+                                  'cluster': labels, 
+                                  'core': core})
+
+        t = time.perf_counter()
         if prev_gdf_frame is not None: 
-            merged_labels, prev_cluster_map = implement_cluster_matching(prev_gdf_frame, gdf_frame, merged_labels, prev_cluster_map)
+            with metrics.timer('cluster_matching'):
+                merged_labels, prev_cluster_map = implement_cluster_matching(prev_gdf_frame, gdf_frame, merged_labels, prev_cluster_map)
         else:
-            merged_labels = dict(zip(gdf_frame.original_index.values, gdf_frame.cluster.values))
+            merged_labels = LabelStore(gdf.index)
+            merged_labels.set(gdf_frame.original_index.values, gdf_frame.cluster.values)
             prev_cluster_map = {k:k for k in np.unique(gdf_frame.cluster.values) if k > 0}
 
+        if metrics.enabled():
+            metrics.count('frames')
+            metrics.record_frame(frame=frame, 
+                                 **fit_stats, 
+                                 mean_degree=fit_stats['neighbours'] / max(fit_stats['neighbour_retrievals'], 1), 
+                                 clusters=len(pd.unique(gdf_frame['cluster'][gdf_frame['cluster'] > 0])), 
+                                 matching_seconds=time.perf_counter() - t)
+
+        # Update prev_gdf_frame
+        prev_gdf_frame = gdf_frame
+
     # Do it one more time at the end
-    merged_labels, prev_cluster_map = implement_cluster_matching(gdf_frame[['original_index', 'cluster', 'core']].copy(), 
-                                                                 pd.DataFrame(columns=['original_index', 'cluster', 'core']), 
-                                                                 merged_labels, 
-                                                                 prev_cluster_map)
+    with metrics.timer('cluster_matching'):
+        merged_labels, prev_cluster_map = implement_cluster_matching(gdf_frame, 
+                                                                     pd.DataFrame(columns=['original_index', 'cluster', 'core']), 
+                                                                     merged_labels, 
+                                                                     prev_cluster_map)
 
-    return merged_labels
+    return merged_labels.resolve()
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+class LabelStore:
+    """
+    Overall cluster labels of observations, kept in arrays indexed by
+    original_index, with merges of overall clusters recorded in a
+    disjoint-set forest rather than by relabelling every observation.
+
+    Each label points at a node of the forest, and observations hold the
+    node of the label they were assigned, which is resolved to the smallest
+    label of its merged set once, at the end. merge() leaves the labels it
+    merges away pointing at new nodes, so the result is the same as
+    relabelling every observation that holds one of them: a label assigned
+    again later starts a cluster of its own.
+    """
+
+    def __init__(self, index: pd.Index):
+        self.index = pd.Index(index)
+        self.nodes = np.full(len(self.index), -1, dtype=np.int64)
+        self.assigned = np.zeros(len(self.index), dtype=bool)
+        # At least the largest label any observation holds.
+        self.max_label = -1
+
+        # Disjoint-set forest over nodes, with the label each node was made
+        # for, and the smallest label and number of observations of each
+        # set kept at its root.
+        self.n_nodes = 0
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.rank = np.zeros(0, dtype=np.int8)
+        self.node_label = np.zeros(0, dtype=np.int64)
+        self.min_label = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros(0, dtype=np.int64)
+        self.label_node = np.zeros(0, dtype=np.int64)
+        self._reserve(15)
+
+    def _positions(self, original_index) -> np.ndarray:
+        positions = self.index.get_indexer(original_index)
+        if np.any(positions < 0):
+            raise KeyError('Observations not in the label store')
+        return positions
+
+    def _new_nodes(self, labels: np.ndarray) -> np.ndarray:
+        # Adds a set of one node for each of labels.
+        nodes = np.arange(self.n_nodes, self.n_nodes + len(labels), dtype=np.int64)
+        size = len(self.parent)
+        if self.n_nodes + len(labels) > size:
+            new_size = max(2 * size, self.n_nodes + len(labels))
+            grow = new_size - size
+            self.parent = np.concatenate([self.parent, np.arange(size, new_size, dtype=np.int64)])
+            self.rank = np.concatenate([self.rank, np.zeros(grow, dtype=np.int8)])
+            self.node_label = np.concatenate([self.node_label, np.zeros(grow, dtype=np.int64)])
+            self.min_label = np.concatenate([self.min_label, np.zeros(grow, dtype=np.int64)])
+            self.size = np.concatenate([self.size, np.zeros(grow, dtype=np.int64)])
+        self.node_label[nodes] = labels
+        self.min_label[nodes] = labels
+        self.n_nodes += len(labels)
+        return nodes
+
+    def _reserve(self, label: int) -> None:
+        # Gives every label up to label a node.
+        size = len(self.label_node)
+        if label < size:
+            return
+        new_size = max(2 * size, label + 1)
+        self.label_node = np.concatenate([self.label_node,
+                                          self._new_nodes(np.arange(size, new_size, dtype=np.int64))])
+
+    def get(self, original_index) -> np.ndarray:
+        # Returns the assigned (unresolved) labels, -1 where unassigned.
+        nodes = self.nodes[self._positions(original_index)]
+        return np.where(nodes > -1, self.node_label[nodes], -1)
+
+    def set(self, original_index, labels) -> None:
+        labels = np.asarray(labels, dtype=np.int64)
+        positions = self._positions(original_index)
+        if len(labels) > 0 and labels.max() > self.max_label:
+            self.max_label = int(labels.max())
+            self._reserve(self.max_label)
+        for node in self.nodes[positions][self.nodes[positions] > -1]:
+            self.size[self.find(node)] -= 1
+        self.nodes[positions] = np.where(labels > -1, self.label_node[np.maximum(labels, 0)], -1)
+        self.assigned[positions] = True
+        for label, count in zip(*np.unique(labels[labels > -1], return_counts=True)):
+            self.size[self.find(self.label_node[label])] += count
+
+    def max_assigned(self) -> int:
+        # The largest label any observation holds, or -1. A label merged
+        # away is no longer held, so it can be handed out again.
+        while self.max_label > -1 and self.size[self.find(self.label_node[self.max_label])] == 0:
+            self.max_label -= 1
+        return self.max_label
+
+    def find(self, node: int) -> int:
+        # Root of the set holding node, halving the path as we go.
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return int(node)
+
+    def union(self, labels: list) -> int:
+        # Merges the sets holding labels and returns the smallest label of
+        # the merged set. Every label keeps its node, so observations given
+        # any of them later join the merged set too.
+        self._reserve(int(max(labels)))
+        roots = [self.find(self.label_node[label]) for label in labels]
+        root = roots[0]
+        for other in roots[1:]:
+            if other == root:
+                continue
+            if self.rank[other] > self.rank[root]:
+                root, other = other, root
+            elif self.rank[other] == self.rank[root]:
+                self.rank[root] += 1
+            self.parent[other] = root
+            self.min_label[root] = min(self.min_label[root], self.min_label[other])
+            self.size[root] += self.size[other]
+        return int(self.min_label[root])
+
+    def merge(self, labels: list) -> int:
+        # Merges the clusters of labels into the smallest of them, which is
+        # returned, as relabelling every observation holding one of them
+        # would: each label merged away is given a new, empty node.
+        label = self.union(labels)
+        merged = [other for other in set(labels) if other != label]
+        self.label_node[merged] = self._new_nodes(np.array(merged, dtype=np.int64))
+        return label
+
+    def resolve(self) -> dict:
+        # Returns the resolved labels of every assigned observation, by
+        # original_index, compressing the forest in one vectorized pass.
+        roots = self.parent[:self.n_nodes].copy()
+        while True:
+            next_roots = roots[roots]
+            if np.array_equal(next_roots, roots):
+                break
+            roots = next_roots
+
+        nodes = self.nodes[self.assigned]
+        labels = np.where(nodes > -1, self.min_label[roots[nodes]], -1)
+        return dict(zip(self.index[self.assigned], labels))
@@ -0,0 +1,160 @@
+import csv
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Stage timers, counters and per-frame records for a run. Collection is off
+# until enable() is called: timer() then returns a shared no-op context and
+# count() returns straight away, so instrumented code costs one call per
+# stage rather than per observation.
+_enabled = False
+_lock = threading.Lock()
+# name -> [calls, seconds]
+_timers = {}
+_counters = {}
+_frames = []
+# Records made inside capture() go to the capture of their thread instead.
+_local = threading.local()
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_timer = _NullTimer()
+
+class _Timer:
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _frames.clear()
+
+
+def timer(name: str):
+    # Context manager adding the time spent in its block to the stage name.
+    return _Timer(name) if _enabled else _null_timer
+
+
+def _records() -> tuple[dict, dict, list]:
+    # The timers, counters and frames that this thread records into.
+    captured = getattr(_local, 'captured', None)
+    return (_timers, _counters, _frames) if captured is None else captured
+
+
+def add_time(name: str, seconds: float) -> None:
+    if not _enabled:
+        return
+    timers, _, _ = _records()
+    with _lock:
+        stage = timers.setdefault(name, [0, 0.0])
+        stage[0] += 1
+        stage[1] += seconds
+
+
+def count(name: str, value=1) -> None:
+    if not _enabled:
+        return
+    _, counters, _ = _records()
+    with _lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+def record_frame(**fields) -> None:
+    # Records one row of per-frame measurements, e.g. from frame_split_method.
+    if not _enabled:
+        return
+    _, _, frames = _records()
+    with _lock:
+        frames.append(fields)
+
+
+@contextmanager
+def capture():
+    # Keeps what this thread records in the block apart from the run's 
+    # metrics, e.g. for work done ahead in a background thread, to be 
+    # added with replay() once it is used.
+    captured = ({}, {}, [])
+    previous = getattr(_local, 'captured', None)
+    _local.captured = captured
+    try:
+        yield captured
+    finally:
+        _local.captured = previous
+
+
+def replay(captured: tuple) -> None:
+    timers, counters, frames = captured
+    with _lock:
+        for name, (calls, seconds) in timers.items():
+            stage = _timers.setdefault(name, [0, 0.0])
+            stage[0] += calls
+            stage[1] += seconds
+        for name, value in counters.items():
+            _counters[name] = _counters.get(name, 0) + value
+        _frames.extend(frames)
+
+
+def summary() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        if counters.get('neighbour_retrievals'):
+            counters['mean_degree'] = counters.get('neighbours', 0) / counters['neighbour_retrievals']
+        return {'stages': {name: {'calls': calls, 'seconds': seconds}
+                           for name, (calls, seconds) in _timers.items()},
+                'counters': counters,
+                'frames': [dict(frame) for frame in _frames]}
+
+
+def export(prefix: str) -> tuple[str, str]:
+    # Writes the summary to prefix_metrics.json, and the per-frame records
+    # to prefix_metrics.csv, e.g. next to the outputs of an experiment.
+    metrics = summary()
+    json_path = '%s_metrics.json' % prefix
+    with open(json_path, 'w') as f:
+        json.dump(metrics, f, indent=2, default=float)
+
+    csv_path = '%s_metrics.csv' % prefix
+    fieldnames = list(dict.fromkeys(name for frame in metrics['frames'] for name in frame))
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(metrics['frames'])
+    log.info('Metrics written to %s and %s' % (json_path, csv_path))
+    return json_path, csv_path
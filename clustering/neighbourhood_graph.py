@@ -0,0 +1,90 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+def csr_from_pairs(rows: np.ndarray, cols: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    # Converts (source, target) neighbour pairs into CSR arrays, with the
+    # neighbours of each source sorted by position.
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[order]
+
+
+def is_symmetric(indptr: np.ndarray, indices: np.ndarray) -> bool:
+    n = len(indptr) - 1
+    adjacency = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+    return (adjacency != adjacency.T).nnz == 0
+
+
+def _label_symmetric(indptr: np.ndarray, indices: np.ndarray, is_core: np.ndarray) \
+    -> np.ndarray:
+    n = len(indptr) - 1
+    labels = np.full(n, -1, dtype=np.int64)
+    core_index = np.flatnonzero(is_core)
+    if len(core_index) == 0:
+        return labels
+
+    # Clusters are the connected components of the core points, numbered in
+    # the order of their first core point, as they are found by the loop in fit.
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    core_edges = is_core[rows] & is_core[indices]
+    core_graph = csr_matrix((np.ones(core_edges.sum(), dtype=np.int8),
+                             (rows[core_edges], indices[core_edges])), shape=(n, n))
+    _, component = connected_components(core_graph, directed=False)
+    _, first, component_rank = np.unique(component[core_index], return_index=True, return_inverse=True)
+    cluster_of_component = np.empty(len(first), dtype=np.int64)
+    cluster_of_component[np.argsort(first)] = np.arange(1, len(first) + 1)
+    labels[core_index] = cluster_of_component[component_rank]
+
+    # Border points join the first cluster to be expanded that reaches them,
+    # which is the lowest numbered cluster among their core neighbours.
+    border_edges = ~is_core[rows] & is_core[indices]
+    border_labels = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(border_labels, rows[border_edges], labels[indices[border_edges]])
+    is_border = border_labels < np.iinfo(np.int64).max
+    labels[is_border] = border_labels[is_border]
+    return labels
+
+
+def _label_directed(indptr: np.ndarray, indices: np.ndarray, is_core: np.ndarray) \
+    -> np.ndarray:
+    # Replays the expansion order of DBSCAN.fit on the CSR arrays. Needed
+    # when the neighbour relation is not symmetric, e.g. for one-way roads.
+    n = len(indptr) - 1
+    labels = np.zeros(n, dtype=np.int64)
+    queued = np.zeros(n, dtype=bool)
+    cluster_label = 0
+    for i in range(n):
+        if labels[i] != 0:
+            continue
+        if not is_core[i]:
+            labels[i] = -1
+            continue
+        cluster_label += 1
+        labels[i] = cluster_label
+        queued[i] = True
+        frontier = [i]
+        while frontier:
+            j = frontier.pop()
+            neighbours = indices[indptr[j]:indptr[j + 1]]
+            neighbours = neighbours[~queued[neighbours]]
+            queued[neighbours] = True
+            labels[neighbours] = cluster_label
+            frontier.extend(neighbours[is_core[neighbours]].tolist())
+    return labels
+
+
+def label_from_graph(indptr: np.ndarray, indices: np.ndarray, min_samples: int) \
+    -> tuple[np.ndarray, np.ndarray]:
+    # Returns the DBSCAN labels and core flags for a CSR neighbourhood graph.
+    # Core detection is a degree check; we add one to the degree since the
+    # graph does not include the observation itself.
+    is_core = np.diff(indptr) + 1 >= min_samples
+    if is_symmetric(indptr, indices):
+        labels = _label_symmetric(indptr, indices, is_core)
+    else:
+        labels = _label_directed(indptr, indices, is_core)
+    return labels, is_core.astype(np.int64)
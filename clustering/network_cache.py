@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import os
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+log = logging.getLogger()
+
+def cache_path(cache_dir: str, name: str, **key) -> str:
+    # Returns the path of a cache file, named by a hash of its key.
+    key_str = repr(sorted(key.items()))
+    digest = hashlib.md5(key_str.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, '%s_%s.npz' % (name, digest))
+
+
+def save_node_distances(path: str, node_distances: pd.DataFrame) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez_compressed(path,
+                        source=node_distances['source'].values,
+                        target=node_distances['target'].values,
+                        length=node_distances['length'].values)
+    log.info('Saved %s node distances to %s' % (len(node_distances), path))
+
+
+def load_node_distances(path: str) -> pd.DataFrame:
+    with np.load(path) as arrays:
+        node_distances = pd.DataFrame({'source': arrays['source'],
+                                       'target': arrays['target'],
+                                       'length': arrays['length']})
+    log.info('Loaded %s node distances from %s' % (len(node_distances), path))
+    return node_distances
+
+
+def _attribute_arrays(prefix: str, attributes: list) -> dict:
+    # Stores each attribute as a typed array if it is numeric and never 
+    # missing, and as an object array with None where missing otherwise.
+    names = sorted(set(k for a in attributes for k in a.keys()))
+    arrays = {}
+    for name in names:
+        values = [a.get(name) for a in attributes]
+        if all(isinstance(v, (bool, int, float, np.number)) for v in values):
+            arrays[prefix + name] = np.array(values)
+        else:
+            arrays[prefix + name] = np.array(values, dtype=object)
+    return arrays
+
+
+def _attribute_dicts(prefix: str, arrays, n: int) -> list:
+    columns = [(k[len(prefix):], arrays[k].tolist()) for k in arrays.files if k.startswith(prefix)]
+    return [{name: values[i] for name, values in columns if values[i] is not None} for i in range(n)]
+
+
+def save_graph(path: str, G: nx.MultiDiGraph) -> None:
+    # Saves an osmnx graph as compressed NumPy arrays, rather than GraphML.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    nodes = list(G.nodes(data=True))
+    edges = list(G.edges(keys=True, data=True))
+    np.savez_compressed(path,
+                        graph=np.array([G.graph], dtype=object),
+                        node_id=np.array([n[0] for n in nodes], dtype=np.int64),
+                        edge_u=np.array([e[0] for e in edges], dtype=np.int64),
+                        edge_v=np.array([e[1] for e in edges], dtype=np.int64),
+                        edge_key=np.array([e[2] for e in edges], dtype=np.int64),
+                        **_attribute_arrays('node_attr_', [n[1] for n in nodes]),
+                        **_attribute_arrays('edge_attr_', [e[3] for e in edges]))
+    log.info('Saved graph with %s nodes and %s edges to %s' % (len(nodes), len(edges), path))
+
+
+def load_graph(path: str) -> nx.MultiDiGraph:
+    with np.load(path, allow_pickle=True) as arrays:
+        G = nx.MultiDiGraph(**arrays['graph'][0])
+        node_attributes = _attribute_dicts('node_attr_', arrays, len(arrays['node_id']))
+        G.add_nodes_from(zip(arrays['node_id'].tolist(), node_attributes))
+        edge_attributes = _attribute_dicts('edge_attr_', arrays, len(arrays['edge_u']))
+        G.add_edges_from(zip(arrays['edge_u'].tolist(), arrays['edge_v'].tolist(), 
+                             arrays['edge_key'].tolist(), edge_attributes))
+    log.info('Loaded graph with %s nodes and %s edges from %s' % (len(G), G.number_of_edges(), path))
+    return G
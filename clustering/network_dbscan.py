@@ -1,9 +1,17 @@
 from neo4j import Neo4jDriver
 from clustering.dbscan import DBSCAN
+from clustering.neighbourhood_graph import csr_from_pairs
+from clustering import metrics
+from clustering.road_network import RoadNetworkDistance
+from clustering.network_cache import cache_path, load_graph, load_node_distances, save_graph, save_node_distances
+from data_loader.neo4j_driver import get_driver
 
 import geopandas as gpd
+import numpy as np
 import osmnx as ox
+import pandas as pd
 import logging
+import os
 
 log = logging.getLogger()
 
@@ -51,6 +59,41 @@ CREATE (o)-[:CLOSEST_INTERSECTION {length: point.distance(o.geometry, next_acces
 return count(*) as total
 """
 
+bulk_observation_query = """
+UNWIND range(0, size($ids) - 1) AS i
+CREATE (o:Observation {id: $ids[i], unix_time: $unix_time[i], geometry: point({srid:4326, x: $longitude[i], y: $latitude[i]})})
+WITH o, i
+MATCH (v:Intersection {osmid: $nearest_node[i]})
+CREATE (o)-[:CLOSEST_INTERSECTION {length: $distance[i]}]->(v), (v)-[:CLOSEST_INTERSECTION {length: $distance[i]}]->(o)
+RETURN COUNT(*) AS total
+"""
+
+bulk_next_closest_intersection_query = """
+UNWIND $ids AS id
+match (o:Observation {id: id})-[:CLOSEST_INTERSECTION]->(i:Intersection)-[:ROAD_SEGMENT]->(i2:Intersection)
+with o, i2, point.distance(o.geometry, i2.location) as distance
+order by o.id, distance
+with o, apoc.agg.first(i2) as next_accessible_closest_intersection
+CREATE (o)-[:CLOSEST_INTERSECTION {length: point.distance(o.geometry, next_accessible_closest_intersection.location)}]->(next_accessible_closest_intersection), (next_accessible_closest_intersection)-[:CLOSEST_INTERSECTION {length: point.distance(o.geometry, next_accessible_closest_intersection.location)}]->(o)
+return count(*) as total
+"""
+
+bulk_time_bucket_query = """
+UNWIND $ids AS id
+MATCH (o:Observation {id: id})
+SET o.time_bucket = toInteger(floor(o.unix_time / $t_eps))
+RETURN count(*) as total
+"""
+
+delete_observations_query = """
+UNWIND $ids AS id
+MATCH (o:Observation {id: id})
+DETACH DELETE o
+RETURN count(*) as total
+"""
+
+observation_id_index_query = "CREATE RANGE INDEX observation_id IF NOT EXISTS FOR (o:Observation) ON (o.id)"
+
 project_graph_query = """
 CALL gds.graph.project(
     'network_distance',               
@@ -59,12 +102,56 @@ CALL gds.graph.project(
     {relationshipProperties:'length'}
 );"""
 
-def get_neighbourhood_data(tx, d_eps, t_eps):
+project_road_network_query = """
+CALL gds.graph.project(
+    'road_network',
+    'Intersection',
+    'ROAD_SEGMENT',
+    {relationshipProperties:'length'}
+);"""
+
+intersection_index_queries = [
+    "CREATE RANGE INDEX intersection_osmid IF NOT EXISTS FOR (i:Intersection) ON (i.osmid)",
+    "CREATE POINT INDEX intersection_location IF NOT EXISTS FOR (i:Intersection) ON (i.location)"
+]
+
+def get_overlay_node_distances(tx, sources, d_eps):
+    # Road distances from each source intersection to the intersections 
+    # within d_eps of it, on the road network projection. Road distances 
+    # are at least the straight-line distance, so targets are first found
+    # with the point index; the margin allows for the different earth radii
+    # of osmnx lengths and point.distance.
+    get_overlay_node_distances = """
+        UNWIND $sources AS source_osmid
+        MATCH (source:Intersection {osmid: source_osmid})
+        MATCH (target:Intersection)
+        WHERE point.distance(source.location, target.location) < $d_eps * 1.01
+        AND source <> target
+        WITH source, collect(target) AS targets
+        CALL gds.shortestPath.dijkstra.stream('road_network', {
+            sourceNode: source, 
+            targetNodes: targets, 
+            relationshipWeightProperty: 'length'
+        })
+        YIELD targetNode, totalCost
+        WITH source, targetNode, totalCost
+        where totalCost < $d_eps
+        RETURN 
+            source.osmid as source, 
+            gds.util.asNode(targetNode).osmid as target, 
+            totalCost as length
+        """
+    return tx.run(get_overlay_node_distances, sources=sources, d_eps=d_eps).to_df()
+
+def get_neighbourhood_data(tx, d_eps, t_eps, new_ids=None):
+    # If new_ids is given, only pairs involving one of these observations
+    # are returned.
     get_neighbourhood_data = """
         MATCH (source: Observation), (target: Observation)
         WHERE point.distance(source.geometry, target.geometry) < $d_eps 
         AND source <> target 
         AND abs(source.unix_time - target.unix_time) < $t_eps
+        AND ($new_ids IS NULL OR source.id IN $new_ids OR target.id IN $new_ids)
         CALL gds.shortestPath.dijkstra.stream('network_distance', {
             sourceNode:source, 
             targetNode:target, 
@@ -77,9 +164,89 @@ def get_neighbourhood_data(tx, d_eps, t_eps):
             gds.util.asNode(sourceNode).id as sourceNodeId, 
             gds.util.asNode(targetNode).id as targetNodeId, 
             totalCost, 
-            point.distance(source.geometry, target.geometry)
+            point.distance(source.geometry, target.geometry) as distance
+        """
+    return tx.run(get_neighbourhood_data, d_eps=d_eps, t_eps=t_eps, new_ids=new_ids).to_df()
+
+observation_index_queries = [
+    "CREATE POINT INDEX observation_geometry IF NOT EXISTS FOR (o:Observation) ON (o.geometry)",
+    "CREATE RANGE INDEX observation_unix_time IF NOT EXISTS FOR (o:Observation) ON (o.unix_time)",
+    "CREATE RANGE INDEX observation_time_bucket IF NOT EXISTS FOR (o:Observation) ON (o.time_bucket)"
+]
+
+time_bucket_query = """
+MATCH (o:Observation)
+SET o.time_bucket = toInteger(floor(o.unix_time / $t_eps))
+"""
+
+# GDS Dijkstra has no cost limit, so for the bucketed query the projection
+# only holds the road segments leaving intersections within d_eps of an
+# observation. A path shorter than d_eps never leaves d_eps of its source,
+# so every such path is kept, and Dijkstra cannot search beyond the 
+# neighbourhood of the frame's observations. The margin allows for the
+# different earth radii of osmnx lengths and point.distance.
+project_bounded_graph_query = """
+CALL {
+    MATCH (o:Observation)
+    MATCH (source:Intersection)
+    WHERE point.distance(o.geometry, source.location) < $d_eps * 1.01
+    WITH DISTINCT source
+    MATCH (source)-[r:ROAD_SEGMENT]->(target:Intersection)
+    RETURN source, target, r.length AS length
+    UNION ALL
+    MATCH (source)-[r:CLOSEST_INTERSECTION]->(target)
+    RETURN source, target, r.length AS length
+}
+WITH gds.graph.project('network_distance', source, target, {relationshipProperties: {length: length}}) AS g
+RETURN g.relationshipCount AS total
+"""
+
+def get_bucketed_neighbourhood_data(tx, d_eps, t_eps, new_ids=None):
+    # Observations within t_eps of each other are at most one t_eps bucket 
+    # apart, so targets are only looked up in the adjacent buckets, using 
+    # the indexes on time_bucket and geometry. Each source then runs one 
+    # Dijkstra to all of its candidate targets, rather than one per pair.
+    if new_ids is None:
+        candidate_pairs = """
+        MATCH (source: Observation)
+        UNWIND [source.time_bucket - 1, source.time_bucket, source.time_bucket + 1] AS bucket
+        MATCH (target: Observation {time_bucket: bucket})
+        WHERE point.distance(source.geometry, target.geometry) < $d_eps 
+        AND source <> target 
+        AND abs(source.unix_time - target.unix_time) < $t_eps
+        """
+    else:
+        # New observations are found through the index on id, and paired
+        # with their candidates in both directions.
+        candidate_pairs = """
+        UNWIND $new_ids AS id
+        MATCH (new: Observation {id: id})
+        UNWIND [new.time_bucket - 1, new.time_bucket, new.time_bucket + 1] AS bucket
+        MATCH (other: Observation {time_bucket: bucket})
+        WHERE point.distance(new.geometry, other.geometry) < $d_eps 
+        AND new <> other 
+        AND abs(new.unix_time - other.unix_time) < $t_eps
+        UNWIND [[new, other], [other, new]] AS pair
+        WITH DISTINCT pair[0] AS source, pair[1] AS target
+        """
+    get_neighbourhood_data = candidate_pairs + """
+        WITH source, collect(target) AS targets
+        CALL gds.shortestPath.dijkstra.stream('network_distance', {
+            sourceNode: source, 
+            targetNodes: targets, 
+            relationshipWeightProperty: 'length'
+        })
+        YIELD targetNode, totalCost
+        WITH source, targetNode, totalCost
+        where totalCost < $d_eps
+        WITH source, gds.util.asNode(targetNode) AS target, totalCost
+        RETURN 
+            source.id as sourceNodeId, 
+            target.id as targetNodeId, 
+            totalCost, 
+            point.distance(source.geometry, target.geometry) as distance
         """
-    return tx.run(get_neighbourhood_data, d_eps=d_eps, t_eps=t_eps).to_df()
+    return tx.run(get_neighbourhood_data, d_eps=d_eps, t_eps=t_eps, new_ids=new_ids).to_df()
 
 
 
@@ -95,22 +262,73 @@ def insert_data(tx, query, rows, batch_size=25000):
         total += results[0]['total']
         batch += 1
 
-def execute_query(tx, query):
-    tx.run(query)
+def execute_query(tx, query, **parameters):
+    tx.run(query, **parameters)
+
+def write_columns(tx, query, columns: dict, batch_size=50000, **parameters):
+    # Sends rows as one list parameter per column, in batches, rather than
+    # as a map per row.
+    n = len(next(iter(columns.values())))
+    total = 0
+    for start in range(0, n, batch_size):
+        batch = {name: np.asarray(values)[start:start + batch_size].tolist() for name, values in columns.items()}
+        total += tx.run(query, **batch, **parameters).single()['total']
+    return total
 
 class networkDBSCAN(DBSCAN):
 
-    def __init__(self, d_eps, t_eps, min_samples, extent, neo4jdriver, simplify=True):
-        DBSCAN.__init__(self, d_eps, t_eps, min_samples)
+    # 'neo4j' computes network distances with GDS in a Neo4j database. 
+    # 'neo4j_bucketed' does too, but pairs observations by time bucket.
+    # 'inprocess' computes them from the osmnx graph, with no database.
+    # 'table' looks them up in a precomputed table of intersection pairs.
+    # 'neo4j_overlay' projects the road network in GDS once, and joins the 
+    # observations of each frame onto road distances found on it.
+    backends = ['neo4j', 'neo4j_bucketed', 'inprocess', 'table', 'neo4j_overlay']
+
+    # Neighbours are strictly within t_eps of each other.
+    t_eps_inclusive = False
+
+    def __init__(self, d_eps, t_eps, min_samples, extent, neo4jdriver=None, simplify=True, 
+                 backend='neo4j', engine='iterative', cache_dir=None, bulk_write=False):
+        DBSCAN.__init__(self, d_eps, t_eps, min_samples, engine=engine)
+        if backend not in self.backends:
+            raise ValueError('Unknown backend %s, expected one of %s' % (backend, self.backends))
+        if bulk_write and backend not in ['neo4j', 'neo4j_bucketed']:
+            raise ValueError('bulk_write only applies to the neo4j and neo4j_bucketed backends')
+        if backend.startswith('neo4j') and neo4jdriver is None:
+            # Use the process-wide driver, shared with the data loader.
+            neo4jdriver = get_driver()
         # Expects a fresh db
         self.extent = extent
         self.driver = neo4jdriver
         self.simplify=simplify
+        self.backend = backend
+        self.cache_dir = cache_dir
+        # If bulk_write, observations are written with columnar parameters
+        # and kept in the database between frames, so that each frame only
+        # writes the observations that are new and deletes those that have
+        # left it. written_ids are the ids of those in the database, so ids
+        # must identify the same observation for the life of the instance.
+        self.bulk_write = bulk_write
+        self.written_ids = np.array([], dtype=np.int64)
+        # The Neo4j backends share one database and GDS graph name, and the
+        # driver cannot be sent to other processes.
+        self.parallel_safe = not backend.startswith('neo4j')
+        # The other backends find paths through the CLOSEST_INTERSECTION 
+        # relationships of every observation in the data, in both directions,
+        # so a distance can change as observations enter or leave it.
+        self.fixed_pair_distances = backend in ['table', 'neo4j_overlay']
 
         # This is always called as the first thing in fit.
         # So we can load the data into a fresh db, 
         # project the graph and prepare for the shortest path search.
         self.G = self.get_graph_from_osmnx(self.extent)
+
+        if self.backend in ['inprocess', 'table']:
+            self.road_network = RoadNetworkDistance(self.G)
+            if self.backend == 'table':
+                self.node_distances = self.get_node_distances()
+            return
         
         # Prepare data to load into neo4j
         gdf_nodes, gdf_relationships = ox.graph_to_gdfs(self.G)
@@ -120,31 +338,197 @@ class networkDBSCAN(DBSCAN):
         with self.driver.session(database="networkdistancetest") as session:
             session.execute_write(execute_query, "MATCH (n) DETACH DELETE n")
             session.execute_write(execute_query, "CALL gds.graph.drop('network_distance',false)")
-            session.execute_write(insert_data, node_query, gdf_nodes.drop(columns=['geometry']))
-            session.execute_write(insert_data, rels_query, gdf_relationships.drop(columns=['geometry']))
+            with metrics.timer('neo4j_insert'):
+                session.execute_write(insert_data, node_query, gdf_nodes.drop(columns=['geometry']))
+                session.execute_write(insert_data, rels_query, gdf_relationships.drop(columns=['geometry']))
+            if self.backend == 'neo4j_bucketed':
+                for query in observation_index_queries:
+                    session.execute_write(execute_query, query)
+            # New observations are looked up by id in the bucketed query.
+            if self.bulk_write or self.backend == 'neo4j_bucketed':
+                session.execute_write(execute_query, observation_id_index_query)
+            # Both find the intersections near observations by location.
+            if self.backend in ['neo4j_bucketed', 'neo4j_overlay']:
+                for query in intersection_index_queries:
+                    session.execute_write(execute_query, query)
+            if self.backend == 'neo4j_overlay':
+                session.execute_write(execute_query, "CALL gds.graph.drop('road_network',false)")
+                with metrics.timer('neo4j_project'):
+                    session.execute_write(execute_query, project_road_network_query)
+
+        if self.backend == 'neo4j_overlay':
+            # Observations never enter the database. They are attached to 
+            # intersections in-process, and road distances from each attached
+            # intersection are computed once and kept for later frames.
+            self.road_network = RoadNetworkDistance(self.G)
+            self.overlay_node_distances = pd.DataFrame({'source': np.array([], dtype=np.int64), 
+                                                        'target': np.array([], dtype=np.int64), 
+                                                        'length': np.array([], dtype=np.float64)})
     
-    def set_data(self, data: gpd.GeoDataFrame) -> None:
+    def set_data(self, data: gpd.GeoDataFrame, new: np.ndarray = None) -> None:
         self.data = data
+        # With bulk writes, observations are identified across frames by
+        # their original index, otherwise by their index in the frame.
+        if self.bulk_write and 'original_index' in self.data.columns:
+            self.observation_ids = self.data['original_index'].values
+        else:
+            self.observation_ids = self.data.index.values
         
         # Find nearest nodes using osmnx
-        self.data['nearest_node'], self.data['distance'] = \
-            ox.nearest_nodes(self.G, self.data['longitude'], self.data['latitude'], 
-                             return_dist=True)
-        
+        with metrics.timer('nearest_nodes'):
+            self.data['nearest_node'], self.data['distance'] = \
+                ox.nearest_nodes(self.G, self.data['longitude'], self.data['latitude'], 
+                                 return_dist=True)
+
+        if self.backend == 'inprocess':
+            with metrics.timer('network_distances'):
+                self.neighbourhood_data = self.road_network.get_neighbourhood_data(self.data, self.d_eps, self.t_eps, new=new)
+        elif self.backend == 'table':
+            with metrics.timer('network_distances'):
+                self.neighbourhood_data = self.road_network.get_neighbourhood_data_from_table(
+                    self.data, self.node_distances, self.d_eps, self.t_eps, new=new)
+        elif self.backend == 'neo4j_overlay':
+            attachments = self.road_network.get_attachments(self.data)
+            node_distances = self.get_node_distances_from_neo4j(self.road_network.node_ids[attachments['node'].values])
+            with metrics.timer('network_distances'):
+                self.neighbourhood_data = self.road_network.get_neighbourhood_data_from_table(
+                    self.data, node_distances, self.d_eps, self.t_eps, new=new, attachments=attachments)
+        else:
+            self.neighbourhood_data = self.get_neighbourhood_data_from_neo4j(new=new)
+
+        self.set_adjacency()
+
+    def get_neighbourhood_data_from_neo4j(self, new: np.ndarray = None) -> pd.DataFrame:
+        new_ids = None if new is None else self.observation_ids[new].tolist()
+        if self.bulk_write:
+            return self.get_neighbourhood_data_from_neo4j_bulk(new_ids)
         with self.driver.session(database="networkdistancetest") as session:
-            session.execute_write(insert_data, closest_intersection_query, self.data.drop(columns=['geometry']).reset_index())
-            session.execute_write(execute_query, next_closest_intersection_query)
-            session.execute_write(execute_query, project_graph_query)
-            self.neighbourhood_data = session.execute_read(get_neighbourhood_data, self.d_eps, self.t_eps)
+            with metrics.timer('neo4j_insert'):
+                session.execute_write(insert_data, closest_intersection_query, self.data.drop(columns=['geometry']).reset_index())
+                session.execute_write(execute_query, next_closest_intersection_query)
+                if self.backend == 'neo4j_bucketed':
+                    session.execute_write(execute_query, time_bucket_query, t_eps=self.t_eps)
+            with metrics.timer('neo4j_project'):
+                self.project_graph(session)
+            with metrics.timer('neo4j_query'):
+                if self.backend == 'neo4j_bucketed':
+                    neighbourhood_data = session.execute_read(get_bucketed_neighbourhood_data, self.d_eps, self.t_eps, new_ids)
+                else:
+                    neighbourhood_data = session.execute_read(get_neighbourhood_data, self.d_eps, self.t_eps, new_ids)
             session.execute_write(execute_query, "CALL gds.graph.drop('network_distance',false)")
             session.execute_write(execute_query, "MATCH (o:Observation) DETACH DELETE o")
+        return neighbourhood_data
+
+    def get_pair_distances(self):
+        # Pairs are neighbours if both their network distance and their 
+        # straight-line distance are within d_eps.
+        positions = pd.Index(self.observation_ids)
+        rows = positions.get_indexer(self.neighbourhood_data['sourceNodeId'].values)
+        cols = positions.get_indexer(self.neighbourhood_data['targetNodeId'].values)
+        distance = np.maximum(self.neighbourhood_data['totalCost'].values.astype(np.float64), 
+                              self.neighbourhood_data['distance'].values.astype(np.float64))
+        return rows, cols, distance
+
+    def write_observations(self) -> None:
+        # Deletes the observations that are no longer in the frame and 
+        # writes those that are not in the database yet.
+        ids = self.observation_ids
+        expired = np.setdiff1d(self.written_ids, ids)
+        is_new = ~np.isin(ids, self.written_ids)
+        new_data = self.data[is_new]
+        with self.driver.session(database="networkdistancetest") as session:
+            session.execute_write(write_columns, delete_observations_query, {'ids': expired})
+            session.execute_write(write_columns, bulk_observation_query, {
+                'ids': ids[is_new], 
+                'unix_time': new_data['unix_time'].values,
+                'longitude': new_data['longitude'].values,
+                'latitude': new_data['latitude'].values,
+                'nearest_node': new_data['nearest_node'].values,
+                'distance': new_data['distance'].values})
+            session.execute_write(write_columns, bulk_next_closest_intersection_query, {'ids': ids[is_new]})
+            if self.backend == 'neo4j_bucketed':
+                session.execute_write(write_columns, bulk_time_bucket_query, {'ids': ids[is_new]}, t_eps=self.t_eps)
+        log.info('Wrote %s observations and deleted %s' % (is_new.sum(), len(expired)))
+        self.written_ids = np.asarray(ids)
+
+    def project_graph(self, session) -> None:
+        if self.backend == 'neo4j_bucketed':
+            session.execute_write(execute_query, project_bounded_graph_query, d_eps=self.d_eps)
+        else:
+            session.execute_write(execute_query, project_graph_query)
+
+    def get_neighbourhood_data_from_neo4j_bulk(self, new_ids: list = None) -> pd.DataFrame:
+        with metrics.timer('neo4j_insert'):
+            self.write_observations()
+        with self.driver.session(database="networkdistancetest") as session:
+            with metrics.timer('neo4j_project'):
+                self.project_graph(session)
+            with metrics.timer('neo4j_query'):
+                if self.backend == 'neo4j_bucketed':
+                    neighbourhood_data = session.execute_read(get_bucketed_neighbourhood_data, self.d_eps, self.t_eps, new_ids)
+                else:
+                    neighbourhood_data = session.execute_read(get_neighbourhood_data, self.d_eps, self.t_eps, new_ids)
+            session.execute_write(execute_query, "CALL gds.graph.drop('network_distance',false)")
+        return neighbourhood_data
+
+    def set_adjacency(self) -> None:
+        # Converts the neighbourhood data into CSR arrays once per frame, so
+        # that each neighbour lookup is a slice rather than a DataFrame filter.
+        if self.neighbourhood_data.shape[0] == 0:
+            source = target = np.array([], dtype=np.int64)
+        else:
+            positions = pd.Index(self.observation_ids)
+            source = positions.get_indexer(self.neighbourhood_data['sourceNodeId'].values)
+            target = positions.get_indexer(self.neighbourhood_data['targetNodeId'].values)
+        self.indptr, self.indices = csr_from_pairs(source, target, len(self.data))
+
+    def get_node_distances_from_neo4j(self, nodes: np.ndarray) -> pd.DataFrame:
+        # Returns the road distances from the given intersections, querying
+        # the projection only for intersections not seen in earlier frames.
+        nodes = np.unique(nodes)
+        missing = nodes[~np.isin(nodes, self.overlay_node_distances['source'].values)]
+        if len(missing) > 0:
+            with self.driver.session(database="networkdistancetest") as session, metrics.timer('neo4j_query'):
+                node_distances = session.execute_read(get_overlay_node_distances, missing.tolist(), self.d_eps)
+            # Each intersection is also at no distance from itself.
+            self.overlay_node_distances = pd.concat([
+                self.overlay_node_distances, 
+                pd.DataFrame({'source': missing, 'target': missing, 'length': np.zeros(len(missing))}),
+                node_distances[['source', 'target', 'length']]], ignore_index=True)
+            log.info('Computed road distances from %s new intersections' % len(missing))
+        return self.overlay_node_distances[np.isin(self.overlay_node_distances['source'].values, nodes)]
+
+    def get_node_distances(self):
+        # The road network for an extent does not change, so the table of 
+        # intersection pairs within d_eps is kept on disk if we have a cache.
+        if self.cache_dir is None:
+            return self.road_network.get_node_distances(self.d_eps)
+        path = cache_path(self.cache_dir, 'node_distances', extent=self.extent, 
+                          simplify=self.simplify, network_type='drive', d_eps=self.d_eps)
+        if os.path.exists(path):
+            return load_node_distances(path)
+        node_distances = self.road_network.get_node_distances(self.d_eps)
+        save_node_distances(path, node_distances)
+        return node_distances
 
     def get_graph_from_osmnx(self, extent:list):
+        # Use the local copy of the graph if we have one.
+        if self.cache_dir is not None:
+            path = cache_path(self.cache_dir, 'graph', extent=extent, 
+                              simplify=self.simplify, network_type='drive')
+            if os.path.exists(path):
+                return load_graph(path)
         # Reformat for osmnx spec
         extent_reformatted = [extent[3], extent[2], extent[0], extent[1]]
-        return ox.graph_from_bbox(bbox=extent_reformatted, network_type='drive', simplify=self.simplify)
+        G = ox.graph_from_bbox(bbox=extent_reformatted, network_type='drive', simplify=self.simplify)
+        if self.cache_dir is not None:
+            save_graph(path, G)
+        return G
         
+    def _neighbourhood_graph(self):
+        return self.indptr, self.indices
+
     def _retrieve_neighbours(self, i):
-        log.debug('Retrieving neighbours for index %s' % i)
-        neighbours = self.neighbourhood_data[self.neighbourhood_data['sourceNodeId']==i]['targetNodeId'].tolist()
-        return neighbours
+        log.debug('Retrieving neighbours for index %s', i)
+        return self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()
+
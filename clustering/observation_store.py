@@ -0,0 +1,75 @@
+from clustering import metrics
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import logging
+
+log = logging.getLogger()
+
+class ObservationFrame:
+
+    # The observations of one frame: the arrays of an ObservationStore over
+    # positions [lo, hi), in input order and indexed from 0 within the
+    # frame as the frames of get_frames are.
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, t: np.ndarray, original_index: np.ndarray, lo=0):
+        self.x = x
+        self.y = y
+        self.t = t
+        self.original_index = original_index
+        self.lo = lo
+        self.index = pd.RangeIndex(len(t))
+
+    def __len__(self):
+        return len(self.t)
+
+
+class ObservationStore:
+    """
+    The observations of a run, projected to EPSG:27700 once and kept in
+    contiguous x/y (float64) and time (int64) arrays sorted by time, so
+    each frame is a range of positions found by binary search rather than
+    a filtered, reprojected copy.
+
+    Frames hold the same observations in the same order as those of
+    get_frames, so clusters are found and numbered as they are from
+    GeoDataFrame frames. For observations already sorted by time, as from
+    prepare_slow_observations, their arrays are views of the store; for
+    others, each frame's range is put back in input order.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame):
+        # Input position of each observation, in time order.
+        self.position = np.argsort(gdf['unix_time'].values, kind='stable')
+        self.in_order = bool(np.all(np.diff(self.position) > 0))
+        with metrics.timer('projection'):
+            geometry = gdf.geometry.to_crs(27700)
+        self.x = np.ascontiguousarray(geometry.x.values[self.position], dtype=np.float64)
+        self.y = np.ascontiguousarray(geometry.y.values[self.position], dtype=np.float64)
+        self.t = np.ascontiguousarray(gdf['unix_time'].values[self.position], dtype=np.int64)
+        self.original_index = gdf.index.values[self.position]
+
+    def __len__(self):
+        return len(self.t)
+
+    def frame_range(self, start: int, end: int) -> tuple[int, int]:
+        # Returns [lo, hi), the positions of observations with start <= unix_time <= end.
+        return int(np.searchsorted(self.t, start, side='left')), \
+               int(np.searchsorted(self.t, end, side='right'))
+
+    def get_frame(self, lo: int, hi: int) -> ObservationFrame:
+        if self.in_order:
+            return ObservationFrame(self.x[lo:hi], self.y[lo:hi], self.t[lo:hi],
+                                    self.original_index[lo:hi], lo=lo)
+        rows = lo + np.argsort(self.position[lo:hi])
+        return ObservationFrame(self.x[rows], self.y[rows], self.t[rows],
+                                self.original_index[rows], lo=lo)
+
+    def frames(self, frame_size, frame_overlap):
+        # Yields the same overlapping frames as get_frames.
+        if len(self) == 0:
+            return
+        for i in range(self.t[0], self.t[-1], (frame_size - frame_overlap + 1)):
+            lo, hi = self.frame_range(i, frame_size + i)
+            log.info(f"Frame size: {hi - lo}")
+            yield self.get_frame(lo, hi)
@@ -0,0 +1,100 @@
+from clustering.dbscan import DBSCAN
+from clustering.frame_split_method import frame_split_method
+from clustering.neighbourhood_graph import csr_from_pairs
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import logging
+
+log = logging.getLogger()
+
+class pairStore:
+    """
+    Sparse store of the neighbour pairs of a data set at the largest d_eps
+    and t_eps of a parameter sweep, with the distance and time gap of each
+    pair. The neighbours for any smaller d_eps and t_eps are a filter of it.
+    """
+
+    def __init__(self, ids: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                 distance: np.ndarray, time_gap: np.ndarray, t_eps_inclusive=True):
+        self.ids = pd.Index(ids)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.distance = np.asarray(distance, dtype=np.float64)
+        self.time_gap = np.asarray(time_gap)
+        self.t_eps_inclusive = t_eps_inclusive
+
+    def __len__(self):
+        return len(self.rows)
+
+    def filter(self, d_eps, t_eps) -> tuple[np.ndarray, np.ndarray]:
+        # Returns the pairs (by position in the store) that are neighbours
+        # for d_eps and t_eps.
+        in_time = self.time_gap <= t_eps if self.t_eps_inclusive else self.time_gap < t_eps
+        keep = (self.distance < d_eps) & in_time
+        return self.rows[keep], self.cols[keep]
+
+
+def get_pair_store(gdf: gpd.GeoDataFrame, cluster_algo: DBSCAN) -> pairStore:
+    # Computes the neighbour pairs of the whole data set once, with the
+    # d_eps and t_eps of cluster_algo.
+    cluster_algo.set_data(gdf.copy())
+    rows, cols, distance = cluster_algo.get_pair_distances()
+    unix_time = gdf['unix_time'].values
+    log.info('Stored %s neighbour pairs for d_eps %s and t_eps %s' % (len(rows), cluster_algo.d_eps, cluster_algo.t_eps))
+    return pairStore(gdf.index.values, rows, cols, distance, np.abs(unix_time[rows] - unix_time[cols]),
+                     t_eps_inclusive=cluster_algo.t_eps_inclusive)
+
+
+class precomputedDBSCAN(DBSCAN):
+
+    # Neighbours are looked up in a pairStore, filtered to d_eps and t_eps
+    # once, and then to the observations of each frame.
+
+    def __init__(self, pair_store: pairStore, d_eps, t_eps, min_samples, engine='graph'):
+        DBSCAN.__init__(self, d_eps, t_eps, min_samples, engine=engine)
+        self.pair_store = pair_store
+        self.t_eps_inclusive = pair_store.t_eps_inclusive
+        self.rows, self.cols = pair_store.filter(d_eps, t_eps)
+
+    def set_data(self, data: gpd.GeoDataFrame, new: np.ndarray = None) -> None:
+        self.data = data
+        ids = data['original_index'].values if 'original_index' in data.columns else data.index.values
+        # Position in this frame of each observation in the store, or -1.
+        frame_position = np.full(len(self.pair_store.ids), -1, dtype=np.int64)
+        frame_position[self.pair_store.ids.get_indexer(ids)] = np.arange(len(ids))
+        rows = frame_position[self.rows]
+        cols = frame_position[self.cols]
+        in_frame = (rows > -1) & (cols > -1)
+        self.indptr, self.indices = csr_from_pairs(rows[in_frame], cols[in_frame], len(ids))
+
+    def _neighbourhood_graph(self):
+        return self.indptr, self.indices
+
+    def _retrieve_neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+
+def parameter_sweep(gdf: gpd.GeoDataFrame, cluster_algo: DBSCAN, parameters: list,
+                    frame_size=None, n_workers=1) -> dict:
+    # Runs frame_split_method for each (d_eps, t_eps, min_samples) in
+    # parameters, from one computation of neighbour pairs by cluster_algo,
+    # which must have the largest d_eps and t_eps of them. Returns the
+    # merged labels of each combination. Pairs are computed over the whole
+    # data set, so their distances must not depend on the other observations.
+    if not cluster_algo.fixed_pair_distances:
+        raise ValueError('%s cannot compute the pairs of a sweep for the whole data set' % \
+                         type(cluster_algo).__name__)
+    for d_eps, t_eps, _ in parameters:
+        if d_eps > cluster_algo.d_eps or t_eps > cluster_algo.t_eps:
+            raise ValueError('Parameters (%s, %s) exceed the d_eps and t_eps of %s' % \
+                             (d_eps, t_eps, type(cluster_algo).__name__))
+
+    pair_store = get_pair_store(gdf, cluster_algo)
+    results = {}
+    for d_eps, t_eps, min_samples in parameters:
+        log.info('Clustering with d_eps %s, t_eps %s and min_samples %s' % (d_eps, t_eps, min_samples))
+        sweep_algo = precomputedDBSCAN(pair_store, d_eps, t_eps, min_samples)
+        results[(d_eps, t_eps, min_samples)] = frame_split_method(gdf, sweep_algo, frame_size=frame_size,
+                                                                  n_workers=n_workers)
+    return results
@@ -0,0 +1,221 @@
+import logging
+import numpy as np
+import pandas as pd
+import osmnx as ox
+from networkx import MultiDiGraph
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from clustering.neighbourhood_graph import csr_from_pairs
+
+log = logging.getLogger()
+
+# Earth radius used by Neo4j's point.distance for WGS-84 points, so that
+# in-process distances match those computed in the database.
+NEO4J_EARTH_RADIUS_M = 6378140.0
+
+# Upper bound on the number of distances held in memory per Dijkstra batch.
+MAX_BATCH_DISTANCES = 2 * 10**7
+
+def point_distance(lat1, lon1, lat2, lon2):
+    return ox.distance.great_circle(lat1, lon1, lat2, lon2, earth_radius=NEO4J_EARTH_RADIUS_M)
+
+
+def build_adjacency(u: np.ndarray, v: np.ndarray, length: np.ndarray, n: int) -> csr_matrix:
+    # Directed sparse adjacency keeping the shortest of any parallel edges.
+    # Built from CSR arrays directly so zero-length edges are kept as edges.
+    edges = pd.DataFrame({'u': u, 'v': v, 'length': length})\
+              .groupby(['u', 'v'], as_index=False, sort=True)['length'].min()
+    indptr, indices = csr_from_pairs(edges['u'].values, edges['v'].values, n)
+    return csr_matrix((edges['length'].values, indices, indptr), shape=(n, n))
+
+
+class RoadNetworkDistance:
+    """
+    Computes bounded network distances between observations in-process,
+    from the osmnx road graph, rather than with GDS in Neo4j.
+
+    Observations are attached to their closest intersection, and to the
+    closest intersection reachable along a road segment from it, in both
+    directions (the CLOSEST_INTERSECTION relationships). Distances are then
+    found with a multi-source Dijkstra cut off at d_eps on a scipy sparse
+    adjacency of the roads plus these attachments.
+    """
+
+    def __init__(self, G: MultiDiGraph):
+        gdf_nodes, gdf_relationships = ox.graph_to_gdfs(G, fill_edge_geometry=False)
+        self.node_ids = gdf_nodes.index.values
+        self.node_lon = gdf_nodes['x'].values.astype(np.float64)
+        self.node_lat = gdf_nodes['y'].values.astype(np.float64)
+        self.node_position = pd.Series(np.arange(len(self.node_ids)), index=self.node_ids)
+
+        self.u = self.node_position[gdf_relationships.index.get_level_values('u')].values
+        self.v = self.node_position[gdf_relationships.index.get_level_values('v')].values
+        self.length = gdf_relationships['length'].values.astype(np.float64)
+        self.roads = build_adjacency(self.u, self.v, self.length, len(self.node_ids))
+
+    def get_attachments(self, data: pd.DataFrame) -> pd.DataFrame:
+        # Returns one row per CLOSEST_INTERSECTION attachment, with the
+        # position of the observation, the position of the intersection and
+        # the snapping offset. Expects 'nearest_node' and 'distance' columns.
+        obs = np.arange(len(data))
+        nearest = self.node_position[data['nearest_node'].values].values
+        lon = data['longitude'].values
+        lat = data['latitude'].values
+
+        # The next accessible closest intersection is the closest intersection
+        # one road segment on from the nearest intersection.
+        counts = np.diff(self.roads.indptr)[nearest]
+        candidate_obs = np.repeat(obs, counts)
+        starts = np.repeat(self.roads.indptr[nearest] - (np.cumsum(counts) - counts), counts)
+        candidate_node = self.roads.indices[starts + np.arange(counts.sum())]
+        candidate_distance = point_distance(lat[candidate_obs], lon[candidate_obs],
+                                            self.node_lat[candidate_node], self.node_lon[candidate_node])
+        order = np.lexsort((candidate_distance, candidate_obs))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = candidate_obs[order][1:] != candidate_obs[order][:-1]
+        next_closest = order[first]
+
+        return pd.DataFrame({
+            'obs': np.concatenate([obs, candidate_obs[next_closest]]),
+            'node': np.concatenate([nearest, candidate_node[next_closest]]),
+            'length': np.concatenate([data['distance'].values.astype(np.float64),
+                                      candidate_distance[next_closest]])
+            })
+
+    def get_neighbourhood_data(self, data: pd.DataFrame, d_eps, t_eps, new: np.ndarray = None) -> pd.DataFrame:
+        # If new is given, only pairs involving a new observation are returned.
+        n_nodes = len(self.node_ids)
+        n_obs = len(data)
+        attachments = self.get_attachments(data)
+
+        # Observations are numbered after the intersections in the combined graph.
+        obs_node = attachments['obs'].values + n_nodes
+        u = np.concatenate([self.u, obs_node, attachments['node'].values])
+        v = np.concatenate([self.v, attachments['node'].values, obs_node])
+        length = np.concatenate([self.length, attachments['length'].values, attachments['length'].values])
+        graph = build_adjacency(u, v, length, n_nodes + n_obs)
+
+        sources = np.arange(n_obs) if new is None else np.flatnonzero(new)
+        neighbourhood_data = [self._filter_pairs(data, source, target, total_cost, d_eps, t_eps) 
+                              for source, target, total_cost in self._bounded_distances(graph, sources, n_nodes, d_eps)]
+
+        if new is not None:
+            # Paths from old to new observations, found by searching 
+            # backwards from the new observations on the reversed graph.
+            reverse = build_adjacency(v, u, length, n_nodes + n_obs)
+            for target, source, total_cost in self._bounded_distances(reverse, sources, n_nodes, d_eps):
+                old = ~new[source]
+                neighbourhood_data.append(self._filter_pairs(data, source[old], target[old], 
+                                                             total_cost[old], d_eps, t_eps))
+
+        return self._concat_pairs(neighbourhood_data)
+
+    def _bounded_distances(self, graph: csr_matrix, sources: np.ndarray, n_nodes: int, d_eps):
+        # Yields (source, target, cost) arrays of the observations within d_eps
+        # of each source, running Dijkstra in batches of sources.
+        batch_size = max(1, MAX_BATCH_DISTANCES // graph.shape[0])
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            distances = dijkstra(graph, directed=True, indices=batch + n_nodes, limit=d_eps)[:, n_nodes:]
+            source, target = np.nonzero(distances < d_eps)
+            yield batch[source], target, distances[source, target]
+
+    def get_node_distances(self, d_eps) -> pd.DataFrame:
+        # Returns every pair of intersections within d_eps road distance of 
+        # each other, including each intersection with itself, keyed by osmid.
+        n_nodes = len(self.node_ids)
+        node_distances = []
+        batch_size = max(1, MAX_BATCH_DISTANCES // n_nodes)
+        for start in range(0, n_nodes, batch_size):
+            sources = np.arange(start, min(start + batch_size, n_nodes))
+            distances = dijkstra(self.roads, directed=True, indices=sources, limit=d_eps)
+            source, target = np.nonzero(distances < d_eps)
+            node_distances.append(pd.DataFrame({'source': self.node_ids[sources[source]],
+                                                'target': self.node_ids[target],
+                                                'length': distances[source, target]}))
+        return pd.concat(node_distances, ignore_index=True)
+
+    def get_neighbourhood_data_from_table(self, data: pd.DataFrame, node_distances: pd.DataFrame, 
+                                          d_eps, t_eps, new: np.ndarray = None, 
+                                          attachments: pd.DataFrame = None) -> pd.DataFrame:
+        # Observation to observation distances are the snapping offset to an
+        # intersection, plus the road distance between intersections looked 
+        # up in node_distances, plus the snapping offset from the intersection.
+        # Unlike a Dijkstra over the graph with attached observations, paths
+        # cannot pass through other observations. If new is given, only pairs
+        # involving a new observation are returned. attachments can be passed
+        # in if they were already found for data.
+        if attachments is None:
+            attachments = self.get_attachments(data)
+        if new is None:
+            new = np.ones(len(data), dtype=bool)
+        attachment_new = new[attachments['obs'].values]
+        node_distances = pd.DataFrame({
+            'node': self.node_position.reindex(node_distances['source'].values).values,
+            'target_node': self.node_position.reindex(node_distances['target'].values).values,
+            'node_length': node_distances['length'].values}).dropna()
+        node_distances[['node', 'target_node']] = node_distances[['node', 'target_node']].astype(np.int64)
+
+        # Sources are processed in chunks of time, joined only with targets
+        # that can be within t_eps of them, to bound the size of the joins.
+        unix_time = data['unix_time'].values
+        order = np.argsort(unix_time, kind='stable')
+        sorted_time = unix_time[order]
+        attachment_time = unix_time[attachments['obs'].values]
+
+        neighbourhood_data = []
+        mean_degree = max(1, len(node_distances) // max(1, len(self.node_ids)))
+        chunk_size = max(1, MAX_BATCH_DISTANCES // mean_degree)
+        for start in range(0, len(order), chunk_size):
+            sources = order[start:start + chunk_size]
+            min_time = sorted_time[start] - t_eps
+            max_time = sorted_time[min(start + chunk_size, len(order)) - 1] + t_eps
+
+            is_source = np.isin(attachments['obs'].values, sources)
+            is_target = (attachment_time > min_time) & (attachment_time < max_time)
+
+            # New sources are joined with all targets, old sources only with new targets.
+            for source_mask, target_mask in [(is_source & attachment_new, is_target), 
+                                             (is_source & ~attachment_new, is_target & attachment_new)]:
+                pairs = self._join_attachments(attachments[source_mask], attachments[target_mask], 
+                                               node_distances, d_eps)
+                neighbourhood_data.append(self._filter_pairs(data, pairs['obs'].values, pairs['obs_target'].values, 
+                                                             pairs['length'].values, d_eps, t_eps))
+
+        return self._concat_pairs(neighbourhood_data)
+
+    def _join_attachments(self, source_attachments: pd.DataFrame, target_attachments: pd.DataFrame, 
+                          node_distances: pd.DataFrame, d_eps) -> pd.DataFrame:
+        pairs = source_attachments.merge(node_distances, on='node')
+        pairs['length'] += pairs['node_length']
+        pairs = pairs[pairs['length'] < d_eps]
+        pairs = pairs[['obs', 'target_node', 'length']]\
+                  .merge(target_attachments, left_on='target_node', right_on='node', suffixes=('', '_target'))
+        pairs['length'] += pairs['length_target']
+        return pairs[pairs['length'] < d_eps]\
+                 .groupby(['obs', 'obs_target'], as_index=False)['length'].min()
+
+    def _filter_pairs(self, data: pd.DataFrame, source: np.ndarray, target: np.ndarray, 
+                      total_cost: np.ndarray, d_eps, t_eps) -> pd.DataFrame:
+        # Applies the remaining conditions of the neighbourhood query to
+        # (source, target) pairs given by position, and returns them by id.
+        unix_time = data['unix_time'].values
+        lon = data['longitude'].values
+        lat = data['latitude'].values
+        ids = data.index.values
+
+        straight_line = point_distance(lat[source], lon[source], lat[target], lon[target])
+        keep = (source != target) & \
+               (np.abs(unix_time[source] - unix_time[target]) < t_eps) & \
+               (straight_line < d_eps)
+        return pd.DataFrame({'sourceNodeId': ids[source[keep]],
+                             'targetNodeId': ids[target[keep]],
+                             'totalCost': total_cost[keep],
+                             'distance': straight_line[keep]})
+
+    def _concat_pairs(self, neighbourhood_data: list) -> pd.DataFrame:
+        log.info('Computed %s network neighbour pairs in-process' % sum(len(df) for df in neighbourhood_data))
+        if len(neighbourhood_data) == 0:
+            return pd.DataFrame(columns=['sourceNodeId', 'targetNodeId', 'totalCost', 'distance'])
+        return pd.concat(neighbourhood_data, ignore_index=True)
@@ -0,0 +1,73 @@
+from clustering.dbscan import DBSCAN
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import logging
+
+log = logging.getLogger()
+
+class slidingWindowDBSCAN:
+    """
+    Clusters a sliding time window for near-real-time runs, updating the
+    window rather than re-clustering it from scratch at every step.
+
+    Each update adds the observations that have arrived since the last one
+    and expires those older than the window. Neighbour pairs between the
+    observations still in the window are carried over, so only the pairs
+    involving new observations are computed by the clustering algorithm,
+    and the window is then relabelled from the neighbourhood graph. So the
+    distance between two observations must not depend on which others are
+    in the window.
+    """
+
+    def __init__(self, cluster_algo: DBSCAN, window: int):
+        if not cluster_algo.fixed_pair_distances:
+            raise ValueError('%s cannot carry neighbour pairs between windows' % type(cluster_algo).__name__)
+        self.cluster_algo = cluster_algo
+        self.window = window
+        self.data = None
+        self.labels = np.array([], dtype=np.int64)
+        self.core = np.array([], dtype=np.int64)
+        # Neighbour pairs of the window, by observation id.
+        self.pairs = None
+        self.next_id = 0
+
+    def update(self, gdf_new: gpd.GeoDataFrame, window_end: int) -> None:
+        # Adds the new observations and clusters the window of observations
+        # with unix_time in [window_end - window, window_end).
+        gdf_new = gdf_new[gdf_new['unix_time'] < window_end].copy()
+        # Observations are given ids in order of arrival, which stay the same
+        # for as long as they are in the window.
+        gdf_new.index = pd.RangeIndex(self.next_id, self.next_id + gdf_new.shape[0])
+        self.next_id += gdf_new.shape[0]
+
+        data = gdf_new if self.data is None else pd.concat([self.data, gdf_new])
+        data = data[data['unix_time'] >= window_end - self.window]
+        log.info('Window ending %s: %s observations, %s new' % (window_end, data.shape[0], gdf_new.shape[0]))
+
+        new = np.isin(data.index.values, gdf_new.index.values)
+        carried_pairs = None
+        if self.pairs is not None:
+            positions = pd.Index(data.index)
+            rows = positions.get_indexer(self.pairs[0])
+            cols = positions.get_indexer(self.pairs[1])
+            in_window = (rows > -1) & (cols > -1)
+            carried_pairs = (rows[in_window], cols[in_window])
+
+        self.data = data
+        if data.shape[0] == 0:
+            self.labels = np.array([], dtype=np.int64)
+            self.core = np.array([], dtype=np.int64)
+            self.pairs = None
+            return
+
+        self.cluster_algo.fit(data.copy(), new=new, carried_pairs=carried_pairs)
+        self.labels = self.cluster_algo.labels
+        self.core = self.cluster_algo.core
+        self.pairs = tuple(data.index.values[p] for p in self.cluster_algo.pairs)
+
+    def get_clustered_data(self) -> gpd.GeoDataFrame:
+        # Returns the observations in the window with their cluster labels.
+        gdf = self.data.copy()
+        gdf['cluster'] = self.labels
+        return gdf
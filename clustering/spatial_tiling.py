@@ -0,0 +1,230 @@
+from clustering.dbscan import DBSCAN
+from clustering.frame_split_method import common_core_point, core_plus_marginal_point
+from clustering.label_store import LabelStore
+from clustering.observation_store import ObservationFrame
+from clustering.st_index import CELL_OFFSETS
+from clustering import metrics
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import logging
+import time
+
+log = logging.getLogger()
+
+def get_tiles(x: np.ndarray, y: np.ndarray, tile_size, halo) -> list:
+    # Cuts the extent of x/y into square tiles of tile_size, and returns, for
+    # each tile that owns observations, the sorted positions of observations
+    # in the tile or within halo of it, and a mask of those it owns. Each
+    # observation is owned by the one tile it lies in.
+    if len(x) == 0:
+        return []
+    x0, y0 = x.min(), y.min()
+    cx = np.floor((x - x0) / tile_size).astype(np.int64)
+    cy = np.floor((y - y0) / tile_size).astype(np.int64)
+    # Tile keys are padded by one tile on each side, as in SpatioTemporalIndex.
+    cy_span = cy.max() + 3
+
+    positions, keys, owned = [], [], []
+    for dx, dy in CELL_OFFSETS:
+        tx, ty = cx + dx, cy + dy
+        # Observations within halo of the tile offset by (dx, dy).
+        in_tile = (x > x0 + tx * tile_size - halo) & (x < x0 + (tx + 1) * tile_size + halo) & \
+                  (y > y0 + ty * tile_size - halo) & (y < y0 + (ty + 1) * tile_size + halo)
+        points = np.flatnonzero(in_tile)
+        positions.append(points)
+        keys.append((tx[points] + 1) * cy_span + (ty[points] + 1))
+        owned.append(np.full(len(points), dx == 0 and dy == 0))
+    positions, keys, owned = np.concatenate(positions), np.concatenate(keys), np.concatenate(owned)
+
+    order = np.lexsort((positions, keys))
+    positions, keys, owned = positions[order], keys[order], owned[order]
+    _, starts = np.unique(keys, return_index=True)
+    tiles = zip(np.split(positions, starts[1:]), np.split(owned, starts[1:]))
+    # Tiles that own nothing only repeat what the tiles around them find.
+    return [(tile_positions, tile_owned) for tile_positions, tile_owned in tiles if tile_owned.any()]
+
+
+def merge_tiles(n: int, tiles: list, fitted_tiles: list) -> tuple[np.ndarray, np.ndarray]:
+    # Combines the labels and core flags of each tile into those of the n
+    # observations of the frame.
+    #
+    # With a halo of at least d_eps, an observation's neighbours are all in
+    # the tile that owns it, so its core flag there is exact; in other tiles
+    # it can only be too low. Clusters of different tiles are merged as the
+    # clusters of consecutive time frames are, where an observation in both
+    # is a core point in both, or a core point in either.
+    entries = []
+    offset = 0
+    for tile, ((positions, owned), (labels, core)) in enumerate(zip(tiles, fitted_tiles)):
+        labels = np.asarray(labels, dtype=np.int64)
+        # Cluster labels are made unique across tiles.
+        entries.append(pd.DataFrame({'original_index': positions,
+                                     'tile': tile,
+                                     'cluster': np.where(labels > 0, labels + offset, -1),
+                                     'core': np.asarray(core, dtype=np.int64),
+                                     'owned': owned}))
+        offset += max(int(labels.max(initial=0)), 0)
+    entries = pd.concat(entries, ignore_index=True)
+
+    owned = entries[entries['owned'].values]
+    core = np.zeros(n, dtype=np.int64)
+    core[owned['original_index'].values] = owned['core'].values
+
+    labels = LabelStore(pd.RangeIndex(n))
+    labels.set(owned['original_index'].values, owned['cluster'].values)
+    # Observations that are noise in their own tile can still be border
+    # points of a cluster whose core points lie in the halo; the tile that
+    # owns those core points has them in a cluster.
+    borders = entries[~entries['owned'].values & (entries['cluster'].values > -1)]\
+                .drop_duplicates(subset='original_index')
+    borders = borders[labels.get(borders['original_index'].values) <= -1]
+    labels.set(borders['original_index'].values, borders['cluster'].values)
+
+    shared = entries[entries['original_index'].duplicated(keep=False).values]
+    joined = shared.merge(shared, on='original_index', suffixes=('_curr', '_prev'))
+    joined = joined[joined['tile_prev'].values < joined['tile_curr'].values]
+    matched = (common_core_point(joined) | core_plus_marginal_point(joined)) & \
+              (joined['cluster_prev'].values > -1)
+    cluster_pairs = joined.loc[matched, ['cluster_prev', 'cluster_curr']].drop_duplicates().values
+    for cluster_prev, cluster_curr in cluster_pairs:
+        labels.union([cluster_prev, cluster_curr])
+    log.debug('Merged %s pairs of clusters across %s tiles', len(cluster_pairs), len(tiles))
+
+    # Merged clusters are numbered from 1 in order of first appearance.
+    resolved = np.array(list(labels.resolve().values()), dtype=np.int64)
+    clustered = resolved > 0
+    resolved[clustered] = pd.factorize(resolved[clustered])[0] + 1
+    return resolved, core
+
+
+# The clustering algorithm of each worker process, sent once per worker
+# rather than once per tile.
+_worker_cluster_algo = None
+
+def _init_worker(cluster_algo: DBSCAN) -> None:
+    global _worker_cluster_algo
+    _worker_cluster_algo = cluster_algo
+
+
+def _fit_tile(tile_data) -> tuple:
+    _worker_cluster_algo.fit(tile_data)
+    return _worker_cluster_algo.labels, _worker_cluster_algo.core, _worker_cluster_algo.fit_stats
+
+
+class tiledDBSCAN(DBSCAN):
+    """
+    Fits each frame as a set of square spatial tiles, so that a large extent
+    is clustered as many small ones, in parallel worker processes if
+    n_workers > 1. Each tile is fitted by cluster_algo with the observations
+    within a halo of just over d_eps of it, which holds every neighbour of 
+    the observations it owns, and clusters that cross tiles are merged as 
+    clusters are between time frames.
+
+    Core points and their clusters are the same as fitting the whole frame,
+    as is noise; a border point within reach of two clusters may be given
+    either of them.
+
+    Worker processes are started on the first parallel fit, with a copy of
+    cluster_algo, and kept for every later frame until close(), e.g. at the
+    end of a with block.
+    """
+
+    def __init__(self, cluster_algo: DBSCAN, tile_size, n_workers=1):
+        DBSCAN.__init__(self, cluster_algo.d_eps, cluster_algo.t_eps, cluster_algo.min_samples,
+                        engine=cluster_algo.engine)
+        # Tiles are cut in EPSG:27700, but networkDBSCAN finds neighbours by
+        # great-circle point.distance, so the halo has the same margin as its
+        # queries have for the difference.
+        halo = cluster_algo.d_eps * 1.01
+        if tile_size <= halo:
+            raise ValueError('tile_size must be larger than the halo of d_eps (%s)' % halo)
+        if n_workers > 1 and not cluster_algo.parallel_safe:
+            raise ValueError('%s cannot fit tiles in parallel' % type(cluster_algo).__name__)
+        self.cluster_algo = cluster_algo
+        self.tile_size = tile_size
+        self.halo = halo
+        self.n_workers = n_workers
+        self.supports_store = cluster_algo.supports_store
+        self.t_eps_inclusive = cluster_algo.t_eps_inclusive
+        # Tiles, rather than frames, are fitted in parallel.
+        self.parallel_safe = False
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers,
+                                                 initializer=_init_worker,
+                                                 initargs=(self.cluster_algo,))
+        return self._executor
+
+    def close(self) -> None:
+        # Shuts down the worker processes, if any were started.
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def fit(self, data, new: np.ndarray = None, carried_pairs: tuple = None) -> None:
+        if new is not None:
+            raise ValueError('tiledDBSCAN cannot fit frames incrementally')
+        t = time.perf_counter()
+        self.set_data(data)
+        tile_data = [self.get_tile_data(positions) for positions, _ in self.tiles]
+        log.info('Fitting %s observations in %s tiles' % (len(data), len(self.tiles)))
+
+        fitted_tiles = self.fit_tiles(tile_data)
+        with metrics.timer('tile_merge'):
+            self.labels, self.core = merge_tiles(len(data), self.tiles,
+                                                 [(labels, core) for labels, core, _ in fitted_tiles])
+
+        self.n_retrievals = sum(fit_stats['neighbour_retrievals'] for _, _, fit_stats in fitted_tiles)
+        self.n_neighbours = sum(fit_stats['neighbours'] for _, _, fit_stats in fitted_tiles)
+        self.fit_stats = {'observations': len(data),
+                          'fit_seconds': time.perf_counter() - t,
+                          'neighbour_retrievals': self.n_retrievals,
+                          'neighbours': self.n_neighbours,
+                          'tiles': len(self.tiles)}
+
+    def set_data(self, data, new: np.ndarray = None) -> None:
+        self.data = data
+        if isinstance(data, ObservationFrame):
+            x, y = data.x, data.y
+        else:
+            with metrics.timer('projection'):
+                geometry = data.geometry.to_crs(27700)
+            x, y = geometry.x.values, geometry.y.values
+        self.tiles = get_tiles(x, y, self.tile_size, self.halo)
+
+    def get_tile_data(self, positions: np.ndarray):
+        # Tiles are frames in their own right, indexed from 0.
+        if isinstance(self.data, ObservationFrame):
+            return ObservationFrame(self.data.x[positions], self.data.y[positions],
+                                    self.data.t[positions], self.data.original_index[positions])
+        return self.data.iloc[positions].reset_index(drop=True)
+
+    def fit_tiles(self, tile_data: list) -> list:
+        if self.n_workers == 1:
+            fitted_tiles = []
+            for tile in tile_data:
+                self.cluster_algo.fit(tile)
+                fitted_tiles.append((self.cluster_algo.labels, self.cluster_algo.core, self.cluster_algo.fit_stats))
+            return fitted_tiles
+
+        fitted_tiles = list(self.get_executor().map(_fit_tile, tile_data))
+        # Metrics are not collected in the workers, so their counts are
+        # added from the fit statistics.
+        for _, _, fit_stats in fitted_tiles:
+            metrics.add_time('fit', fit_stats['fit_seconds'])
+            metrics.count('neighbour_retrievals', fit_stats['neighbour_retrievals'])
+            metrics.count('neighbours', fit_stats['neighbours'])
+        return fitted_tiles
+
+    def _retrieve_neighbours(self, i):
+        raise NotImplementedError('tiledDBSCAN fits tiles with %s' % type(self.cluster_algo).__name__)
@@ -0,0 +1,108 @@
+import numpy as np
+from clustering.neighbourhood_graph import csr_from_pairs
+
+# Offsets to the eight neighbouring grid cells (plus the cell itself).
+CELL_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+class SpatioTemporalIndex:
+    """
+    Grid index over projected x/y coordinates, with each grid cell sorted by
+    time. Cells are d_eps wide, so all spatial neighbours of a point lie in
+    its own cell or one of the eight surrounding cells, and within each cell
+    the temporal window is found with a binary search on the sorted times.
+
+    Observations are sorted on a single composite key (cell, time), so one
+    searchsorted call finds the candidates in a neighbouring cell for any
+    number of query points at once.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, t: np.ndarray, d_eps, t_eps):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.t = np.asarray(t)
+        self.d_eps = d_eps
+        self.t_eps = t_eps
+
+        n = len(self.x)
+        cx = np.floor(self.x / d_eps).astype(np.int64)
+        cy = np.floor(self.y / d_eps).astype(np.int64)
+
+        # Cell keys are padded by one cell on each side so that the key of
+        # any neighbouring cell is still unique and ordered by (cx, cy).
+        cx_min = cx.min() if n > 0 else 0
+        cy_min = cy.min() if n > 0 else 0
+        self.cy_span = (cy.max() - cy_min + 3) if n > 0 else 3
+        self.cell_key = (cx - cx_min + 1) * self.cy_span + (cy - cy_min + 1)
+
+        # Times are offset so that every offset, and every offset +/- t_eps,
+        # fits within one cell's stride of the composite key.
+        self.t_min = self.t.min() if n > 0 else 0
+        t_span = (self.t.max() - self.t_min) if n > 0 else 0
+        self.stride = t_span + 2 * self.t_eps + 1
+
+        self.order = np.lexsort((self.t, self.cell_key))
+        self.cells, cell_rank = np.unique(self.cell_key[self.order], return_inverse=True)
+        self.sorted_key = cell_rank * self.stride + \
+                          (self.t[self.order] - self.t_min + self.t_eps)
+
+    def __len__(self):
+        return len(self.x)
+
+    def _is_neighbour(self, i, j) -> np.ndarray:
+        # Same tests as the GeoSeries implementation: strictly within d_eps
+        # in space and within t_eps (inclusive) in time.
+        dx = self.x[j] - self.x[i]
+        dy = self.y[j] - self.y[i]
+        return (np.sqrt(dx * dx + dy * dy) < self.d_eps) & \
+               (np.abs(self.t[j] - self.t[i]) <= self.t_eps) & \
+               (i != j)
+
+    def _candidate_ranges(self, points: np.ndarray, dx: int, dy: int):
+        # Returns the [lo, hi) slices of the sorted order holding the
+        # candidates of each point in the cell offset by (dx, dy).
+        key = self.cell_key[points] + dx * self.cy_span + dy
+        rank = np.searchsorted(self.cells, key)
+        found = rank < len(self.cells)
+        found[found] = self.cells[rank[found]] == key[found]
+
+        offset = self.t[points] - self.t_min
+        lo = np.searchsorted(self.sorted_key, rank * self.stride + offset, side='left')
+        hi = np.searchsorted(self.sorted_key, rank * self.stride + offset + 2 * self.t_eps, side='right')
+        return lo, np.where(found, hi, lo)
+
+    def query(self, i: int) -> np.ndarray:
+        # Returns the sorted positions of the neighbours of i, excluding i.
+        points = np.array([i])
+        candidates = []
+        for dx, dy in CELL_OFFSETS:
+            lo, hi = self._candidate_ranges(points, dx, dy)
+            candidates.append(self.order[lo[0]:hi[0]])
+
+        candidates = np.concatenate(candidates)
+        neighbours = candidates[self._is_neighbour(i, candidates)]
+        neighbours.sort()
+        return neighbours
+
+    def neighbour_pairs(self, points: np.ndarray, batch_size=50000) -> tuple[np.ndarray, np.ndarray]:
+        # Returns every (point, neighbour) pair for the given points, found 
+        # in batched passes over the index.
+        rows = [np.array([], dtype=np.int64)]
+        cols = [np.array([], dtype=np.int64)]
+        for start in range(0, len(points), batch_size):
+            batch = points[start:start + batch_size]
+            for dx, dy in CELL_OFFSETS:
+                lo, hi = self._candidate_ranges(batch, dx, dy)
+                counts = hi - lo
+                sources = np.repeat(batch, counts)
+                first = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+                targets = self.order[first + np.arange(counts.sum())]
+                keep = self._is_neighbour(sources, targets)
+                rows.append(sources[keep])
+                cols.append(targets[keep])
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def neighbourhood_graph(self) -> tuple[np.ndarray, np.ndarray]:
+        # Computes every neighbour pair in one batched pass over the index 
+        # and returns the graph as CSR arrays (indptr, indices).
+        rows, cols = self.neighbour_pairs(np.arange(len(self)))
+        return csr_from_pairs(rows, cols, len(self))
@@ -2,10 +2,13 @@ import os
 import time
 import logging
 import sys
+import hashlib
+import numpy as np
 import pandas as pd
 import cartopy.crs as ccrs
-from neo4j import GraphDatabase, time as neo4jtime
 from dotenv import load_dotenv
+from data_loader.neo4j_driver import get_driver, get_session
+from clustering import metrics
 
 # Load dotenv
 load_dotenv()
@@ -13,17 +16,63 @@ load_dotenv()
 # Configure logging
 log = logging.getLogger(__name__)
 
+# Columns that get_obs_for_time_period can return, with their Cypher 
+# expressions and types. unix_time is in local time as recorded, and 
+# utc_time in UTC, as the query's time bounds are.
+OBSERVATION_COLUMNS = [('unix_time', 'n2.recordedAtTime.epochSeconds + n2.recordedAtTime.offsetSeconds', np.int64), 
+                       ('utc_time', 'n2.recordedAtTime.epochSeconds', np.int64), 
+                       ('vehicleRef', 'n2.vehicleRef', object), 
+                       ('vehicleJourneyRef', 'n2.vehicleJourneyRef', object), 
+                       ('directionRef', 'n2.directionRef', object), 
+                       ('lineRef', 'n2.lineRef', object), 
+                       ('lon1', 'n1.geometry.x', np.float64), 
+                       ('lat1', 'n1.geometry.y', np.float64), 
+                       ('lon2', 'n2.geometry.x', np.float64), 
+                       ('lat2', 'n2.geometry.y', np.float64), 
+                       ('itemIdentifier', 'n2.itemIdentifier', object), 
+                       ('speed', 's.speed_ms', np.float64)]
+
+# Number of records fetched into the column buffers at a time.
+FETCH_SIZE = 50000
+
+def to_utc(timestamp: str) -> pd.Timestamp:
+    # Times without an offset are UTC, as neo4j's datetime() reads them. 
+    # Chunks are kept as UTC times without an offset, as in the queries.
+    ts = pd.Timestamp(timestamp)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts
+
+def get_utc_times(df: pd.DataFrame) -> pd.DatetimeIndex:
+    # The UTC times of observations, without an offset, to compare with 
+    # chunks and the bounds of windows.
+    return pd.to_datetime(df['utc_time'].values, unit='s')
+
 class DataLoaderNeo4j:
 
-    def __init__(self):
-        self.uri = os.environ['NEO4J_SERVER']
-        self.auth = (os.environ['NEO4J_USER'], os.environ['NEO4J_PASSWORD'])
+    def __init__(self, cache_dir=None, chunk_size='1h', maxSpeed=None, columns=None, ingestion_lag='15min'):
+        # If cache_dir is given, observations are kept on disk as Parquet 
+        # files, one per extent and chunk_size of time, and only the chunks
+        # not cached yet are queried. Chunks are only cached once they 
+        # ended at least ingestion_lag ago, as observations can be ingested
+        # after the time they were recorded.
+        self.cache_dir = cache_dir
+        self.chunk_size = pd.Timedelta(chunk_size)
+        self.ingestion_lag = pd.Timedelta(ingestion_lag)
+        # If maxSpeed is given, only observations slower than it are returned.
+        # If columns is given, only these columns (plus the times) are returned.
+        # Both are applied in the Cypher query, so the rest are never sent.
+        self.maxSpeed = maxSpeed
+        all_columns = [name for name, _, _ in OBSERVATION_COLUMNS]
+        if columns is not None and not set(columns) <= set(all_columns):
+            raise ValueError('Unknown columns %s, expected some of %s' % \
+                             (sorted(set(columns) - set(all_columns)), all_columns))
+        self.columns = [c for c in OBSERVATION_COLUMNS 
+                        if columns is None or c[0] in ['unix_time', 'utc_time'] or c[0] in columns]
 
     def get_driver(self):
-        # Returns neo4j db driver
-        uri=self.uri
-        driver=GraphDatabase.driver(uri, auth=self.auth)
-        return driver
+        # Returns the shared neo4j db driver
+        return get_driver()
 
     def get_obs_for_time_period(self, tx, extent: list, minTime: str, maxTime: str):
         # Returns the source data for the viz, for a particular date
@@ -39,37 +88,120 @@ class DataLoaderNeo4j:
         AND n2.geometry.x < $max_lon
         AND n2.geometry.y >= $min_lat
         AND n2.geometry.y < $max_lat
-        RETURN n2.recordedAtTime as recordedAtTime, 
-            n2.vehicleRef as vehicleRef, 
-            n2.vehicleJourneyRef as vehicleJourneyRef, 
-            n2.directionRef as directionRef, 
-            n2.lineRef as lineRef,
-            n1.geometry.x as lon1, 
-            n1.geometry.y as lat1,
-            n2.geometry.x as lon2, 
-            n2.geometry.y as lat2, 
-            n2.itemIdentifier as itemIdentifier, 
-            s.speed_ms as speed"""
-        return tx.run(CYPHER_QUERY, 
-                    minTime=minTime, 
-                    maxTime=maxTime,
-                    min_lon=min_lon, 
-                    max_lon=max_lon, 
-                    min_lat=min_lat, 
-                    max_lat=max_lat).to_df()
+        AND ($maxSpeed IS NULL OR s.speed_ms < $maxSpeed)
+        RETURN {', '.join('%s as %s' % (expression, name) for name, expression, _ in self.columns)}"""
+        result = tx.run(CYPHER_QUERY, 
+                        minTime=minTime, 
+                        maxTime=maxTime,
+                        min_lon=min_lon, 
+                        max_lon=max_lon, 
+                        min_lat=min_lat, 
+                        max_lat=max_lat, 
+                        maxSpeed=self.maxSpeed)
+        return self.read_columns(result)
+
+    def read_columns(self, result) -> pd.DataFrame:
+        # Streams the records into typed column arrays, a batch at a time,
+        # rather than building a row of Python objects per record. Times 
+        # are returned from Cypher as seconds since the epoch, in local 
+        # time as recorded, so need no conversion.
+        buffers = {name: [] for name, _, _ in self.columns}
+        while True:
+            records = result.fetch(FETCH_SIZE)
+            if len(records) == 0:
+                break
+            columns = zip(*(record.values(*buffers.keys()) for record in records))
+            for (name, _, dtype), column in zip(self.columns, columns):
+                buffers[name].append(np.array(column, dtype=dtype))
+
+        return self.get_columns_df(buffers)
+
+    def get_columns_df(self, buffers: dict) -> pd.DataFrame:
+        # Concatenates each column's arrays, or gives an empty column of its
+        # type, and adds recordedAtTime.
+        df = pd.DataFrame({name: np.concatenate(buffers[name]) if buffers[name] else np.array([], dtype=dtype)
+                           for name, _, dtype in self.columns})
+        df.insert(0, 'recordedAtTime', pd.to_datetime(df['unix_time'], unit='s'))
+        return df
 
     def load_df(self, extent, minTime: str, maxTime: str):
+        with metrics.timer('load'):
+            if self.cache_dir is None:
+                df = self.query_df(extent, minTime, maxTime)
+            else:
+                df = self.load_df_from_cache(extent, minTime, maxTime)
+        metrics.count('observations_loaded', df.shape[0])
+        return df
+
+    def query_df(self, extent, minTime: str, maxTime: str):
         t = time.time()
         log.info('Loading data')
         # Get data
-        driver = self.get_driver()
-        with driver.session(database=os.environ['DB_NAME']) as session:
+        with get_session() as session, metrics.timer('neo4j_query_observations'):
             df = session.execute_read(self.get_obs_for_time_period, 
                                       extent=extent, 
                                       minTime=minTime, 
                                       maxTime=maxTime)
         
-        log.info('Data loaded from neo4j')
-        # Convert recordedAtTime to datetime
-        df['recordedAtTime'] = df['recordedAtTime'].apply(neo4jtime.DateTime.to_native).dt.tz_localize(None)
+        log.info('Data loaded from neo4j: %s observations in %.2fs' % (df.shape[0], time.time() - t))
         return df
+
+    def get_chunk_path(self, extent, chunk_start: pd.Timestamp) -> str:
+        # Chunks are kept apart for each extent, speed threshold and set of columns.
+        key = repr((list(extent), self.maxSpeed, [name for name, _, _ in self.columns]))
+        extent_key = hashlib.md5(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, 'observations_%s' % extent_key, 
+                            '%s.parquet' % chunk_start.strftime('%Y%m%dT%H%M%S'))
+
+    def load_df_from_cache(self, extent, minTime: str, maxTime: str):
+        # Assembles the time window from cached chunks, querying neo4j once
+        # for each run of consecutive chunks that are not cached yet.
+        min_ts = to_utc(minTime)
+        max_ts = to_utc(maxTime)
+        chunk_starts = pd.date_range(min_ts.floor(self.chunk_size), max_ts, freq=self.chunk_size)
+        chunk_starts = chunk_starts[chunk_starts < max_ts]
+
+        chunks = []
+        missing = []
+        n_cached = 0
+        for chunk_start in chunk_starts:
+            path = self.get_chunk_path(extent, chunk_start)
+            if os.path.exists(path):
+                chunks.append(pd.read_parquet(path))
+                n_cached += 1
+                continue
+            missing.append(chunk_start)
+            is_last = chunk_start == chunk_starts[-1]
+            if is_last or os.path.exists(self.get_chunk_path(extent, chunk_start + self.chunk_size)):
+                chunks += self.fetch_chunks(extent, missing)
+                missing = []
+        log.info('Loaded %s chunks, %s from the cache' % (len(chunk_starts), n_cached))
+        metrics.count('cached_chunks', n_cached)
+        metrics.count('queried_chunks', len(chunk_starts) - n_cached)
+
+        if len(chunks) == 0:
+            return self.get_columns_df({name: [] for name, _, _ in self.columns})
+        df = pd.concat(chunks, ignore_index=True)
+        utc_times = get_utc_times(df)
+        return df[(utc_times >= min_ts) & (utc_times < max_ts)].reset_index(drop=True)
+
+    def fetch_chunks(self, extent, chunk_starts: list) -> list:
+        # Queries a run of consecutive chunks and caches those that are 
+        # settled, i.e. that ended at least ingestion_lag before now, as 
+        # observations could still arrive in the others.
+        chunk_end = chunk_starts[-1] + self.chunk_size
+        df = self.query_df(extent, 
+                           minTime=chunk_starts[0].isoformat(), 
+                           maxTime=chunk_end.isoformat())
+        settled = pd.Timestamp.now(tz='UTC') - self.ingestion_lag
+        utc_times = get_utc_times(df)
+        chunks = []
+        for chunk_start in chunk_starts:
+            chunk = df[(utc_times >= chunk_start) & (utc_times < chunk_start + self.chunk_size)]
+            if (chunk_start + self.chunk_size).tz_localize('UTC') <= settled:
+                path = self.get_chunk_path(extent, chunk_start)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                chunk.to_parquet(path + '.tmp', index=False)
+                os.replace(path + '.tmp', path)
+            chunks.append(chunk)
+        return chunks
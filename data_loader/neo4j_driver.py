@@ -0,0 +1,51 @@
+import atexit
+import os
+import logging
+import threading
+from neo4j import GraphDatabase, Driver
+from dotenv import load_dotenv
+
+# Load dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Connections are pooled by the driver, so one driver per process is shared
+# by every data loader, clustering algorithm and script.
+MAX_CONNECTION_POOL_SIZE = 10
+
+_driver = None
+_driver_pid = None
+_lock = threading.Lock()
+
+def get_driver(max_connection_pool_size: int = MAX_CONNECTION_POOL_SIZE) -> Driver:
+    # Returns the process-wide driver, creating it on first use. A process
+    # forked from the one that created it gets its own, as connections
+    # cannot be shared between processes.
+    global _driver, _driver_pid
+    with _lock:
+        if _driver is None or _driver_pid != os.getpid():
+            log.info('Connecting to %s' % os.environ['NEO4J_SERVER'])
+            _driver = GraphDatabase.driver(os.environ['NEO4J_SERVER'],
+                                           auth=(os.environ['NEO4J_USER'], os.environ['NEO4J_PASSWORD']),
+                                           max_connection_pool_size=max_connection_pool_size)
+            _driver_pid = os.getpid()
+        return _driver
+
+
+def get_session(database: str = None):
+    # Returns a session on the shared driver, for the DB_NAME database by default.
+    return get_driver().session(database=database or os.environ['DB_NAME'])
+
+
+def close_driver() -> None:
+    global _driver, _driver_pid
+    with _lock:
+        if _driver is not None and _driver_pid == os.getpid():
+            _driver.close()
+            log.info('Closed connection to %s' % os.environ['NEO4J_SERVER'])
+        _driver = None
+        _driver_pid = None
+
+
+atexit.register(close_driver)
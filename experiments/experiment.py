@@ -6,42 +6,50 @@ import numpy as np
 from shapely import Point
 
 from clustering.dbscan import DBSCAN
+from clustering import metrics
 from clustering.frame_split_method import frame_split_method
+from clustering.parameter_sweep import parameter_sweep
 log = logging.getLogger("experiment")
 
 maxSpeed = 0.3
 
-def run_experiment(df: pd.DataFrame, cluster_algo: DBSCAN, frame_size: int, exp_reference: str) -> None:
-    
-    df_slow = df[df['speed'] < maxSpeed].copy()
+# The columns of the loaded data used by run_experiment, for DataLoaderNeo4j.
+clustering_columns = ['lon2', 'lat2', 'vehicleRef', 'vehicleJourneyRef', 'directionRef', 'lineRef']
+
+def prepare_slow_observations(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    # Returns the slow-moving observations to cluster, sorted by time.
+    # Data loaded with maxSpeed has already been filtered by the query.
+    with metrics.timer('prepare'):
+        return _prepare_slow_observations(df)
+
+
+def _prepare_slow_observations(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    if 'speed' in df.columns:
+        df_slow = df[df['speed'] < maxSpeed].copy()
+    else:
+        df_slow = df.copy()
 
     log.info("Number of records for clustering: %s" % df_slow.shape[0])
 
-    df_slow['unix_time'] = ((df_slow[['recordedAtTime']] - \
-                    pd.Timestamp("1970-01-01")) // \
-                    pd.Timedelta('1s'))['recordedAtTime'].values
+    # The data loader returns unix_time, but older cached data may not have it.
+    if 'unix_time' not in df_slow.columns:
+        df_slow['unix_time'] = ((df_slow[['recordedAtTime']] - \
+                        pd.Timestamp("1970-01-01")) // \
+                        pd.Timedelta('1s'))['recordedAtTime'].values
     
     df_slow = df_slow[['unix_time', 'lon2', 'lat2', 'vehicleRef', 'vehicleJourneyRef', 'directionRef', 'lineRef']]
     df_slow = df_slow.sort_values(by='unix_time')
     df_slow.columns = ['unix_time', 'longitude', 'latitude', 'vehicleRef', 'vehicleJourneyRef', 'directionRef', 'lineRef']
     df_slow.reset_index(drop=True, inplace=True)
-    
-    df['points'] = df.apply(lambda x: Point(x.lon2, x.lat2), axis=1)
-    df['unix_time'] = ((df[['recordedAtTime']] - pd.Timestamp("1970-01-01")) // \
-                        pd.Timedelta('1s'))['recordedAtTime'].values
 
-    gdf = gpd.GeoDataFrame(df_slow, 
-                           geometry=gpd.points_from_xy(df_slow['longitude'], df_slow['latitude']), 
-                           crs=4326)
-    
-    t1_split = time.time()
-    log.info('Running frame split method for experiment %s' % exp_reference)
-    merged_labels = frame_split_method(gdf, cluster_algo, frame_size=frame_size)
-    t2_split = time.time()
+    return gpd.GeoDataFrame(df_slow, 
+                            geometry=gpd.points_from_xy(df_slow['longitude'], df_slow['latitude']), 
+                            crs=4326)
 
-    log.info(f"Time taken for clustering: {(t2_split - t1_split):.2f}")
 
-    gdf['cluster'] = merged_labels
+def write_cluster_summary(gdf: gpd.GeoDataFrame, exp_reference: str) -> None:
+    # Writes one row per cluster, from a 'cluster' column of overall labels.
+    gdf = gdf.copy()
     gdf['recordedAtTime'] = pd.to_datetime(gdf['unix_time'], unit='s')
 
     filename = 'outputs/%s.csv' % exp_reference
@@ -50,4 +58,53 @@ def run_experiment(df: pd.DataFrame, cluster_algo: DBSCAN, frame_size: int, exp_
                                  'longitude': ["mean"], 
                                  'latitude': ["mean"], 
                                  'vehicleRef': ['nunique']})\
-                           .to_csv(filename, index=False)
\ No newline at end of file
+                           .to_csv(filename, index=False)
+
+
+def write_metrics(exp_reference: str) -> None:
+    # Writes the metrics collected since the last call next to the outputs,
+    # if the script has enabled them.
+    if metrics.enabled():
+        metrics.export('outputs/%s' % exp_reference)
+        metrics.reset()
+
+
+def run_experiment(df: pd.DataFrame, cluster_algo: DBSCAN, frame_size: int, exp_reference: str, 
+                   n_workers: int = 1) -> None:
+    
+    gdf = prepare_slow_observations(df)
+    
+    df['points'] = df.apply(lambda x: Point(x.lon2, x.lat2), axis=1)
+    if 'unix_time' not in df.columns:
+        df['unix_time'] = ((df[['recordedAtTime']] - pd.Timestamp("1970-01-01")) // \
+                            pd.Timedelta('1s'))['recordedAtTime'].values
+    
+    t1_split = time.time()
+    log.info('Running frame split method for experiment %s' % exp_reference)
+    merged_labels = frame_split_method(gdf, cluster_algo, frame_size=frame_size, n_workers=n_workers)
+    t2_split = time.time()
+
+    log.info(f"Time taken for clustering: {(t2_split - t1_split):.2f}")
+
+    gdf['cluster'] = merged_labels
+    write_cluster_summary(gdf, exp_reference)
+    write_metrics(exp_reference)
+
+
+def run_parameter_sweep(df: pd.DataFrame, cluster_algo: DBSCAN, parameters: list, frame_size: int,
+                        exp_reference: str, n_workers: int = 1) -> None:
+    # As run_experiment, for each (d_eps, t_eps, min_samples) in parameters,
+    # with neighbours computed once by cluster_algo at the largest d_eps and t_eps.
+    gdf = prepare_slow_observations(df)
+
+    t1_split = time.time()
+    log.info('Running parameter sweep for experiment %s' % exp_reference)
+    results = parameter_sweep(gdf, cluster_algo, parameters, frame_size=frame_size, n_workers=n_workers)
+    t2_split = time.time()
+
+    log.info(f"Time taken for clustering {len(parameters)} parameter combinations: {(t2_split - t1_split):.2f}")
+
+    for (d_eps, t_eps, min_samples), merged_labels in results.items():
+        gdf['cluster'] = merged_labels
+        write_cluster_summary(gdf, '%s_t%s_d%s_m%s' % (exp_reference, t_eps, d_eps, min_samples))
+    write_metrics(exp_reference)
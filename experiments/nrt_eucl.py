@@ -4,12 +4,13 @@ from os.path import dirname, realpath
 sys.path.append(dirname(dirname(realpath(__file__))))
 
 from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering import metrics
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
-from experiment import run_experiment
+from experiment import run_experiment, clustering_columns
+from nrt_runner import get_nrt_windows, prefetch
 
 import datetime as dt
 import logging
-import pandas as pd
 log = logging.getLogger(__name__)
 
 if __name__ == "__main__":
@@ -18,6 +19,7 @@ if __name__ == "__main__":
     date_str = date.strftime("%Y%m%d")
     logging.basicConfig(filename="logs/eucl_experiment_%s.log" % date_str, 
                         filemode='a', level=logging.INFO)
+    metrics.enable()
     
     extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
     start_tw = "2023-11-01"
@@ -28,10 +30,10 @@ if __name__ == "__main__":
     d_eps = 25
     cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
 
-    for ti in pd.date_range(start_tw, end_tw, freq='15min'):                    
-        maxTime = str(ti).replace(' ', 'T')
-        minTime = str(ti - dt.timedelta(0, 7200)).replace(' ', 'T')
-        df = DataLoaderNeo4j().load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+    # The next window is loaded in the background while this one is clustered.
+    data_loader = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns)
+    load_window = lambda w: data_loader.load_df(extent=extent, minTime=w[1], maxTime=w[2])
+    for (ti, minTime, maxTime), df in prefetch(load_window, get_nrt_windows(start_tw, end_tw, window=7200)):
         run_experiment(df, cluster_algo, frame_size=7200, 
                         exp_reference='nrt_eucl_run\\twoweeks_d%s\\%s_nrt_eucl_t%s_d%s+ending%s' % \
                         (d_eps, date_str, t_eps, d_eps, maxTime.replace(' ','_').replace(':','-')))
\ No newline at end of file
@@ -1,7 +1,5 @@
 
 import sys
-import os
-from neo4j import GraphDatabase
 from os.path import dirname, realpath
 from dotenv import load_dotenv
 sys.path.append(dirname(dirname(realpath(__file__))))
@@ -9,25 +7,23 @@ sys.path.append(dirname(dirname(realpath(__file__))))
 load_dotenv()
 
 from clustering.network_dbscan import networkDBSCAN
+from clustering import metrics
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
-from experiment import run_experiment
+from data_loader.neo4j_driver import get_driver
+from experiment import run_experiment, clustering_columns
+from nrt_runner import get_nrt_windows, prefetch
 
 import datetime as dt
 import logging
-import pandas as pd
 log = logging.getLogger(__name__)
 
-def get_driver():
-    uri=os.environ['NEO4J_SERVER']
-    driver=GraphDatabase.driver(uri, auth=(os.environ['NEO4J_USER'],os.environ['NEO4J_PASSWORD']))
-    return driver
-
 if __name__ == "__main__":
 
     date = dt.datetime.now()
     date_str = date.strftime("%Y%m%d")
     logging.basicConfig(filename="logs/net_experiment_%s.log" % date_str, 
                         filemode='a', level=logging.INFO)
+    metrics.enable()
     
     extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
     start_tw = "2023-11-01"
@@ -37,14 +33,12 @@ if __name__ == "__main__":
     t_eps = 300
     min_samples = 10
 
-    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=get_driver(), simplify=True)
-
-    for ti in pd.date_range(start_tw, end_tw, freq='15min'):        
-        maxTime = str(ti).replace(' ', 'T')
-        minTime = str(ti - dt.timedelta(0, 7200)).replace(' ', 'T')
+    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=get_driver(), simplify=True, cache_dir='cache')
 
-        df = DataLoaderNeo4j().load_df(extent=extent, minTime=minTime, maxTime=maxTime)
-    
+    # The next window is loaded in the background while this one is clustered.
+    data_loader = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns)
+    load_window = lambda w: data_loader.load_df(extent=extent, minTime=w[1], maxTime=w[2])
+    for (ti, minTime, maxTime), df in prefetch(load_window, get_nrt_windows(start_tw, end_tw, window=7200)):
         run_experiment(df, cluster_algo, frame_size=7200, 
                     exp_reference='nrt_network_run\\twoweeks_simplify_d%s\\%s_nrt_net_t%s_d%s+ending%s' % \
                         (d_eps, date_str, t_eps, d_eps, maxTime.replace(' ','_').replace(':','-')))
\ No newline at end of file
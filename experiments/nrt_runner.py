@@ -0,0 +1,73 @@
+import datetime as dt
+import logging
+import queue
+import threading
+import pandas as pd
+
+from clustering import metrics
+
+log = logging.getLogger("experiment")
+
+def get_nrt_windows(start_tw: str, end_tw: str, window: int, freq='15min', delta=False) -> list:
+    # Returns (ti, minTime, maxTime) for each step of an NRT run, with
+    # windows ending at ti. If delta, each window after the first only
+    # covers the time since the previous step.
+    windows = []
+    prevTime = None
+    for ti in pd.date_range(start_tw, end_tw, freq=freq):
+        maxTime = str(ti).replace(' ', 'T')
+        minTime = str(ti - dt.timedelta(0, window)).replace(' ', 'T')
+        if delta and prevTime is not None:
+            minTime = prevTime
+        windows.append((ti, minTime, maxTime))
+        prevTime = maxTime
+    return windows
+
+
+def prefetch(load, items, max_prefetch=1):
+    # Yields (item, load(item)) in order, with load running in a background
+    # thread up to max_prefetch items ahead, so that loading the next item
+    # overlaps with processing the current one. The queue is bounded, so
+    # at most max_prefetch loaded items are held at once. Metrics recorded
+    # by load are kept with its item and recorded when the item is yielded,
+    # e.g. after the metrics of the previous window were written and reset.
+    loaded = queue.Queue(maxsize=max_prefetch)
+    stopped = threading.Event()
+    done = object()
+
+    def put(value):
+        # Gives up if the consumer has stopped, rather than blocking forever.
+        while not stopped.is_set():
+            try:
+                loaded.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                with metrics.capture() as captured:
+                    value = load(item)
+                if not put((item, value, captured, None)):
+                    return
+        except Exception as e:
+            put((None, None, None, e))
+            return
+        put((done, None, None, None))
+
+    thread = threading.Thread(target=worker, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, value, captured, error = loaded.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            metrics.replay(captured)
+            yield item, value
+    finally:
+        stopped.set()
+        thread.join()
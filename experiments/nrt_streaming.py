@@ -0,0 +1,65 @@
+import sys
+from os.path import dirname, realpath
+from dotenv import load_dotenv
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+load_dotenv()
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.network_dbscan import networkDBSCAN
+from clustering.sliding_window import slidingWindowDBSCAN
+from clustering import metrics
+from data_loader.neo4j_data_loader import DataLoaderNeo4j
+from data_loader.neo4j_driver import get_driver
+from experiment import prepare_slow_observations, write_cluster_summary, write_metrics, clustering_columns
+from nrt_runner import get_nrt_windows, prefetch
+
+import datetime as dt
+import logging
+import pandas as pd
+log = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+
+    # 'eucl' or 'network'
+    distance = sys.argv[1] if len(sys.argv) > 1 else 'eucl'
+
+    date = dt.datetime.now()
+    date_str = date.strftime("%Y%m%d")
+    logging.basicConfig(filename="logs/%s_streaming_experiment_%s.log" % (distance, date_str), 
+                        filemode='a', level=logging.INFO)
+    metrics.enable()
+    
+    extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
+    start_tw = "2023-11-01"
+    end_tw = "2023-11-15"
+    window = 7200
+    maxSpeed = 0.3
+    t_eps = 300
+    min_samples = 10
+
+    if distance == 'network':
+        d_eps = 50
+        # Pairs are carried between steps, so distances must not depend on
+        # the other observations in the window.
+        cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, 
+                                     neo4jdriver=get_driver(), simplify=True, cache_dir='cache', backend='neo4j_overlay')
+        exp_reference = 'nrt_network_run\\twoweeks_simplify_d%s\\%s_nrt_net_t%s_d%s+ending%s'
+    else:
+        d_eps = 25
+        cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
+        exp_reference = 'nrt_eucl_run\\twoweeks_d%s\\%s_nrt_eucl_t%s_d%s+ending%s'
+
+    # Each step only loads the observations since the previous step, and the
+    # window keeps the neighbour pairs of those still within the last two hours.
+    # The next step is loaded in the background while this one is clustered.
+    stream = slidingWindowDBSCAN(cluster_algo, window=window)
+    data_loader = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns)
+    load_window = lambda w: prepare_slow_observations(data_loader.load_df(extent=extent, minTime=w[1], maxTime=w[2]))
+    for (ti, minTime, maxTime), gdf_new in prefetch(load_window, get_nrt_windows(start_tw, end_tw, window=window, delta=True)):
+        window_end = int((ti - pd.Timestamp("1970-01-01")) // pd.Timedelta('1s'))
+        stream.update(gdf_new, window_end)
+
+        step_reference = exp_reference % (d_eps, date_str, t_eps, d_eps, maxTime.replace(' ','_').replace(':','-'))
+        write_cluster_summary(stream.get_clustered_data(), step_reference)
+        write_metrics(step_reference)
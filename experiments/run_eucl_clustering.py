@@ -4,8 +4,9 @@ from os.path import dirname, realpath
 sys.path.append(dirname(dirname(realpath(__file__))))
 
 from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering import metrics
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
-from experiment import run_experiment
+from experiment import run_experiment, clustering_columns
 
 import datetime as dt
 import logging
@@ -17,6 +18,7 @@ if __name__ == "__main__":
     date_str = date.strftime("%Y%m%d")
     logging.basicConfig(filename="logs/eucl_experiment_%s.log" % date_str, 
                         filemode='a', level=logging.INFO)
+    metrics.enable()
     
     extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
     minTime = "2023-11-01"
@@ -25,7 +27,7 @@ if __name__ == "__main__":
     d_eps = 25
     t_eps = 300
     min_samples = 10
-    df = DataLoaderNeo4j().load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+    df = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns).load_df(extent=extent, minTime=minTime, maxTime=maxTime)
     
     cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
     run_experiment(df, cluster_algo, frame_size=10800, exp_reference='%s_eucl_test_t%s_d%s' % (date_str, t_eps, d_eps))
\ No newline at end of file
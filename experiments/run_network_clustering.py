@@ -3,19 +3,14 @@ from os.path import dirname, realpath
 sys.path.append(dirname(dirname(realpath(__file__))))
 
 from clustering.network_dbscan import networkDBSCAN
+from clustering import metrics
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
-from experiment import run_experiment
+from data_loader.neo4j_driver import get_driver
+from experiment import run_experiment, clustering_columns
 
 import datetime as dt
 import logging
 log = logging.getLogger(__name__)
-import os
-from neo4j import GraphDatabase
-
-def get_driver():
-    uri=os.environ['NEO4J_SERVER']
-    driver=GraphDatabase.driver(uri, auth=(os.environ['NEO4J_USER'],os.environ['NEO4J_PASSWORD']))
-    return driver
 
 if __name__ == "__main__":
 
@@ -23,6 +18,7 @@ if __name__ == "__main__":
     date_str = date.strftime("%Y%m%d")
     logging.basicConfig(filename="logs/network_experiment_%s.log" % date_str, 
                         filemode='a', level=logging.INFO)
+    metrics.enable()
     
     extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
     minTime = "2023-11-01"
@@ -32,9 +28,9 @@ if __name__ == "__main__":
     t_eps = 300
     min_samples = 10
 
-    df = DataLoaderNeo4j().load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+    df = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns).load_df(extent=extent, minTime=minTime, maxTime=maxTime)
     
     driver = get_driver()
  
-    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=driver, simplify=False)
+    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=driver, simplify=False, cache_dir='cache', bulk_write=True)
     run_experiment(df, cluster_algo, frame_size=10800, exp_reference='%s_network_twoweeks_d%s_t%s' % (date_str, d_eps, t_eps))
\ No newline at end of file
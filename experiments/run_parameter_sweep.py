@@ -0,0 +1,42 @@
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.network_dbscan import networkDBSCAN
+from clustering import metrics
+from data_loader.neo4j_data_loader import DataLoaderNeo4j
+from experiment import run_parameter_sweep, clustering_columns
+
+import datetime as dt
+import logging
+log = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+
+    # Pass 'network' as the first argument to sweep with network distances.
+    metric = sys.argv[1] if len(sys.argv) > 1 else 'eucl'
+
+    date = dt.datetime.now()
+    date_str = date.strftime("%Y%m%d")
+    logging.basicConfig(filename="logs/%s_sweep_%s.log" % (metric, date_str), 
+                        filemode='a', level=logging.INFO)
+    metrics.enable()
+    
+    extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
+    minTime = "2023-11-01"
+    maxTime = "2023-11-15"
+    maxSpeed = 0.3
+    parameters = [(d_eps, t_eps, min_samples) for d_eps in [10, 25, 50] 
+                                              for t_eps in [120, 300] 
+                                              for min_samples in [5, 10]]
+    max_d_eps = max(p[0] for p in parameters)
+    max_t_eps = max(p[1] for p in parameters)
+    df = DataLoaderNeo4j(cache_dir='cache', maxSpeed=maxSpeed, columns=clustering_columns).load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+    
+    if metric == 'network':
+        # Sweeps need distances that do not depend on the other observations.
+        cluster_algo = networkDBSCAN(d_eps=max_d_eps, t_eps=max_t_eps, min_samples=1, extent=extent, simplify=False, cache_dir='cache', backend='table')
+    else:
+        cluster_algo = euclideanDBSCAN(d_eps=max_d_eps, t_eps=max_t_eps, min_samples=1)
+    run_parameter_sweep(df, cluster_algo, parameters, frame_size=10800, exp_reference='%s_%s_sweep' % (date_str, metric))
@@ -0,0 +1,49 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from benchmarks.synthetic import get_synthetic_observations
+from benchmarks.run_benchmarks import run_benchmarks, compare_to_baseline, scaling_exponent, measure
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.frame_split_method import frame_split_method
+from clustering.spatial_tiling import tiledDBSCAN
+
+def test_synthetic_observations_are_seeded():
+    gdf = get_synthetic_observations(2000, seed=3)
+    assert len(gdf) == 2000
+    assert gdf.equals(get_synthetic_observations(2000, seed=3))
+    assert not gdf.equals(get_synthetic_observations(2000, seed=4))
+    assert np.all(np.diff(gdf['unix_time'].values) >= 0)
+    assert set(gdf['source']) == {'queue', 'moving', 'duplicate'}
+    # Duplicates repeat the exact position of another observation.
+    assert gdf.duplicated(subset=['longitude', 'latitude']).sum() >= (gdf['source'] == 'duplicate').sum()
+
+def test_benchmarks_run():
+    results = run_benchmarks([500, 1000], ['fit_graph', 'frame_split_graph', 'cluster_matching', 'st_dbscan'])
+    assert {r['benchmark'] for r in results} >= {'fit_graph', 'frame_split_graph', 'cluster_matching'}
+    for result in results:
+        assert result['seconds'] > 0 and result['peak_mb'] > 0
+    assert scaling_exponent(results, 'fit_graph') is not None
+
+def test_worker_memory_is_measured():
+    gdf = get_synthetic_observations(3000, seed=3)
+    def run():
+        with tiledDBSCAN(euclideanDBSCAN(25, 300, 10, engine='graph'), tile_size=500, n_workers=2) as cluster_algo:
+            frame_split_method(gdf, cluster_algo)
+    assert measure(run)['worker_peak_mb'] > 0
+    assert measure(lambda: frame_split_method(gdf, euclideanDBSCAN(25, 300, 10, engine='graph')))['worker_peak_mb'] == 0
+
+def test_compare_to_baseline():
+    baseline = [{'benchmark': 'fit_graph', 'n': 1000, 'seconds': 1.0, 'peak_mb': 10.0}]
+    assert compare_to_baseline([{'benchmark': 'fit_graph', 'n': 1000, 'seconds': 1.1, 'peak_mb': 10.0}], baseline) == []
+    regressions = compare_to_baseline([{'benchmark': 'fit_graph', 'n': 1000, 'seconds': 2.0, 'peak_mb': 10.0}], baseline)
+    assert [r['measurement'] for r in regressions] == ['seconds']
+    assert compare_to_baseline([{'benchmark': 'fit_graph', 'n': 2000, 'seconds': 2.0, 'peak_mb': 10.0}], baseline) == []
+
+if __name__=="__main__":
+    test_synthetic_observations_are_seeded()
+    test_benchmarks_run()
+    test_worker_memory_is_measured()
+    test_compare_to_baseline()
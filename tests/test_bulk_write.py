@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.network_dbscan import bulk_observation_query, bulk_next_closest_intersection_query, \
+    delete_observations_query, project_bounded_graph_query, observation_id_index_query, \
+    intersection_index_queries
+from clustering.frame_split_method import get_frames
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN
+
+class localTransaction:
+    # Records each query with its parameters, in place of a Neo4j transaction.
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def run(self, query, **parameters):
+        self.queries.append((query, parameters))
+        return self
+
+    def data(self):
+        return [{'total': 0}]
+
+    def single(self):
+        return {'total': 0}
+
+    def to_df(self):
+        return pd.DataFrame(columns=['sourceNodeId', 'targetNodeId', 'totalCost', 'distance'])
+
+class localSession:
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute_write(self, function, *args, **kwargs):
+        return function(localTransaction(self.queries), *args, **kwargs)
+
+    execute_read = execute_write
+
+class localDriver:
+
+    def __init__(self):
+        self.queries = []
+
+    def session(self, database=None):
+        return localSession(self.queries)
+
+def get_parameter(queries, query, name):
+    return [v for q, parameters in queries if q == query for v in parameters[name]]
+
+def test_bulk_write_only_writes_new_observations():
+    gdf = get_sample_gdf(n=300, seed=6)
+    driver = localDriver()
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, 
+                                     neo4jdriver=driver, bulk_write=True)
+    previous_ids = np.array([], dtype=np.int64)
+    for gdf_frame in get_frames(gdf, 1200, 600):
+        driver.queries.clear()
+        cluster_algo.set_data(gdf_frame)
+        ids = gdf_frame['original_index'].values
+
+        written = get_parameter(driver.queries, bulk_observation_query, 'ids')
+        assert sorted(written) == sorted(np.setdiff1d(ids, previous_ids).tolist())
+        assert get_parameter(driver.queries, bulk_next_closest_intersection_query, 'ids') == written
+        deleted = get_parameter(driver.queries, delete_observations_query, 'ids')
+        assert sorted(deleted) == sorted(np.setdiff1d(previous_ids, ids).tolist())
+        # Nothing else deletes observations between frames.
+        assert not any('DELETE' in q and q != delete_observations_query for q, _ in driver.queries)
+        previous_ids = ids
+
+def test_bucketed_query_uses_new_ids_index():
+    gdf = get_sample_gdf(n=300, seed=6)
+    driver = localDriver()
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, 
+                                     neo4jdriver=driver, backend='neo4j_bucketed', bulk_write=True)
+    gdf_frame = next(get_frames(gdf, 1200, 600))
+    new = np.arange(len(gdf_frame)) % 2 == 0
+    driver.queries.clear()
+    cluster_algo.set_data(gdf_frame, new=new)
+
+    # Dijkstra runs on the road network within d_eps of the observations.
+    assert [parameters['d_eps'] for q, parameters in driver.queries if q == project_bounded_graph_query] == [50]
+    [(query, parameters)] = [(q, p) for q, p in driver.queries if 'gds.shortestPath.dijkstra' in q]
+    assert 'UNWIND $new_ids AS id' in query and 'IN $new_ids' not in query
+    assert parameters['new_ids'] == gdf_frame['original_index'].values[new].tolist()
+
+def test_bucketed_backend_creates_indexes():
+    # The bucketed query looks up new observations by id, with or without
+    # bulk writes, and its projection intersections by location.
+    driver = localDriver()
+    gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, neo4jdriver=driver, backend='neo4j_bucketed')
+    queries = [q for q, _ in driver.queries]
+    assert observation_id_index_query in queries
+    assert all(query in queries for query in intersection_index_queries)
+
+if __name__=="__main__":
+    test_bulk_write_only_writes_new_observations()
+    test_bucketed_query_uses_new_ids_index()
+    test_bucketed_backend_creates_indexes()
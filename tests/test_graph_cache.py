@@ -0,0 +1,53 @@
+import osmnx as ox
+from shapely import LineString
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.network_cache import load_graph, save_graph
+from clustering.network_dbscan import networkDBSCAN
+from tests.test_road_network_distance import get_grid_graph
+
+def get_attributed_grid_graph():
+    # Grid graph with the kinds of attribute osmnx produces: lists, 
+    # geometries and attributes missing from some edges.
+    G = get_grid_graph()
+    for k, (u, v, key) in enumerate(G.edges(keys=True)):
+        if k % 2 == 0:
+            G.edges[u, v, key]['name'] = 'Street %s' % k
+        if k % 5 == 0:
+            G.edges[u, v, key]['osmid'] = [k, k + 1]
+            G.edges[u, v, key]['geometry'] = LineString([(G.nodes[u]['x'], G.nodes[u]['y']), 
+                                                          (G.nodes[v]['x'], G.nodes[v]['y'])])
+    G.nodes[0]['highway'] = 'traffic_signals'
+    return G
+
+def test_graph_round_trip(tmp_path):
+    G = get_attributed_grid_graph()
+    path = str(tmp_path / 'graph.npz')
+    save_graph(path, G)
+    loaded = load_graph(path)
+
+    assert loaded.graph == G.graph
+    assert list(loaded.nodes(data=True)) == list(G.nodes(data=True))
+    assert list(loaded.edges(keys=True, data=True)) == list(G.edges(keys=True, data=True))
+
+def test_cache_hit_skips_download(tmp_path, monkeypatch):
+    downloads = []
+    def graph_from_bbox(*args, **kwargs):
+        downloads.append(kwargs)
+        return get_attributed_grid_graph()
+    monkeypatch.setattr(ox, 'graph_from_bbox', graph_from_bbox)
+
+    extent = [-0.1255, -0.1195, 51.5075, 51.5135]
+    cluster_algo = networkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=extent, 
+                                 backend='inprocess', cache_dir=str(tmp_path))
+    cached_algo = networkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=extent, 
+                                backend='inprocess', cache_dir=str(tmp_path))
+    assert len(downloads) == 1
+    assert list(cached_algo.G.edges(keys=True, data=True)) == list(cluster_algo.G.edges(keys=True, data=True))
+
+if __name__=="__main__":
+    import tempfile, pathlib
+    test_graph_round_trip(pathlib.Path(tempfile.mkdtemp()))
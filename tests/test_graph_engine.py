@@ -0,0 +1,76 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.dbscan import DBSCAN
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from tests.test_indexed_clustering import get_sample_gdf
+
+class adjacencyDBSCAN(DBSCAN):
+    # Minimal DBSCAN over a fixed, possibly asymmetric, adjacency list.
+
+    def __init__(self, adjacency, min_samples, engine='iterative'):
+        DBSCAN.__init__(self, None, None, min_samples, engine=engine)
+        self.adjacency = adjacency
+
+    def set_data(self, data) -> None:
+        self.data = data
+
+    def _retrieve_neighbours(self, i):
+        return list(self.adjacency[i])
+
+def get_random_adjacency(n, seed):
+    rng = np.random.default_rng(seed)
+    return [rng.choice(np.delete(np.arange(n), i), rng.integers(0, 6), replace=False).tolist() 
+            for i in range(n)]
+
+def test_graph_engine_matches_iterative():
+    gdf = get_sample_gdf()
+    for d_eps, t_eps, min_samples in [(25, 300, 10), (50, 120, 5), (10, 600, 3)]:
+        cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
+        cluster_algo.fit(gdf)
+
+        graph_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, engine='graph')
+        graph_algo.fit(gdf)
+
+        assert list(graph_algo.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(graph_algo.core) == list(cluster_algo.core), "core points not matching"
+
+def test_frontier_engine_matches_iterative():
+    gdf = get_sample_gdf()
+    for d_eps, t_eps, min_samples in [(25, 300, 10), (50, 120, 5), (10, 600, 3)]:
+        cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, indexed=True)
+        cluster_algo.fit(gdf)
+
+        frontier_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, indexed=True, engine='frontier')
+        frontier_algo.fit(gdf)
+
+        assert list(frontier_algo.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(frontier_algo.core) == list(cluster_algo.core), "core points not matching"
+
+def test_directed_graph_matches_iterative():
+    for seed in range(10):
+        adjacency = get_random_adjacency(60, seed)
+        data = list(range(len(adjacency)))
+
+        cluster_algo = adjacencyDBSCAN(adjacency, min_samples=4)
+        cluster_algo.fit(data)
+
+        graph_algo = adjacencyDBSCAN(adjacency, min_samples=4, engine='graph')
+        graph_algo.fit(data)
+
+        assert list(graph_algo.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(graph_algo.core) == list(cluster_algo.core), "core points not matching"
+
+        frontier_algo = adjacencyDBSCAN(adjacency, min_samples=4, engine='frontier')
+        frontier_algo.fit(data)
+
+        assert list(frontier_algo.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(frontier_algo.core) == list(cluster_algo.core), "core points not matching"
+
+if __name__=="__main__":
+    test_graph_engine_matches_iterative()
+    test_frontier_engine_matches_iterative()
+    test_directed_graph_matches_iterative()
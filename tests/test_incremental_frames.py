@@ -0,0 +1,57 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.frame_split_method import frame_split_method, fit_frames, get_frames
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN
+
+def test_incremental_euclidean_frames_match():
+    gdf = get_sample_gdf(n=600, seed=4)
+    for d_eps, t_eps, min_samples in [(25, 300, 5), (50, 120, 3)]:
+        cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
+        merged_labels = frame_split_method(gdf, cluster_algo)
+
+        incremental_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
+        incremental_labels = frame_split_method(gdf, incremental_algo, incremental=True)
+
+        assert incremental_labels == merged_labels, "labels not matching"
+
+def test_incremental_network_frames_match():
+    gdf = get_sample_gdf(n=300, seed=4)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table')
+    merged_labels = frame_split_method(gdf, cluster_algo)
+
+    incremental_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table')
+    incremental_labels = frame_split_method(gdf, incremental_algo, incremental=True)
+
+    assert incremental_labels == merged_labels, "labels not matching"
+
+def test_incremental_network_pairs_match_full_fit():
+    # Carried pairs, plus those of new observations, are those of the frame
+    # fitted on its own.
+    gdf = get_sample_gdf(n=300, seed=4)
+    incremental_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table')
+    for gdf_frame, _, _, _ in fit_frames(get_frames(gdf, 1200, 600), incremental_algo, incremental=True):
+        cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table', engine='graph')
+        cluster_algo.fit(gdf_frame.copy())
+        rows = np.repeat(np.arange(len(gdf_frame)), np.diff(cluster_algo.indptr))
+        assert set(zip(*incremental_algo.pairs)) == set(zip(rows, cluster_algo.indices)), "pairs not matching"
+
+def test_incremental_rejects_path_dependent_backends():
+    gdf = get_sample_gdf(n=50, seed=4)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='inprocess')
+    try:
+        frame_split_method(gdf, cluster_algo, incremental=True)
+        assert False, "expected a ValueError"
+    except ValueError:
+        pass
+
+if __name__=="__main__":
+    test_incremental_euclidean_frames_match()
+    test_incremental_network_frames_match()
+    test_incremental_network_pairs_match_full_fit()
+    test_incremental_rejects_path_dependent_backends()
@@ -0,0 +1,50 @@
+import numpy as np
+import geopandas as gpd
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+
+def get_sample_gdf(n=400, seed=0):
+    # Slow-moving observations scattered around a few central London hotspots.
+    rng = np.random.default_rng(seed)
+    hotspots = np.array([[-0.1207, 51.5101], [-0.1190, 51.5116], [-0.1281, 51.5099]])
+    centres = hotspots[rng.integers(0, len(hotspots), n)]
+    lon = centres[:, 0] + rng.normal(0, 0.0004, n)
+    lat = centres[:, 1] + rng.normal(0, 0.0003, n)
+    # Include some exact duplicate positions, as seen with stationary buses.
+    lon[::7] = lon[0]
+    lat[::7] = lat[0]
+    unix_time = np.sort(rng.integers(0, 3600, n))
+    return gpd.GeoDataFrame({'unix_time': unix_time,
+                             'latitude': lat,
+                             'longitude': lon},
+                             geometry=gpd.points_from_xy(lon, lat),
+                             crs=4326)
+
+def test_indexed_labels_match():
+    gdf = get_sample_gdf()
+    for d_eps, t_eps, min_samples in [(25, 300, 10), (50, 120, 5), (10, 600, 3)]:
+        cluster_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples)
+        cluster_algo.fit(gdf)
+
+        indexed_algo = euclideanDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, indexed=True)
+        indexed_algo.fit(gdf)
+
+        assert list(indexed_algo.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(indexed_algo.core) == list(cluster_algo.core), "core points not matching"
+
+def test_indexed_neighbours_match():
+    gdf = get_sample_gdf(n=200, seed=1)
+    cluster_algo = euclideanDBSCAN(d_eps=30, t_eps=300, min_samples=5)
+    cluster_algo.set_data(gdf)
+    indexed_algo = euclideanDBSCAN(d_eps=30, t_eps=300, min_samples=5, indexed=True)
+    indexed_algo.set_data(gdf)
+    for i in range(len(gdf)):
+        assert indexed_algo._retrieve_neighbours(i) == cluster_algo._retrieve_neighbours(i)
+
+if __name__=="__main__":
+    test_indexed_labels_match()
+    test_indexed_neighbours_match()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.label_store import LabelStore
+from clustering.frame_split_method import implement_cluster_matching, join_frames, get_clusters_to_merge
+import clustering.frame_split_method as matching
+
+def test_merges_resolve_to_smallest_label():
+    labels = LabelStore(pd.Index([10, 11, 12, 13, 14, 15]))
+    labels.set([10, 11, 12, 13, 14], [1, 2, -1, 3, 4])
+    assert labels.merge([3, 4]) == 3
+    assert labels.merge([2, 3]) == 2
+    assert labels.resolve() == {10: 1, 11: 2, 12: -1, 13: 2, 14: 2}
+
+def test_labels_merged_away_start_new_clusters():
+    # As if every observation holding label 2 had been relabelled 1.
+    labels = LabelStore(pd.Index(np.arange(4)))
+    labels.set([0, 1], [1, 2])
+    assert labels.merge([1, 2]) == 1
+    assert labels.max_assigned() == 1
+    labels.set([2, 3], [2, 1])
+    assert labels.resolve() == {0: 1, 1: 1, 2: 2, 3: 1}
+
+def test_union_is_transitive():
+    labels = LabelStore(pd.Index(np.arange(3)))
+    labels.set([0, 1, 2], [1, 5, 9])
+    labels.union([1, 5])
+    labels.union([5, 9])
+    assert labels.resolve() == {0: 1, 1: 1, 2: 1}
+
+
+def dict_cluster_matching(prev, curr, labels, prev_cluster_map):
+    # implement_cluster_matching as it was with overall labels in a dict,
+    # relabelling observations on each merge.
+    joined = join_frames(prev, curr)
+    for cluster_list in matching.test_for_merging_previous_clusters(joined, curr):
+        global_cluster_labels_to_merge = [prev_cluster_map[i] for i in cluster_list]
+        new_cluster_label = min(global_cluster_labels_to_merge)
+        for index in [i for i, v in labels.items() if v in global_cluster_labels_to_merge]:
+            labels[index] = new_cluster_label
+        for index in cluster_list:
+            prev_cluster_map[index] = new_cluster_label
+    clusters_to_merge = get_clusters_to_merge(joined, prev_cluster_map)
+
+    original_index = curr['original_index'].values
+    cluster = curr['cluster'].values
+    existing = np.array([labels.get(i, -1) for i in original_index], dtype=np.int64)
+    original_index = original_index[existing <= -1]
+    cluster = cluster[existing <= -1]
+
+    new_labels = np.full(len(cluster), -1, dtype=np.int64)
+    merge_label = pd.Series(clusters_to_merge, dtype=np.float64).reindex(cluster).values
+    is_merged = ~np.isnan(merge_label)
+    new_labels[is_merged] = merge_label[is_merged]
+
+    is_new = ~is_merged & (cluster > -1)
+    new_clusters, first = np.unique(cluster[is_new], return_index=True)
+    first_position = np.flatnonzero(is_new)[first]
+    max_label = max(labels.values(), default=-1)
+    running_max = np.maximum.accumulate(np.where(is_merged, new_labels, max_label))
+    new_cluster_labels = {}
+    last_label = max_label
+    order = np.argsort(first_position)
+    for new_cluster, position in zip(new_clusters[order], first_position[order]):
+        last_label = max(1, max(running_max[position], last_label) + 1)
+        new_cluster_labels[new_cluster] = last_label
+    new_labels[is_new] = pd.Series(new_cluster_labels, dtype=np.int64).reindex(cluster[is_new]).values
+    labels.update(zip(original_index, new_labels))
+
+    current_frame_cluster_lookup = {}
+    for frame_cluster in pd.unique(cluster[cluster > -1]):
+        current_frame_cluster_lookup[frame_cluster] = clusters_to_merge[frame_cluster] \
+            if frame_cluster in clusters_to_merge else new_cluster_labels[frame_cluster]
+    return labels, current_frame_cluster_lookup
+
+
+def get_random_frames(rng, n_frames, width, step, n_clusters) -> list:
+    # Overlapping frames of random labels and core points, where every
+    # cluster has an observation that is new to its frame.
+    frames = []
+    for frame in range(n_frames):
+        original_index = np.arange(frame * step, frame * step + width)
+        cluster = rng.integers(0, n_clusters + 1, width)
+        cluster[cluster == 0] = -1
+        new = np.flatnonzero(original_index >= (frame - 1) * step + width) if frame else np.arange(width)
+        cluster[new[:n_clusters]] = np.arange(1, n_clusters + 1)[:len(new)]
+        cluster[~np.isin(cluster, cluster[new])] = -1
+        core = (rng.random(width) < 0.6) & (cluster > -1)
+        frames.append(pd.DataFrame({'original_index': original_index,
+                                    'cluster': cluster,
+                                    'core': core.astype(np.int64)}))
+    return frames
+
+
+def match_frames(frames: list, labels, matcher):
+    if isinstance(labels, dict):
+        labels.update(zip(frames[0]['original_index'].values, frames[0]['cluster'].values))
+    else:
+        labels.set(frames[0]['original_index'].values, frames[0]['cluster'].values)
+    prev_cluster_map = {k: k for k in np.unique(frames[0]['cluster'].values) if k > 0}
+    for prev, curr in zip(frames, frames[1:] + [pd.DataFrame(columns=['original_index', 'cluster', 'core'])]):
+        labels, prev_cluster_map = matcher(prev, curr, labels, prev_cluster_map)
+    return labels
+
+def test_matching_is_unchanged_from_dict_labels():
+    for seed in range(200):
+        rng = np.random.default_rng(seed)
+        width = int(rng.integers(20, 60))
+        frames = get_random_frames(rng, n_frames=int(rng.integers(2, 12)), width=width,
+                                   step=int(rng.integers(5, width)), n_clusters=int(rng.integers(1, 8)))
+        n = frames[-1]['original_index'].max() + 1
+
+        expected = match_frames(frames, {}, dict_cluster_matching)
+        labels = match_frames(frames, LabelStore(pd.RangeIndex(n)), implement_cluster_matching).resolve()
+        assert labels == expected, "labels not matching for seed %s" % seed
+
+if __name__=="__main__":
+    test_merges_resolve_to_smallest_label()
+    test_labels_merged_away_start_new_clusters()
+    test_union_is_transitive()
+    test_matching_is_unchanged_from_dict_labels()
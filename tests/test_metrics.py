@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering import metrics
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.frame_split_method import frame_split_method
+from tests.test_indexed_clustering import get_sample_gdf
+
+def test_disabled_metrics_are_not_collected():
+    metrics.disable()
+    metrics.reset()
+    with metrics.timer('fit'):
+        pass
+    metrics.count('neighbours', 10)
+    metrics.record_frame(frame=0)
+    assert metrics.summary() == {'stages': {}, 'counters': {}, 'frames': []}
+
+def test_frame_split_metrics():
+    gdf = get_sample_gdf(n=400, seed=2)
+    expected = frame_split_method(gdf, euclideanDBSCAN(25, 300, 5, engine='graph'))
+    metrics.reset()
+    metrics.enable()
+    try:
+        for engine in ['iterative', 'graph']:
+            assert frame_split_method(gdf, euclideanDBSCAN(25, 300, 5, engine=engine)) == expected
+        summary = metrics.summary()
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+    for stage in ['fit', 'projection', 'neighbour_index', 'neighbourhood_graph', 'cluster_matching']:
+        assert summary['stages'][stage]['calls'] > 0
+    frames = summary['frames']
+    assert len(frames) == summary['counters']['frames']
+    assert sum(f['neighbour_retrievals'] for f in frames) == summary['counters']['neighbour_retrievals']
+    # The iterative engine retrieves the neighbours of each observation once,
+    # so it counts the same retrievals and neighbours as the graph engine.
+    iterative, graph = frames[:len(frames) // 2], frames[len(frames) // 2:]
+    for f_iterative, f_graph in zip(iterative, graph):
+        assert f_graph['neighbour_retrievals'] == f_graph['observations']
+        assert f_iterative['neighbour_retrievals'] == f_graph['neighbour_retrievals']
+        assert f_iterative['neighbours'] == f_graph['neighbours']
+
+def test_export():
+    metrics.reset()
+    metrics.enable()
+    try:
+        with metrics.timer('load'):
+            metrics.count('observations_loaded', 5)
+        metrics.record_frame(frame=0, observations=5)
+        metrics.record_frame(frame=1, observations=3)
+        with tempfile.TemporaryDirectory() as directory:
+            json_path, csv_path = metrics.export(os.path.join(directory, 'run'))
+            with open(json_path) as f:
+                exported = json.load(f)
+            with open(csv_path) as f:
+                rows = f.read().splitlines()
+    finally:
+        metrics.disable()
+        metrics.reset()
+    assert exported['stages']['load']['calls'] == 1
+    assert exported['counters']['observations_loaded'] == 5
+    assert rows == ['frame,observations', '0,5', '1,3']
+
+if __name__=="__main__":
+    test_disabled_metrics_are_not_collected()
+    test_frame_split_metrics()
+    test_export()
@@ -0,0 +1,23 @@
+import os
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+# Other tests may have set these to empty strings.
+os.environ['NEO4J_SERVER'] = os.environ.get('NEO4J_SERVER') or 'neo4j://localhost:7687'
+os.environ['NEO4J_USER'] = os.environ.get('NEO4J_USER') or 'neo4j'
+os.environ.setdefault('NEO4J_PASSWORD', '')
+
+from data_loader.neo4j_driver import close_driver, get_driver
+
+def test_driver_is_shared():
+    # Creating a driver does not connect, so no database is needed.
+    driver = get_driver()
+    assert get_driver() is driver
+    close_driver()
+    assert get_driver() is not driver
+    close_driver()
+
+if __name__=="__main__":
+    test_driver_is_shared()
@@ -7,16 +7,11 @@ from shapely import Point
 import numpy as np
 import geopandas as gpd
 from clustering.network_dbscan import networkDBSCAN
-from neo4j import GraphDatabase
+from data_loader.neo4j_driver import get_driver
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_driver():
-    uri=os.environ['NEO4J_SERVER']
-    driver=GraphDatabase.driver(uri, auth=(os.environ['NEO4J_USER'],os.environ['NEO4J_PASSWORD']))
-    return driver
-
 sample_points = np.array([
     Point(-0.122688, 51.510017),
     Point(-0.120623, 51.510878),
@@ -58,5 +53,6 @@ cluster_algo = networkDBSCAN(d_eps=d_eps,
                              min_samples=min_samples, 
                              extent=test_extent, 
                              neo4jdriver=driver, 
-                             simplify=True)
+                             simplify=True, 
+                             cache_dir='cache')
 cluster_algo.fit(data=gdf)
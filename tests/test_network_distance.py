@@ -11,17 +11,12 @@ sys.path.append(dirname(dirname(realpath(__file__))))
 from clustering.network_dbscan import networkDBSCAN
 from clustering.frame_split_method import frame_split_method
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
-from neo4j import GraphDatabase
+from data_loader.neo4j_driver import get_driver
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-def get_driver():
-    uri=os.environ['NEO4J_SERVER']
-    driver=GraphDatabase.driver(uri, auth=(os.environ['NEO4J_USER'],os.environ['NEO4J_PASSWORD']))
-    return driver
-
 log = logging.getLogger(__name__)
 
 if __name__=="__main__":
@@ -62,7 +57,7 @@ if __name__=="__main__":
     driver = get_driver()
 
     t1_split = time.time()
-    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=driver)
+    cluster_algo = networkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=min_samples, extent=extent, neo4jdriver=driver, cache_dir='cache')
     merged_labels = frame_split_method(gdf, cluster_algo, frame_size=25000)
     t2_split = time.time()
     log.info('Time taken: %.2f' % (t2_split - t1_split))
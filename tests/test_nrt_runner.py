@@ -0,0 +1,88 @@
+import threading
+import time
+
+import sys
+from os.path import dirname, realpath, join
+sys.path.append(dirname(dirname(realpath(__file__))))
+sys.path.append(join(dirname(dirname(realpath(__file__))), 'experiments'))
+
+from nrt_runner import get_nrt_windows, prefetch
+from clustering import metrics
+
+def test_prefetch_is_ordered_and_bounded():
+    loaded = []
+    consumed = []
+    lock = threading.Lock()
+    max_ahead = [0]
+
+    def load(item):
+        time.sleep(0.001)
+        with lock:
+            loaded.append(item)
+            max_ahead[0] = max(max_ahead[0], len(loaded) - len(consumed))
+        return item * 2
+
+    for item, value in prefetch(load, range(50), max_prefetch=2):
+        assert value == item * 2
+        time.sleep(0.002)
+        with lock:
+            consumed.append(item)
+
+    assert consumed == list(range(50))
+    # Up to max_prefetch queued, plus the item being processed and the one being loaded.
+    assert max_ahead[0] <= 4
+
+def test_prefetch_raises_load_errors():
+    def load(item):
+        if item == 3:
+            raise ValueError('failed to load %s' % item)
+        return item
+
+    consumed = []
+    try:
+        for item, _ in prefetch(load, range(10)):
+            consumed.append(item)
+        assert False, "expected the load error"
+    except ValueError:
+        pass
+    assert consumed == [0, 1, 2]
+
+def test_prefetch_stops_early():
+    for item, _ in prefetch(lambda item: item, range(1000)):
+        if item == 5:
+            break
+    assert not any(t.name == 'prefetch' for t in threading.enumerate())
+
+def test_prefetched_metrics_follow_their_item():
+    # Metrics recorded while loading ahead are recorded with their own
+    # item, after the previous item's metrics were reset.
+    def load(item):
+        metrics.add_time('load', item)
+        metrics.count('observations_loaded', item)
+        return item
+
+    metrics.enable()
+    try:
+        metrics.reset()
+        for item, _ in prefetch(load, range(1, 6), max_prefetch=2):
+            time.sleep(0.01)
+            summary = metrics.summary()
+            assert summary['stages']['load'] == {'calls': 1, 'seconds': item}
+            assert summary['counters'] == {'observations_loaded': item}
+            metrics.reset()
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+def test_delta_windows():
+    windows = get_nrt_windows("2023-11-01 02:00", "2023-11-01 03:00", window=7200, delta=True)
+    assert [w[1:] for w in windows[:2]] == [('2023-11-01T00:00:00', '2023-11-01T02:00:00'), 
+                                             ('2023-11-01T02:00:00', '2023-11-01T02:15:00')]
+    assert len(windows) == 5
+
+if __name__=="__main__":
+    test_prefetch_is_ordered_and_bounded()
+    test_prefetch_raises_load_errors()
+    test_prefetch_stops_early()
+    test_prefetched_metrics_follow_their_item()
+    test_delta_windows()
@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+for variable in ['NEO4J_SERVER', 'NEO4J_USER', 'NEO4J_PASSWORD', 'DB_NAME']:
+    os.environ.setdefault(variable, '')
+
+from data_loader.neo4j_data_loader import DataLoaderNeo4j, OBSERVATION_COLUMNS, to_utc
+
+def get_observations(utc_times, offset='0s', **columns):
+    # Observations recorded at utc_times, with local times offset from UTC
+    # as recordedAtTime.offsetSeconds would be.
+    utc_times = pd.DatetimeIndex(utc_times)
+    recorded_at = utc_times + pd.Timedelta(offset)
+    return pd.DataFrame({'recordedAtTime': recorded_at, 
+                         'unix_time': (recorded_at - pd.Timestamp('1970-01-01')) // pd.Timedelta('1s'), 
+                         'utc_time': (utc_times - pd.Timestamp('1970-01-01')) // pd.Timedelta('1s'), 
+                         **columns})
+
+def get_sample_observations(n=2000, seed=0, offset='0s'):
+    rng = np.random.default_rng(seed)
+    utc_times = pd.Timestamp('2023-11-01') + pd.to_timedelta(np.sort(rng.integers(0, 86400, n)), unit='s')
+    return get_observations(utc_times, offset=offset, 
+                            vehicleRef=rng.integers(0, 50, n).astype(str), 
+                            speed=rng.random(n))
+
+class localDataLoader(DataLoaderNeo4j):
+    # Answers queries from a DataFrame, recording each one.
+    
+    def __init__(self, observations, **kwargs):
+        DataLoaderNeo4j.__init__(self, **kwargs)
+        self.observations = observations
+        self.queries = []
+
+    def query_df(self, extent, minTime, maxTime):
+        # As in the Cypher query, times are compared as UTC instants.
+        self.queries.append((minTime, maxTime))
+        utc_times = pd.to_datetime(self.observations['utc_time'], unit='s')
+        return self.observations[(utc_times >= to_utc(minTime)) & \
+                                 (utc_times < to_utc(maxTime))].reset_index(drop=True)
+
+def test_cached_windows_match_queries(tmp_path):
+    observations = get_sample_observations()
+    data_loader = localDataLoader(observations, cache_dir=str(tmp_path))
+    extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
+    windows = [('2023-11-01T01:15:00', '2023-11-01T03:15:00'), 
+               ('2023-11-01T01:30:00', '2023-11-01T03:30:00'), 
+               ('2023-11-01T00:00:00', '2023-11-01T06:00:00')]
+    for minTime, maxTime in windows:
+        df = data_loader.load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+        expected = localDataLoader(observations).load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+        assert df.sort_values(['recordedAtTime', 'vehicleRef']).reset_index(drop=True)\
+                 .equals(expected.sort_values(['recordedAtTime', 'vehicleRef']).reset_index(drop=True))
+
+    # Only the chunks missing from the cache are queried.
+    assert data_loader.queries == [('2023-11-01T01:00:00', '2023-11-01T04:00:00'), 
+                                   ('2023-11-01T00:00:00', '2023-11-01T01:00:00'), 
+                                   ('2023-11-01T04:00:00', '2023-11-01T06:00:00')]
+
+    # Reruns do not query at all.
+    rerun_loader = localDataLoader(observations, cache_dir=str(tmp_path))
+    for minTime, maxTime in windows:
+        rerun_loader.load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+    assert rerun_loader.queries == []
+
+def test_cached_windows_with_offset_match_queries(tmp_path):
+    # Local times an hour ahead of UTC, as in BST. Chunks and windows are
+    # cut in UTC, as the query is.
+    observations = get_sample_observations(offset='1h')
+    data_loader = localDataLoader(observations, cache_dir=str(tmp_path))
+    extent = [-0.16172376,-0.07189224,51.49288835,51.52433822]
+    for minTime, maxTime in [('2023-11-01T01:30:00', '2023-11-01T03:30:00'), 
+                             ('2023-11-01T02:00:00', '2023-11-01T05:00:00'), 
+                             ('2023-11-01T03:00:00+01:00', '2023-11-01T06:00:00+01:00')]:
+        df = data_loader.load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+        expected = localDataLoader(observations).load_df(extent=extent, minTime=minTime, maxTime=maxTime)
+        assert df.shape[0] > 0
+        assert df.sort_values(['recordedAtTime', 'vehicleRef']).reset_index(drop=True)\
+                 .equals(expected.sort_values(['recordedAtTime', 'vehicleRef']).reset_index(drop=True))
+
+def test_recent_chunks_are_not_cached(tmp_path):
+    # Chunks that ended less than ingestion_lag ago are queried again, so 
+    # observations ingested late are not lost.
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+    start = (now - pd.Timedelta('5h')).floor('1h')
+    observations = get_observations(start + pd.to_timedelta(np.arange(0, 5 * 3600, 60), unit='s'), 
+                                    vehicleRef='1', speed=0.1)
+    data_loader = localDataLoader(observations, cache_dir=str(tmp_path), ingestion_lag='2h')
+    extent = [-0.2, 0, 51.4, 51.6]
+    window = dict(extent=extent, minTime=start.isoformat(), maxTime=(start + pd.Timedelta('5h')).isoformat())
+    df = data_loader.load_df(**window)
+    assert df.shape[0] == observations.shape[0]
+
+    for chunk_start in pd.date_range(start, periods=5, freq='1h'):
+        cached = os.path.exists(data_loader.get_chunk_path(extent, chunk_start))
+        assert cached == (chunk_start + pd.Timedelta('1h') <= now - pd.Timedelta('2h')), chunk_start
+
+    late = get_observations([start + pd.Timedelta('4h30min')], vehicleRef=['2'], speed=[0.2])
+    data_loader.observations = pd.concat([observations, late], ignore_index=True)
+    assert data_loader.load_df(**window).shape[0] == observations.shape[0] + 1
+
+def test_empty_window(tmp_path):
+    data_loader = localDataLoader(get_sample_observations(), cache_dir=str(tmp_path), columns=['speed'])
+    df = data_loader.load_df(extent=[-0.2, 0, 51.4, 51.6], minTime='2023-11-01T01:00:00', maxTime='2023-11-01T01:00:00')
+    assert df.shape[0] == 0 and data_loader.queries == []
+    assert list(df.columns) == ['recordedAtTime', 'unix_time', 'utc_time', 'speed']
+    assert df['unix_time'].dtype == np.int64
+    # Times with an offset are converted to UTC.
+    df = data_loader.load_df(extent=[-0.2, 0, 51.4, 51.6], minTime='2023-11-01T01:00:00', maxTime='2023-11-01T02:00:00+01:00')
+    assert df.shape[0] == 0 and data_loader.queries == []
+
+class localRecord:
+
+    def __init__(self, values):
+        self._values = values
+
+    def values(self, *keys):
+        return [self._values[k] for k in keys]
+
+class localResult:
+    # Returns records in batches, as neo4j.Result.fetch does.
+
+    def __init__(self, records):
+        self.records = records
+
+    def fetch(self, n):
+        records, self.records = self.records[:n], self.records[n:]
+        return records
+
+def test_read_columns():
+    records = [localRecord({'unix_time': 1698796800 + i, 'utc_time': 1698796800 + i, 'vehicleRef': str(i % 7), 'vehicleJourneyRef': 'j', 
+                            'directionRef': 'inbound', 'lineRef': '1', 'lon1': -0.12, 'lat1': 51.51, 
+                            'lon2': -0.121, 'lat2': 51.511, 'itemIdentifier': str(i), 
+                            'speed': None if i % 5 == 0 else 0.1 * i}) for i in range(120)]
+    df = DataLoaderNeo4j().read_columns(localResult(records))
+    assert list(df.columns) == ['recordedAtTime'] + [name for name, _, _ in OBSERVATION_COLUMNS]
+    assert df['unix_time'].dtype == np.int64 and df['speed'].dtype == np.float64
+    assert df['recordedAtTime'].iloc[1] == pd.Timestamp('2023-11-01 00:00:01')
+    assert df['speed'].isna().sum() == 24
+
+    empty = DataLoaderNeo4j().read_columns(localResult([]))
+    assert empty.shape[0] == 0 and empty['unix_time'].dtype == np.int64
+
+class localTransaction:
+    
+    def __init__(self, records):
+        self.records = records
+
+    def run(self, query, **parameters):
+        self.query = query
+        self.parameters = parameters
+        return localResult(self.records)
+
+def test_filters_are_pushed_into_query():
+    records = [localRecord({'unix_time': 1698796800 + i, 'utc_time': 1698796800 + i, 'lon2': -0.121, 'lat2': 51.511}) for i in range(10)]
+    tx = localTransaction(records)
+    data_loader = DataLoaderNeo4j(maxSpeed=0.3, columns=['lon2', 'lat2'])
+    df = data_loader.get_obs_for_time_period(tx, [-0.2, 0, 51.4, 51.6], '2023-11-01T00:00:00', '2023-11-01T01:00:00')
+    assert list(df.columns) == ['recordedAtTime', 'unix_time', 'utc_time', 'lon2', 'lat2']
+    assert tx.parameters['maxSpeed'] == 0.3
+    assert 'n2.vehicleRef' not in tx.query and 'n2.geometry.x as lon2' in tx.query
+
+    try:
+        DataLoaderNeo4j(columns=['lon2', 'altitude'])
+        assert False, "expected an unknown column error"
+    except ValueError:
+        pass
+
+if __name__=="__main__":
+    test_filters_are_pushed_into_query()
+    test_read_columns()
+    import tempfile, pathlib
+    test_cached_windows_match_queries(pathlib.Path(tempfile.mkdtemp()))
+    test_cached_windows_with_offset_match_queries(pathlib.Path(tempfile.mkdtemp()))
+    test_recent_chunks_are_not_cached(pathlib.Path(tempfile.mkdtemp()))
+    test_empty_window(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,65 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.frame_split_method import frame_split_method, get_frames
+from clustering.observation_store import ObservationStore
+from benchmarks.synthetic import get_synthetic_observations
+
+def test_frames_match_get_frames():
+    gdf = get_synthetic_observations(3000, seed=5)
+    store = ObservationStore(gdf)
+    projected = gdf.to_crs(27700)
+    frames = list(store.frames(1200, 600))
+    gdf_frames = list(get_frames(gdf, 1200, 600))
+    assert len(frames) == len(gdf_frames)
+    for frame, gdf_frame in zip(frames, gdf_frames):
+        assert list(frame.original_index) == list(gdf_frame['original_index'])
+        assert np.array_equal(frame.t, gdf_frame['unix_time'].values)
+        assert np.array_equal(frame.x, projected.geometry.x.values[gdf_frame['original_index'].values])
+        # Frames are views of the store, not copies.
+        assert np.shares_memory(frame.x, store.x) and np.shares_memory(frame.t, store.t)
+
+def test_frame_split_labels_match():
+    gdf = get_synthetic_observations(1500, seed=6)
+    for engine in ['iterative', 'frontier', 'graph']:
+        for d_eps, t_eps, min_samples in [(25, 300, 10), (50, 120, 5)]:
+            expected_algo = euclideanDBSCAN(d_eps, t_eps, min_samples, engine=engine)
+            expected_algo.supports_store = False
+            expected = frame_split_method(gdf, expected_algo)
+            cluster_algo = euclideanDBSCAN(d_eps, t_eps, min_samples, engine=engine)
+            assert frame_split_method(gdf, cluster_algo) == expected, "labels not matching"
+            if engine == 'graph':
+                assert frame_split_method(gdf, cluster_algo, incremental=True) == expected, "labels not matching"
+                assert frame_split_method(gdf, cluster_algo, n_workers=2) == expected, "labels not matching"
+
+def test_shuffled_labels_match():
+    # Frames keep input order, so clusters are numbered as from GeoDataFrame
+    # frames even when observations are not sorted by time.
+    for seed in range(4):
+        gdf = get_synthetic_observations(1200, seed=seed)
+        gdf = gdf.iloc[np.random.default_rng(seed).permutation(len(gdf))]
+        for engine, indexed in [('iterative', False), ('iterative', True), ('frontier', False), ('graph', False)]:
+            expected_algo = euclideanDBSCAN(25, 300, 10, indexed=indexed, engine=engine)
+            expected_algo.supports_store = False
+            expected = frame_split_method(gdf, expected_algo)
+            cluster_algo = euclideanDBSCAN(25, 300, 10, indexed=indexed, engine=engine)
+            assert frame_split_method(gdf, cluster_algo) == expected, "labels not matching"
+
+def test_unindexed_frames_are_scanned():
+    store = ObservationStore(get_synthetic_observations(1000, seed=7))
+    cluster_algo = euclideanDBSCAN(25, 300, 10)
+    cluster_algo.fit(store.get_frame(0, 500))
+    assert cluster_algo.index is None
+    indexed_algo = euclideanDBSCAN(25, 300, 10, indexed=True)
+    indexed_algo.fit(store.get_frame(0, 500))
+    assert indexed_algo.labels == cluster_algo.labels and indexed_algo.core == cluster_algo.core
+
+if __name__=="__main__":
+    test_frames_match_get_frames()
+    test_frame_split_labels_match()
+    test_shuffled_labels_match()
+    test_unindexed_frames_are_scanned()
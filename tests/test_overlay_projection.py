@@ -0,0 +1,64 @@
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.road_network import RoadNetworkDistance
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN, get_grid_graph
+from tests.test_bulk_write import localDriver, localTransaction
+
+class roadNetworkTransaction(localTransaction):
+    # Answers the overlay node distance query from the road graph, as GDS 
+    # would on the road network projection.
+
+    road_network = RoadNetworkDistance(get_grid_graph())
+
+    def to_df(self):
+        query, parameters = self.queries[-1]
+        if 'sources' not in parameters:
+            return localTransaction.to_df(self)
+        node_distances = self.road_network.get_node_distances(parameters['d_eps'])
+        node_distances = node_distances[node_distances['source'].isin(parameters['sources']) & \
+                                        (node_distances['source'] != node_distances['target'])]
+        return node_distances.reset_index(drop=True)
+
+class roadNetworkDriver(localDriver):
+
+    def session(self, database=None):
+        session = localDriver.session(self, database)
+        session.execute_write = lambda function, *args, **kwargs: \
+            function(roadNetworkTransaction(self.queries), *args, **kwargs)
+        session.execute_read = session.execute_write
+        return session
+
+def get_pairs(cluster_algo):
+    return set(zip(cluster_algo.neighbourhood_data['sourceNodeId'], cluster_algo.neighbourhood_data['targetNodeId']))
+
+def test_overlay_matches_table():
+    gdf = get_sample_gdf(n=200, seed=7)
+    driver = roadNetworkDriver()
+    overlay_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, 
+                                     neo4jdriver=driver, backend='neo4j_overlay')
+    table_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='table')
+
+    # Attachments are found once per frame.
+    get_attachments = overlay_algo.road_network.get_attachments
+    calls = []
+    overlay_algo.road_network.get_attachments = lambda data: calls.append(len(data)) or get_attachments(data)
+
+    # The road network is projected once, not per frame.
+    n_queries = len(driver.queries)
+    for frame in [gdf.iloc[:120].copy(), gdf.iloc[80:].copy()]:
+        overlay_algo.set_data(frame)
+        table_algo.set_data(frame.copy())
+        assert len(get_pairs(overlay_algo)) > 0
+        assert get_pairs(overlay_algo) == get_pairs(table_algo)
+    assert not any('gds.graph.project' in query for query, _ in driver.queries[n_queries:])
+    assert calls == [120, 120]
+
+    # Intersections seen in the first frame are not queried again.
+    sources = [set(parameters['sources']) for _, parameters in driver.queries[n_queries:]]
+    assert len(sources) == 2 and sources[0].isdisjoint(sources[1])
+
+if __name__=="__main__":
+    test_overlay_matches_table()
@@ -0,0 +1,26 @@
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.frame_split_method import frame_split_method
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN
+
+def test_parallel_frames_match_serial():
+    gdf = get_sample_gdf(n=600, seed=5)
+    cluster_algo = euclideanDBSCAN(d_eps=25, t_eps=300, min_samples=5, indexed=True)
+    merged_labels = frame_split_method(gdf, cluster_algo)
+    parallel_labels = frame_split_method(gdf, cluster_algo, n_workers=2)
+    assert parallel_labels == merged_labels, "labels not matching"
+
+def test_parallel_network_frames_match_serial():
+    gdf = get_sample_gdf(n=300, seed=5)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='inprocess')
+    merged_labels = frame_split_method(gdf, cluster_algo)
+    parallel_labels = frame_split_method(gdf, cluster_algo, n_workers=3)
+    assert parallel_labels == merged_labels, "labels not matching"
+
+if __name__=="__main__":
+    test_parallel_frames_match_serial()
+    test_parallel_network_frames_match_serial()
@@ -0,0 +1,82 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.frame_split_method import frame_split_method, get_frames
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.parameter_sweep import parameter_sweep, get_pair_store, precomputedDBSCAN
+from clustering import metrics
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN
+
+parameters = [(25, 300, 5), (50, 120, 3), (50, 300, 10), (10, 60, 2)]
+
+def test_euclidean_sweep_matches_separate_runs():
+    gdf = get_sample_gdf(n=500, seed=8)
+    results = parameter_sweep(gdf, euclideanDBSCAN(d_eps=50, t_eps=300, min_samples=1), parameters)
+    for d_eps, t_eps, min_samples in parameters:
+        expected = frame_split_method(gdf, euclideanDBSCAN(d_eps, t_eps, min_samples, engine='graph'))
+        assert results[(d_eps, t_eps, min_samples)] == expected, "labels not matching"
+
+def test_network_sweep_matches_separate_runs():
+    gdf = get_sample_gdf(n=300, seed=8)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=1, extent=None, backend='table')
+    results = parameter_sweep(gdf, cluster_algo, parameters)
+    for d_eps, t_eps, min_samples in parameters:
+        expected = frame_split_method(gdf, gridNetworkDBSCAN(d_eps, t_eps, min_samples, extent=None, backend='table'))
+        assert results[(d_eps, t_eps, min_samples)] == expected, "labels not matching"
+
+def test_network_pair_store_matches_frames():
+    # The pairs of the store within each frame are those of the frame 
+    # fitted on its own.
+    gdf = get_sample_gdf(n=300, seed=8)
+    pair_store = get_pair_store(gdf, gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=1, extent=None, backend='table'))
+    for gdf_frame in get_frames(gdf, 1200, 600):
+        sweep_algo = precomputedDBSCAN(pair_store, 50, 300, 1)
+        sweep_algo.set_data(gdf_frame)
+        cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=1, extent=None, backend='table', engine='graph')
+        cluster_algo.fit(gdf_frame.copy())
+        pairs = [set(zip(np.repeat(np.arange(len(gdf_frame)), np.diff(algo.indptr)), algo.indices)) 
+                 for algo in [sweep_algo, cluster_algo]]
+        assert pairs[0] == pairs[1], "pairs not matching"
+
+def test_sweep_rejects_path_dependent_backends():
+    gdf = get_sample_gdf(n=50, seed=8)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=1, extent=None, backend='inprocess')
+    try:
+        parameter_sweep(gdf, cluster_algo, parameters)
+        assert False, "expected a ValueError"
+    except ValueError:
+        pass
+
+def test_pair_store_reuses_index():
+    gdf = get_sample_gdf(n=300, seed=8)
+    metrics.enable()
+    try:
+        # Built once, by set_data or else by get_pair_distances.
+        for engine in ['graph', 'iterative']:
+            metrics.reset()
+            pair_store = get_pair_store(gdf, euclideanDBSCAN(d_eps=50, t_eps=300, min_samples=1, engine=engine))
+            assert len(pair_store) > 0
+            assert metrics.summary()['stages']['neighbour_index']['calls'] == 1
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+def test_sweep_rejects_larger_eps():
+    gdf = get_sample_gdf(n=50)
+    try:
+        parameter_sweep(gdf, euclideanDBSCAN(d_eps=25, t_eps=300, min_samples=1), [(50, 300, 5)])
+        assert False, "expected a ValueError"
+    except ValueError:
+        pass
+
+if __name__=="__main__":
+    test_euclidean_sweep_matches_separate_runs()
+    test_network_sweep_matches_separate_runs()
+    test_network_pair_store_matches_frames()
+    test_sweep_rejects_path_dependent_backends()
+    test_pair_store_reuses_index()
+    test_sweep_rejects_larger_eps()
@@ -0,0 +1,119 @@
+import numpy as np
+import networkx as nx
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.network_dbscan import networkDBSCAN
+from clustering.road_network import point_distance
+from tests.test_indexed_clustering import get_sample_gdf
+
+def get_grid_graph(n=12, spacing=0.0005, origin=(-0.1255, 51.5075)):
+    # Small synthetic road grid, with every third street one-way.
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    for i in range(n):
+        for j in range(n):
+            G.add_node(i * n + j, x=origin[0] + i * spacing, y=origin[1] + j * spacing, street_count=4)
+    for i in range(n):
+        for j in range(n):
+            for a, b in [((i, j), (i + 1, j)), ((i, j), (i, j + 1))]:
+                if b[0] >= n or b[1] >= n:
+                    continue
+                u, v = a[0] * n + a[1], b[0] * n + b[1]
+                length = float(point_distance(G.nodes[u]['y'], G.nodes[u]['x'], G.nodes[v]['y'], G.nodes[v]['x']))
+                G.add_edge(u, v, osmid=u * n * n + v, length=length)
+                if i % 3 != 0:
+                    G.add_edge(v, u, osmid=v * n * n + u, length=length)
+    return G
+
+class gridNetworkDBSCAN(networkDBSCAN):
+
+    def get_graph_from_osmnx(self, extent:list):
+        return get_grid_graph()
+
+def get_reference_neighbours(cluster_algo, d_eps, t_eps, through_observations=True):
+    # Dijkstra with networkx over the road graph plus CLOSEST_INTERSECTION
+    # relationships, built the same way as the Cypher queries do. Without
+    # through_observations, observations only have outgoing edges as a 
+    # source and incoming edges as a target, so paths cannot pass through them.
+    data = cluster_algo.data
+    G = nx.DiGraph()
+    for u, v, length in cluster_algo.G.edges(data='length'):
+        if not G.has_edge(u, v) or G[u][v]['weight'] > length:
+            G.add_edge(u, v, weight=length)
+    target = 'obs' if through_observations else 'target'
+    for k, row in enumerate(data.itertuples()):
+        G.add_edge(('obs', k), row.nearest_node, weight=row.distance)
+        G.add_edge(row.nearest_node, (target, k), weight=row.distance)
+        successors = list(cluster_algo.G.successors(row.nearest_node))
+        distances = [point_distance(row.latitude, row.longitude, cluster_algo.G.nodes[s]['y'], cluster_algo.G.nodes[s]['x'])
+                     for s in successors]
+        if successors:
+            next_closest = successors[int(np.argmin(distances))]
+            G.add_edge(('obs', k), next_closest, weight=min(distances))
+            G.add_edge(next_closest, (target, k), weight=min(distances))
+
+    neighbours = set()
+    for k in range(len(data)):
+        costs = nx.single_source_dijkstra_path_length(G, ('obs', k), cutoff=d_eps, weight='weight')
+        for node, cost in costs.items():
+            if not isinstance(node, tuple) or node[1] == k or cost >= d_eps:
+                continue
+            j = node[1]
+            if abs(data.unix_time.values[k] - data.unix_time.values[j]) < t_eps and \
+               point_distance(data.latitude.values[k], data.longitude.values[k],
+                              data.latitude.values[j], data.longitude.values[j]) < d_eps:
+                neighbours.add((k, j))
+    return neighbours
+
+def test_inprocess_neighbours_match_reference():
+    gdf = get_sample_gdf(n=150, seed=2)
+    d_eps, t_eps = 50, 1800
+    cluster_algo = gridNetworkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=5, extent=None, backend='inprocess')
+    cluster_algo.set_data(gdf)
+    neighbours = set(zip(cluster_algo.neighbourhood_data['sourceNodeId'],
+                         cluster_algo.neighbourhood_data['targetNodeId']))
+    assert len(neighbours) > 0
+    assert neighbours == get_reference_neighbours(cluster_algo, d_eps, t_eps)
+
+def test_table_neighbours_match_reference():
+    gdf = get_sample_gdf(n=150, seed=2)
+    d_eps, t_eps = 50, 1800
+    cluster_algo = gridNetworkDBSCAN(d_eps=d_eps, t_eps=t_eps, min_samples=5, extent=None, backend='table')
+    cluster_algo.set_data(gdf)
+    neighbours = set(zip(cluster_algo.neighbourhood_data['sourceNodeId'],
+                         cluster_algo.neighbourhood_data['targetNodeId']))
+    assert len(neighbours) > 0
+    assert neighbours == get_reference_neighbours(cluster_algo, d_eps, t_eps, through_observations=False)
+
+def test_table_is_cached(tmp_path):
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='table', 
+                                     cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    cached_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='table', 
+                                    cache_dir=str(tmp_path))
+    assert cached_algo.node_distances.equals(cluster_algo.node_distances)
+
+def test_adjacency_matches_neighbourhood_data():
+    gdf = get_sample_gdf(n=150, seed=2)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='inprocess')
+    cluster_algo.set_data(gdf)
+    neighbourhood_data = cluster_algo.neighbourhood_data
+    for i in range(len(gdf)):
+        expected = neighbourhood_data[neighbourhood_data['sourceNodeId']==i]['targetNodeId'].tolist()
+        assert sorted(cluster_algo._retrieve_neighbours(i)) == sorted(expected)
+
+def test_inprocess_engines_match():
+    gdf = get_sample_gdf(n=150, seed=2)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='inprocess')
+    cluster_algo.fit(gdf)
+    graph_algo = gridNetworkDBSCAN(d_eps=50, t_eps=1800, min_samples=3, extent=None, backend='inprocess', engine='graph')
+    graph_algo.fit(gdf)
+    assert list(graph_algo.labels) == list(cluster_algo.labels), "labels not matching"
+
+if __name__=="__main__":
+    test_inprocess_neighbours_match_reference()
+    test_table_neighbours_match_reference()
+    test_adjacency_matches_neighbourhood_data()
+    test_inprocess_engines_match()
@@ -0,0 +1,51 @@
+import numpy as np
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.sliding_window import slidingWindowDBSCAN
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from tests.test_indexed_clustering import get_sample_gdf
+from tests.test_road_network_distance import gridNetworkDBSCAN
+
+def check_windows_match(gdf, stream, cluster_algo, window, step):
+    # Each window should be labelled as if it was clustered from scratch.
+    for window_end in range(step, gdf['unix_time'].max() + step, step):
+        arrived = (gdf['unix_time'] >= window_end - step) & (gdf['unix_time'] < window_end)
+        stream.update(gdf[arrived], window_end)
+
+        in_window = (gdf['unix_time'] >= window_end - window) & (gdf['unix_time'] < window_end)
+        expected = gdf[in_window]
+        assert stream.data.shape[0] == expected.shape[0]
+        if expected.shape[0] == 0:
+            continue
+        cluster_algo.fit(expected.reset_index(drop=True))
+        assert list(stream.labels) == list(cluster_algo.labels), "labels not matching"
+        assert list(stream.core) == list(cluster_algo.core), "core points not matching"
+
+def test_sliding_window_euclidean_matches_full_fit():
+    gdf = get_sample_gdf(n=600, seed=5)
+    for d_eps, t_eps, min_samples in [(25, 300, 5), (50, 120, 3)]:
+        stream = slidingWindowDBSCAN(euclideanDBSCAN(d_eps, t_eps, min_samples), window=1200)
+        check_windows_match(gdf, stream, euclideanDBSCAN(d_eps, t_eps, min_samples, engine='graph'), 1200, 300)
+
+def test_sliding_window_network_matches_full_fit():
+    gdf = get_sample_gdf(n=300, seed=5)
+    stream = slidingWindowDBSCAN(gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table'), 
+                                 window=1200)
+    cluster_algo = gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='table', engine='graph')
+    check_windows_match(gdf, stream, cluster_algo, 1200, 300)
+
+def test_sliding_window_rejects_path_dependent_backends():
+    try:
+        slidingWindowDBSCAN(gridNetworkDBSCAN(d_eps=50, t_eps=300, min_samples=3, extent=None, backend='inprocess'), 
+                            window=1200)
+        assert False, "expected a ValueError"
+    except ValueError:
+        pass
+
+if __name__=="__main__":
+    test_sliding_window_euclidean_matches_full_fit()
+    test_sliding_window_network_matches_full_fit()
+    test_sliding_window_rejects_path_dependent_backends()
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+import sys
+from os.path import dirname, realpath
+sys.path.append(dirname(dirname(realpath(__file__))))
+
+from clustering.euclidean_dbscan import euclideanDBSCAN
+from clustering.frame_split_method import frame_split_method
+from clustering.observation_store import ObservationStore
+from clustering.spatial_tiling import get_tiles, tiledDBSCAN
+from benchmarks.synthetic import get_synthetic_observations
+
+def assert_equivalent(labels, core, tiled_labels, tiled_core):
+    # Core points, their clusters and noise are the same. Every border point
+    # here is within reach of one cluster only, so borders are the same too.
+    labels, core = np.asarray(labels), np.asarray(core)
+    assert np.array_equal(core, tiled_core), "core points not matching"
+    assert np.array_equal(labels == -1, tiled_labels == -1), "noise not matching"
+    pairs = pd.DataFrame({'cluster': labels, 'tiled': tiled_labels})[labels > 0].drop_duplicates()
+    assert not pairs['cluster'].duplicated().any() and not pairs['tiled'].duplicated().any(), "clusters not matching"
+
+def test_tiles_cover_neighbourhoods():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 1000, 2000), rng.uniform(0, 1000, 2000)
+    tiles = get_tiles(x, y, tile_size=200, halo=25)
+    owners = np.concatenate([positions[owned] for positions, owned in tiles])
+    assert sorted(owners) == list(range(2000)), "each observation has one owner"
+    for positions, owned in tiles:
+        # Every observation within 25m of an owned observation is in the tile.
+        in_tile = np.zeros(2000, dtype=bool)
+        in_tile[positions] = True
+        for i in positions[owned]:
+            assert in_tile[np.hypot(x - x[i], y - y[i]) < 25].all()
+
+def test_tiled_fit_matches():
+    gdf = get_synthetic_observations(5000, seed=1)
+    store = ObservationStore(gdf)
+    for engine in ['iterative', 'graph']:
+        n = 1500 if engine == 'iterative' else len(store)
+        frame = store.get_frame(0, n)
+        cluster_algo = euclideanDBSCAN(25, 300, 10, engine=engine)
+        cluster_algo.fit(frame)
+        for tile_size in [100, 800]:
+            tiled_algo = tiledDBSCAN(euclideanDBSCAN(25, 300, 10, engine=engine), tile_size=tile_size)
+            tiled_algo.fit(frame)
+            assert len(tiled_algo.tiles) > 1
+            assert_equivalent(cluster_algo.labels, cluster_algo.core, tiled_algo.labels, tiled_algo.core)
+
+    # Frames as GeoDataFrames, as for algorithms without ObservationStore support.
+    gdf_frame = gdf.iloc[:2000].reset_index(names='original_index')
+    cluster_algo = euclideanDBSCAN(50, 120, 5, engine='graph')
+    cluster_algo.fit(gdf_frame)
+    tiled_algo = tiledDBSCAN(euclideanDBSCAN(50, 120, 5, engine='graph'), tile_size=500)
+    tiled_algo.supports_store = False
+    tiled_algo.fit(gdf_frame)
+    assert_equivalent(cluster_algo.labels, cluster_algo.core, tiled_algo.labels, tiled_algo.core)
+
+def test_tiled_frame_split_in_parallel():
+    gdf = get_synthetic_observations(4000, seed=2)
+    expected = frame_split_method(gdf, euclideanDBSCAN(25, 300, 10, engine='graph'))
+    for n_workers in [1, 2]:
+        with tiledDBSCAN(euclideanDBSCAN(25, 300, 10, engine='graph'), tile_size=500, n_workers=n_workers) as tiled_algo:
+            merged_labels = frame_split_method(gdf, tiled_algo)
+        # Overall labels are numbered differently, but group the same observations.
+        pairs = pd.DataFrame({'expected': expected, 'tiled': merged_labels})
+        pairs = pairs[pairs['expected'] > 0].drop_duplicates()
+        assert not pairs['expected'].duplicated().any() and not pairs['tiled'].duplicated().any(), "labels not matching"
+        assert (pd.Series(merged_labels) > 0).sum() == (pd.Series(expected) > 0).sum()
+
+def test_workers_are_kept_across_frames():
+    store = ObservationStore(get_synthetic_observations(3000, seed=3))
+    with tiledDBSCAN(euclideanDBSCAN(25, 300, 10, engine='graph'), tile_size=500, n_workers=2) as tiled_algo:
+        tiled_algo.fit(store.get_frame(0, 1500))
+        executor = tiled_algo._executor
+        tiled_algo.fit(store.get_frame(1000, 3000))
+        assert tiled_algo._executor is executor
+    assert tiled_algo._executor is None
+
+def test_tile_size_must_exceed_d_eps():
+    # The halo has a margin for great-circle distances, as networkDBSCAN uses.
+    assert tiledDBSCAN(euclideanDBSCAN(25, 300, 10), tile_size=100).halo == 25 * 1.01
+    for tile_size in [25, 25.2]:
+        try:
+            tiledDBSCAN(euclideanDBSCAN(25, 300, 10), tile_size=tile_size)
+            assert False, "expected a ValueError"
+        except ValueError:
+            pass
+
+if __name__=="__main__":
+    test_tiles_cover_neighbourhoods()
+    test_tiled_fit_matches()
+    test_tiled_frame_split_in_parallel()
+    test_workers_are_kept_across_frames()
+    test_tile_size_must_exceed_d_eps()
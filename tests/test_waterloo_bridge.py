@@ -1,5 +1,4 @@
 import os
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import pandas as pd
 import geopandas as gpd
@@ -10,6 +9,7 @@ sys.path.append(dirname(dirname(realpath(__file__))))
 from clustering.euclidean_dbscan import euclideanDBSCAN
 from clustering.frame_split_method import frame_split_method
 from data_loader.neo4j_data_loader import DataLoaderNeo4j
+from data_loader.neo4j_driver import get_driver
 
 import numpy as np
 load_dotenv()
@@ -17,12 +17,6 @@ import logging
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 log = logging.getLogger()
 
-def get_driver():
-    # Returns neo4j db driver
-    uri=os.environ['NEO4J_SERVER']
-    driver=GraphDatabase.driver(uri, auth=(os.environ['NEO4J_USER'], os.environ['NEO4J_PASSWORD']))
-    return driver
-
 minTime = '2023-11-08T09:40:10'
 maxTime = '2023-11-08T09:54:00'
 extent =  [-0.117613, -0.113493, 51.504565, 51.509373]